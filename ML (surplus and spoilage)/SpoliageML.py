@@ -1,13 +1,20 @@
+import argparse
+import os
+import tempfile
 import pandas as pd
 import numpy as np
 import joblib
 import time
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import train_test_split, GridSearchCV, KFold
 from sklearn.svm import SVR 
+from sklearn.kernel_approximation import Nystroem
+from sklearn.linear_model import Ridge
 from sklearn.preprocessing import StandardScaler, OneHotEncoder
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
 from sklearn.metrics import mean_squared_error, r2_score
+from fast_inference import export_artifact, CompiledSpoilageModel, SPOILAGE_ARTIFACT
+from dataset_cache import load_dataset
 from sklearn.inspection import permutation_importance # New for SVR feature importance
 
 # --- FILE AND MODEL CONFIGURATION ---
@@ -17,15 +24,210 @@ RANDOM_SEED = 42
 # SVR parameters
 SVR_C = 10 
 SVR_EPSILON = 1.0
+SVR_GAMMA = 'scale'
+
+# --- HYPERPARAMETER SEARCH (--tune) ---
+# Every (C, epsilon, gamma) combination is cross-validated on the training split.
+# --halving evaluates all candidates on a small sample first and only promotes the
+# best third (TUNE_HALVING_FACTOR) to the next round with 3x more rows.
+TUNE_PARAM_GRID = {
+    'regressor__C': [1, 3, 10, 30, 100, 300],
+    'regressor__epsilon': [0.25, 0.5, 1.0, 2.0],
+    'regressor__gamma': ['scale', 0.03, 0.1, 0.3, 1.0],
+}
+TUNE_CV_FOLDS = 5
+TUNE_HALVING_FACTOR = 3
+TUNE_TOP_N = 10
+
+# --- BOUNDED-COST APPROXIMATION (--approx) ---
+# The exact SVR costs one kernel evaluation per support vector per prediction,
+# and the number of support vectors grows with the data. --approx maps the
+# encoded features onto a fixed number of RBF landmarks (Nystroem, same gamma
+# as the exact SVR) and fits a Ridge regression on them, so every prediction
+# costs APPROX_COMPONENTS kernel evaluations however large the data gets.
+# The result is still sum_i w_i * exp(-gamma * ||x - landmark_i||^2) + b, so
+# the compiled engine and artifact format are unchanged.
+APPROX_COMPONENTS = 100
+APPROX_RIDGE_ALPHA = 0.1
+APPROX_REPORT_COMPONENTS = [25, 50, 100, 200, 400] # Extra rows of the comparison table
+LATENCY_SAMPLE_ROWS = 200 # Test rows timed one by one for the single-row latency
 
 # Define the features to be used in the model
 TARGET_COLUMN = 'Predicted_Remaining_Safe_Time_Hours'
 FEATURE_COLUMNS = ['Time_Since_Prep_Hours', 'Storage_Info', 'Food_Type', 'Meal_Time']
+NUMERICAL_FEATURES = ['Time_Since_Prep_Hours']
+CATEGORICAL_FEATURES = ['Storage_Info', 'Food_Type', 'Meal_Time']
+
+
+def build_preprocessor(verbose=True):
+    # Create the preprocessor using ColumnTransformer
+    return ColumnTransformer(
+        transformers=[
+            # Standard Scaler for numerical features (CRITICAL for SVR performance)
+            ('numeric_scaling', StandardScaler(), NUMERICAL_FEATURES),
+            # One-Hot Encoding for categorical features
+            ('categorical_encoding', OneHotEncoder(handle_unknown='ignore'), CATEGORICAL_FEATURES)
+        ],
+        remainder='drop', # Drop unused columns
+        verbose=verbose
+    )
+
+
+def build_pipeline(C=SVR_C, epsilon=SVR_EPSILON, gamma=SVR_GAMMA, memory=None):
+    """
+    Preprocessor + RBF SVR. `memory` is a cache directory: when set, the fitted
+    ColumnTransformer is cached per training fold, so a search only refits the SVR.
+    """
+    # Combine the preprocessor and the SVR regressor into a single pipeline
+    return Pipeline(steps=[
+        ('preprocessor', build_preprocessor(verbose=memory is None)),
+        ('regressor', SVR(kernel='rbf', C=C, epsilon=epsilon, gamma=gamma)) # Using RBF kernel for non-linearity
+    ], memory=memory)
+
+
+def build_approx_pipeline(gamma, n_components=APPROX_COMPONENTS, alpha=APPROX_RIDGE_ALPHA):
+    """
+    Preprocessor + Nystroem RBF feature map + Ridge. `gamma` must be a number
+    (the exact SVR's resolved gamma, so both models use the same kernel).
+    """
+    return Pipeline(steps=[
+        ('preprocessor', build_preprocessor(verbose=False)),
+        ('regressor', Pipeline(steps=[
+            ('kernel_map', Nystroem(kernel='rbf', gamma=gamma, n_components=n_components, random_state=RANDOM_SEED)),
+            ('linear', Ridge(alpha=alpha)),
+        ])),
+    ])
+
+
+def measure_latency(pipeline, X_test):
+    """
+    Compiled-engine latency (what the API serves): median microseconds for one
+    record, and microseconds per row when the whole test split is one batch.
+    """
+    compiled = CompiledSpoilageModel.from_pipeline(pipeline)
+    records = X_test.head(LATENCY_SAMPLE_ROWS).to_dict('records')
+    timings = []
+    for record in records:
+        start = time.perf_counter()
+        compiled.predict(record)
+        timings.append(time.perf_counter() - start)
+    columns = {col: X_test[col].to_numpy() for col in FEATURE_COLUMNS}
+    start = time.perf_counter()
+    compiled.predict(columns)
+    batch_time = time.perf_counter() - start
+    return compiled.manifest['n_support_vectors'], np.median(timings) * 1e6, batch_time / len(X_test) * 1e6
+
+
+def approximate_spoilage_model(exact_pipeline, X_train, y_train, X_test, y_test, n_components=APPROX_COMPONENTS):
+    """
+    Fits the Nystroem + Ridge model with n_components landmarks and prints the
+    accuracy lost and the per-prediction speedup against the exact SVR, for
+    n_components and every APPROX_REPORT_COMPONENTS size. Returns the
+    n_components pipeline.
+    """
+    gamma = float(exact_pipeline['regressor']._gamma)
+    sizes = sorted({n for n in APPROX_REPORT_COMPONENTS + [n_components] if n <= len(X_train)})
+    if n_components not in sizes:
+        raise ValueError(f"--components {n_components} exceeds the {len(X_train)} training rows.")
+    print(f"\n[*] Fitting Nystroem + Ridge approximations (gamma={gamma:.4f}, landmarks: {sizes})...")
+
+    exact_pred = exact_pipeline.predict(X_test)
+    exact_rmse = np.sqrt(mean_squared_error(y_test, exact_pred))
+    exact_r2 = r2_score(y_test, exact_pred)
+    exact_svs, exact_single_us, exact_batch_us = measure_latency(exact_pipeline, X_test)
+
+    rows = [{'Model': 'exact SVR', 'Kernel Centers': exact_svs, 'Fit (s)': '-',
+             'Test RMSE (hours)': round(exact_rmse, 4), 'RMSE Lost': 0.0, 'Test R2': round(exact_r2, 4),
+             'R2 Lost': 0.0, 'vs Exact RMSE': 0.0, 'Single Row (us)': round(exact_single_us, 1),
+             'Batch (us/row)': round(exact_batch_us, 2), 'Speedup (single/batch)': '1.0x / 1.0x'}]
+    chosen = None
+    for n in sizes:
+        pipeline = build_approx_pipeline(gamma, n)
+        start_time = time.time()
+        pipeline.fit(X_train, y_train)
+        fit_time = time.time() - start_time
+        pred = pipeline.predict(X_test)
+        rmse, r2 = np.sqrt(mean_squared_error(y_test, pred)), r2_score(y_test, pred)
+        _, single_us, batch_us = measure_latency(pipeline, X_test)
+        rows.append({'Model': f'nystroem{" (saved)" if n == n_components else ""}', 'Kernel Centers': n,
+                     'Fit (s)': round(fit_time, 3),
+                     'Test RMSE (hours)': round(rmse, 4), 'RMSE Lost': round(rmse - exact_rmse, 4),
+                     'Test R2': round(r2, 4), 'R2 Lost': round(exact_r2 - r2, 4),
+                     'vs Exact RMSE': round(np.sqrt(mean_squared_error(exact_pred, pred)), 4),
+                     'Single Row (us)': round(single_us, 1), 'Batch (us/row)': round(batch_us, 2),
+                     'Speedup (single/batch)': f'{exact_single_us / single_us:.1f}x / {exact_batch_us / batch_us:.1f}x'})
+        if n == n_components:
+            chosen = pipeline
+
+    print("\n[--- Approximation vs Exact SVR (Test Set, compiled engine latency) ---]")
+    print("    RMSE/R2 Lost > 0 means less accurate than the exact SVR; 'vs Exact RMSE' is the RMSE between the two models' predictions.")
+    print(pd.DataFrame(rows).to_markdown(index=False, numalign="left", stralign="left"))
+    print(f"\n[SUCCESS] Saving the {n_components}-landmark approximation. Pick another size with --components N.")
+    return chosen
+
 
-def train_spoilage_model():
+def tune_spoilage_model(X_train, y_train, halving=False):
+    """
+    Cross-validated search over C, epsilon and gamma on all CPU cores (n_jobs=-1).
+    Returns the best pipeline, refitted on the whole training split.
+    """
+    if halving:
+        from sklearn.experimental import enable_halving_search_cv # noqa: F401 (enables the import below)
+        from sklearn.model_selection import HalvingGridSearchCV
+    n_candidates = int(np.prod([len(values) for values in TUNE_PARAM_GRID.values()]))
+    print(f"\n[*] Tuning SVR: {n_candidates} candidates x {TUNE_CV_FOLDS} folds "
+          f"({'successive halving' if halving else 'exhaustive grid'}, {os.cpu_count()} CPU core(s))...")
+
+    cv = KFold(n_splits=TUNE_CV_FOLDS, shuffle=True, random_state=RANDOM_SEED)
+    # The cache directory is shared by the worker processes: each fold's preprocessor
+    # is fitted once and reused by every candidate evaluated on that fold.
+    with tempfile.TemporaryDirectory(prefix='spoilage_svr_cache_') as cache_dir:
+        search_options = dict(scoring='neg_root_mean_squared_error', cv=cv, n_jobs=-1, refit=True)
+        if halving:
+            search = HalvingGridSearchCV(build_pipeline(memory=cache_dir), TUNE_PARAM_GRID,
+                                         factor=TUNE_HALVING_FACTOR, random_state=RANDOM_SEED, **search_options)
+        else:
+            search = GridSearchCV(build_pipeline(memory=cache_dir), TUNE_PARAM_GRID, **search_options)
+
+        start_time = time.time()
+        search.fit(X_train, y_train)
+        elapsed = time.time() - start_time
+
+    # The saved pipeline must not point at the deleted cache directory
+    best_pipeline = search.best_estimator_
+    best_pipeline.set_params(memory=None)
+
+    results = pd.DataFrame(search.cv_results_)
+    results['CV RMSE (hours)'] = (-results['mean_test_score']).round(4)
+    # Fit + score time of one candidate, summed over its folds (CPU seconds, not wall time)
+    results['Seconds/candidate'] = ((results['mean_fit_time'] + results['mean_score_time']) * TUNE_CV_FOLDS).round(3)
+    for param in TUNE_PARAM_GRID:
+        results[param.split('__')[1]] = results[f'param_{param}']
+    columns = ['C', 'epsilon', 'gamma', 'CV RMSE (hours)', 'Seconds/candidate']
+    if halving:
+        columns = ['iter', 'n_resources'] + columns
+        print(f"[*] Halving rounds: {search.n_iterations_}, rows per round: {list(search.n_resources_)}, "
+              f"candidates per round: {list(search.n_candidates_)}")
+
+    print(f"[*] Search complete in {elapsed:.2f} seconds: {len(results)} candidate evaluations, "
+          f"{elapsed / len(results):.3f} s wall time per candidate.")
+    print(f"\n[--- Top {TUNE_TOP_N} Candidates ---]")
+    top = results.sort_values('rank_test_score').head(TUNE_TOP_N)
+    print(top[columns].to_markdown(index=False, numalign="left", stralign="left"))
+
+    best = {param.split('__')[1]: value for param, value in search.best_params_.items()}
+    print(f"\n[SUCCESS] Best parameters: {best} (CV RMSE {-search.best_score_:.4f} hours). "
+          f"Update SVR_C / SVR_EPSILON / SVR_GAMMA to make them the default.")
+    return best_pipeline
+
+
+def train_spoilage_model(tune=None, approx_components=None):
     """
     Loads food spoilage data, preprocesses it, and trains a Support Vector Regressor (SVR)
     to predict the remaining safe consumption time. Includes Permutation Feature Importance.
+    tune: None (fixed SVR_* parameters), 'grid' or 'halving' (hyperparameter search).
+    approx_components: when set, saves a Nystroem + Ridge model with that many
+    landmarks instead of the exact SVR (see APPROX_COMPONENTS).
     """
     print("=====================================================================")
     print("            SPOILAGE PREDICTION MODEL TRAINING (SUPPORT VECTOR)      ")
@@ -33,7 +235,8 @@ def train_spoilage_model():
     print(f"[*] Loading spoilage data from: {DATA_FILE}")
 
     try:
-        df = pd.read_csv(DATA_FILE)
+        # Typed columnar cache (see dataset_cache.py): only the model columns are loaded
+        df = load_dataset(DATA_FILE, FEATURE_COLUMNS + [TARGET_COLUMN])
     except FileNotFoundError:
         print(f"[!] ERROR: Data file '{DATA_FILE}' not found. Ensure it is in the current directory.")
         return
@@ -48,41 +251,28 @@ def train_spoilage_model():
     print(f"[*] Training on {len(X_train)} samples, testing on {len(X_test)} samples.")
     
     
-    # 2. Comprehensive Preprocessing Pipeline Setup
-    
-    # Define feature groups for transformation
-    numerical_features = ['Time_Since_Prep_Hours']
-    categorical_features = ['Storage_Info', 'Food_Type', 'Meal_Time']
-    
-    # Create the preprocessor using ColumnTransformer
-    preprocessor = ColumnTransformer(
-        transformers=[
-            # Standard Scaler for numerical features (CRITICAL for SVR performance)
-            ('numeric_scaling', StandardScaler(), numerical_features),
-            # One-Hot Encoding for categorical features
-            ('categorical_encoding', OneHotEncoder(handle_unknown='ignore'), categorical_features)
-        ],
-        remainder='drop', # Drop unused columns
-        verbose=True
-    )
-    
-    # 3. Create and Train the ML Pipeline
-    
-    # Combine the preprocessor and the SVR regressor into a single pipeline
-    full_pipeline = Pipeline(steps=[
-        ('preprocessor', preprocessor),
-        ('regressor', SVR(kernel='rbf', C=SVR_C, epsilon=SVR_EPSILON)) # Using RBF kernel for non-linearity
-    ])
-    
-    print("\n[*] Starting Support Vector Regressor training...")
-    start_time = time.time()
-    
-    # Fit the entire pipeline on the training data
-    full_pipeline.fit(X_train, y_train)
-    
-    end_time = time.time()
-    print(f"[*] Training complete in {end_time - start_time:.2f} seconds.")
+    # 2. & 3. Build the Preprocessing + SVR Pipeline and Train (or Tune) it
+    if tune:
+        full_pipeline = tune_spoilage_model(X_train, y_train, halving=(tune == 'halving'))
+    else:
+        full_pipeline = build_pipeline()
+
+        print("\n[*] Starting Support Vector Regressor training...")
+        start_time = time.time()
 
+        # Fit the entire pipeline on the training data
+        full_pipeline.fit(X_train, y_train)
+
+        end_time = time.time()
+        print(f"[*] Training complete in {end_time - start_time:.2f} seconds.")
+
+    # 3b. Optional: replace the exact SVR by the bounded-cost approximation
+    if approx_components:
+        try:
+            full_pipeline = approximate_spoilage_model(full_pipeline, X_train, y_train, X_test, y_test, approx_components)
+        except ValueError as e:
+            print(f"[!] ERROR: {e}")
+            return
 
     # 4. Evaluation and Overfitting Check
     
@@ -104,7 +294,7 @@ def train_spoilage_model():
     r2_test = evaluate(y_test, y_test_pred, "TEST SET")
 
     if (r2_train - r2_test) > 0.15:
-        print("\n[!!! WARNING !!!] High Overfitting Risk Detected. Consider hyperparameter tuning (C, epsilon).")
+        print("\n[!!! WARNING !!!] High Overfitting Risk Detected. Consider hyperparameter tuning: python SpoliageML.py --tune")
     else:
         print("\n[OK] Model performance is balanced and generalized well.")
         
@@ -125,7 +315,26 @@ def train_spoilage_model():
     # 6. Save the entire Pipeline
     joblib.dump(full_pipeline, MODEL_FILENAME)
     print(f"\n[SUCCESS] Full ML Pipeline saved to '{MODEL_FILENAME}'.")
+
+    # 7. Export the sklearn-free artifact (.npz arrays + JSON manifest) used by the API
+    export_artifact(full_pipeline, CompiledSpoilageModel, SPOILAGE_ARTIFACT, MODEL_FILENAME)
     print("=====================================================================")
 
 if __name__ == "__main__":
-    train_spoilage_model()
+    parser = argparse.ArgumentParser(description='Train the spoilage prediction model.')
+    parser.add_argument('--tune', action='store_true',
+                        help='Cross-validated grid search over C, epsilon and gamma before saving the best pipeline.')
+    parser.add_argument('--halving', action='store_true',
+                        help='With --tune: successive halving instead of the exhaustive grid (bounded time on large grids).')
+    parser.add_argument('--approx', action='store_true',
+                        help='Save a Nystroem + Ridge approximation (fixed inference cost) and report accuracy lost / speedup vs the exact SVR.')
+    parser.add_argument('--components', type=int, default=APPROX_COMPONENTS,
+                        help=f'With --approx: number of RBF landmarks (default {APPROX_COMPONENTS}).')
+    args = parser.parse_args()
+
+    if args.halving and not args.tune:
+        parser.error('--halving requires --tune')
+    if args.components < 1:
+        parser.error('--components must be at least 1')
+    train_spoilage_model(tune=('halving' if args.halving else 'grid') if args.tune else None,
+                         approx_components=args.components if args.approx else None)
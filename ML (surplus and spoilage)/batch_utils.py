@@ -0,0 +1,72 @@
+import json
+import math
+
+# --- SHARED HELPERS FOR THE BATCH PREDICTION ENDPOINTS ---
+# Used by both surplus_prediction_api.py and spoilage_prediction_api.py so that
+# batch payloads are parsed and validated the same way on every route.
+
+
+def coerce_bool(value):
+    """Accepts JSON booleans, 0/1 and 'true'/'false' strings; raises ValueError otherwise."""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.strip().lower() in ('true', 'false', '0', '1'):
+        return value.strip().lower() in ('true', '1')
+    raise ValueError(f"expected a boolean, got {value!r}")
+
+
+def coerce_number(value):
+    """Accepts JSON numbers and numeric strings; rejects booleans, NaN and infinity."""
+    if isinstance(value, bool):
+        raise ValueError(f"expected a number, got {value!r}")
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(f"expected a finite number, got {value!r}")
+    return number
+
+
+def coerce_string(value):
+    """Accepts JSON strings only; categories are matched exactly, so nothing is converted."""
+    if not isinstance(value, str):
+        raise ValueError(f"expected a string, got {value!r}")
+    return value
+
+
+def parse_batch_body(req):
+    """
+    Extracts the list of records from a batch request. Accepts a JSON array,
+    an object of the form {"records": [...]}, or NDJSON (one record per line).
+    Returns a list of (record, parse_error) tuples in input order.
+    """
+    body = req.get_data(as_text=True)
+    if 'ndjson' in (req.content_type or '') or 'jsonlines' in (req.content_type or ''):
+        entries = []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                entries.append((json.loads(line), None))
+            except ValueError as e:
+                entries.append((None, f'Invalid JSON line: {e}'))
+        return entries
+
+    payload = json.loads(body)
+    if isinstance(payload, dict):
+        payload = payload.get('records')
+    if not isinstance(payload, list):
+        raise ValueError('Expected a JSON array of records, {"records": [...]}, or NDJSON.')
+    return [(record, None) for record in payload]
+
+
+def batch_summary(results):
+    """Builds the common response envelope returned by every batch endpoint."""
+    n_failed = sum(1 for r in results if r['status'] == 'error')
+    return {
+        'status': 'success',
+        'count': len(results),
+        'n_succeeded': len(results) - n_failed,
+        'n_failed': n_failed,
+        'results': results,
+    }
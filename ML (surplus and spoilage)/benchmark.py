@@ -0,0 +1,391 @@
+import argparse
+import csv
+import http.client
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
+# --- LOCAL BENCHMARK SUITE FOR THE PREDICTION APIS ---
+# Builds realistic request bodies from canteen_daily_log.csv and
+# food_spoilage_data.csv. N concurrent clients then drive the APIs for a fixed
+# duration, either:
+#   - in-process: the Flask app's test_client (no network, measures the API code)
+#   - over loopback HTTP: keep-alive connections to a running server (--url)
+# It reports the latency distribution, throughput, error rate and prediction
+# cache hit rate per scenario. In-process runs disable the cache unless --cache
+# is given, so repeated payloads measure the models rather than the cache.
+# --output saves them as JSON, and --compare diffs them against an earlier run.
+# Examples:
+#   python benchmark.py                                   # all scenarios, in-process, cache off
+#   python benchmark.py --cache                           # same, with the prediction cache on
+#   python benchmark.py --url http://127.0.0.1:8082 --concurrency 8 --duration 10 --output after.json
+#   python benchmark.py --compare before.json --output after.json
+#   python benchmark.py --cold-start                      # import time + RSS per model format
+
+SURPLUS_DATA_FILE = 'canteen_daily_log.csv'
+SURPLUS_FEATURE_COLUMNS = [
+    'day_of_wk', 'month', 'meal_type', 'price_type_special_weather', 'is_holiday',
+    'food_id', 'veg_nonveg', 'cuisine', 'estimated_prep_time_hours',
+    'staff_on_duty', 'peak_hour_demand_ratio', 'is_seasonal_dish', 'actual_kg_planned'
+]
+SURPLUS_NUMERIC = {'month': int, 'estimated_prep_time_hours': float, 'staff_on_duty': int,
+                   'peak_hour_demand_ratio': float, 'actual_kg_planned': float}
+SPOILAGE_DATA_FILE = 'food_spoilage_data.csv'
+SPOILAGE_FEATURE_COLUMNS = ['Time_Since_Prep_Hours', 'Storage_Info', 'Food_Type', 'Meal_Time']
+
+PAYLOAD_POOL_SIZE = 500 # Distinct records per dataset (requests cycle through them)
+BATCH_SIZE = 100 # Records per request in the *_batch scenarios
+REGRESSION_THRESHOLD_PCT = 10.0 # --compare flags throughput drops / p99 rises beyond this
+CACHE_HIT_RATE_TOLERANCE = 0.05 # --compare warns when hit rates differ by more (results not comparable)
+# scenario -> (path, dataset, records per request); the dataset also names its prediction cache
+SCENARIOS = {
+    'surplus_single': ('/predict_surplus', 'surplus', 1),
+    'spoilage_single': ('/predict_spoilage', 'spoilage', 1),
+    'surplus_batch': ('/predict_surplus_batch', 'surplus', BATCH_SIZE),
+    'spoilage_batch': ('/predict_spoilage_batch', 'spoilage', BATCH_SIZE),
+}
+
+
+def load_surplus_records(limit=PAYLOAD_POOL_SIZE):
+    """Realistic /predict_surplus records from the canteen log."""
+    records = []
+    with open(SURPLUS_DATA_FILE, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            record = {}
+            for col in SURPLUS_FEATURE_COLUMNS:
+                value = row[col]
+                if col in SURPLUS_NUMERIC:
+                    value = SURPLUS_NUMERIC[col](value)
+                elif col in ('is_holiday', 'is_seasonal_dish'):
+                    value = value == 'True'
+                record[col] = value
+            records.append(record)
+            if len(records) >= limit:
+                break
+    return records
+
+
+def load_spoilage_records(limit=PAYLOAD_POOL_SIZE):
+    """Realistic /predict_spoilage records from the spoilage dataset."""
+    records = []
+    with open(SPOILAGE_DATA_FILE, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            record = {col: row[col] for col in SPOILAGE_FEATURE_COLUMNS}
+            record['Time_Since_Prep_Hours'] = float(record['Time_Since_Prep_Hours'])
+            records.append(record)
+            if len(records) >= limit:
+                break
+    return records
+
+
+def build_bodies(scenario, records):
+    """Encodes the request bodies of a scenario: one record each, or JSON arrays of BATCH_SIZE records."""
+    records_per_request = SCENARIOS[scenario][2]
+    if records_per_request == 1:
+        return [json.dumps(record).encode() for record in records]
+    return [json.dumps([records[(start + i) % len(records)] for i in range(records_per_request)]).encode()
+            for start in range(0, len(records), records_per_request)]
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+# --- CLIENTS ---
+# A client factory returns one send(path, body) -> HTTP status callable per
+# worker thread, so each thread keeps its own connection / test client.
+
+def http_client_factory(url):
+    target = urlparse(url)
+
+    def make_client():
+        state = {'conn': http.client.HTTPConnection(target.hostname, target.port, timeout=30)}
+
+        def send(path, body):
+            try:
+                state['conn'].request('POST', path, body=body, headers={'Content-Type': 'application/json'})
+                response = state['conn'].getresponse()
+                response.read()
+                return response.status
+            except (OSError, http.client.HTTPException):
+                state['conn'].close()
+                state['conn'] = http.client.HTTPConnection(target.hostname, target.port, timeout=30)
+                return None
+        return send
+    return make_client
+
+
+def inprocess_client_factory(app):
+    def make_client():
+        client = app.test_client()
+
+        def send(path, body):
+            return client.post(path, data=body, content_type='application/json').status_code
+        return send
+    return make_client
+
+
+# A cache stats reader returns {cache name: PredictionCache.stats()} or None
+# when the target does not expose them. Over HTTP, /cache_stats answers for
+# the one worker process that handles it, so run servers with 1 worker.
+
+def http_cache_stats_reader(url):
+    target = urlparse(url)
+
+    def read():
+        conn = http.client.HTTPConnection(target.hostname, target.port, timeout=30)
+        try:
+            conn.request('GET', '/cache_stats')
+            response = conn.getresponse()
+            body = response.read()
+            return json.loads(body) if response.status == 200 else None
+        except (OSError, http.client.HTTPException, ValueError):
+            return None
+        finally:
+            conn.close()
+    return read
+
+
+def inprocess_cache_stats_reader(service):
+    def read():
+        return {'surplus': service.surplus.prediction_cache.stats(),
+                'spoilage': service.spoilage.prediction_cache.stats()}
+    return read
+
+
+def cache_hit_rate(before, after, cache):
+    """Hit rate of `cache` between two stats snapshots; None when unknown or never consulted."""
+    if not before or not after or cache not in before or cache not in after:
+        return None
+    hits = after[cache]['hits'] - before[cache]['hits']
+    lookups = hits + after[cache]['misses'] - before[cache]['misses']
+    return round(hits / lookups, 4) if lookups > 0 else None
+
+
+def run_load(make_client, path, bodies, concurrency, duration, records_per_request=1):
+    """Runs `concurrency` clients for `duration` seconds; returns a result dict."""
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(worker_id):
+        send = make_client()
+        local, local_errors, i = [], 0, worker_id
+        while time.perf_counter() < deadline:
+            body = bodies[i % len(bodies)]
+            i += concurrency
+            start = time.perf_counter()
+            if send(path, body) != 200:
+                local_errors += 1
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(w,)) for w in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    n = len(latencies)
+    return {
+        'path': path,
+        'concurrency': concurrency,
+        'records_per_request': records_per_request,
+        'requests': n,
+        'errors': errors[0],
+        'error_rate': round(errors[0] / n, 4) if n else 0.0,
+        'throughput_rps': round(n / elapsed, 1),
+        'records_per_s': round(n * records_per_request / elapsed, 1),
+        'mean_ms': round(sum(latencies) / n * 1e3, 2) if n else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1e3, 2),
+        'p90_ms': round(percentile(latencies, 90) * 1e3, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1e3, 2),
+        'max_ms': round(latencies[-1] * 1e3, 2) if n else 0.0,
+    }
+
+
+def run_suite(scenarios, make_client, concurrency, duration, warmup, read_cache_stats=lambda: None):
+    """
+    Runs each scenario (after an unmeasured warm-up) and returns {scenario: result}.
+    cache_hit_rate is measured over the timed run only (None: cache off or unknown).
+    """
+    records = {'surplus': load_surplus_records(), 'spoilage': load_spoilage_records()}
+    results = {}
+    for scenario in scenarios:
+        path, dataset, records_per_request = SCENARIOS[scenario]
+        bodies = build_bodies(scenario, records[dataset])
+        if warmup > 0:
+            run_load(make_client, path, bodies, concurrency, warmup, records_per_request)
+        before = read_cache_stats()
+        results[scenario] = r = run_load(make_client, path, bodies, concurrency, duration, records_per_request)
+        r['cache_hit_rate'] = cache_hit_rate(before, read_cache_stats(), dataset)
+        cache = 'off' if r['cache_hit_rate'] is None else f"{r['cache_hit_rate']:.1%}"
+        print(f"[*] {scenario:<16} {r['throughput_rps']:>9.1f} req/s {r['records_per_s']:>10.1f} rec/s "
+              f"p50 {r['p50_ms']:>7.2f} ms  p99 {r['p99_ms']:>7.2f} ms  errors {r['error_rate']:.2%}  cache hits {cache}")
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(baseline, current, threshold=REGRESSION_THRESHOLD_PCT):
+    """
+    Prints baseline vs current per scenario. Returns the scenarios that regressed:
+    throughput dropped, or p99 latency rose, by more than `threshold` percent,
+    or the error rate increased.
+    """
+    def change(old, new):
+        return (new - old) / old * 100 if old else 0.0
+
+    print(f"\n[--- Comparison with baseline {baseline['meta'].get('commit') or ''} "
+          f"({baseline['meta'].get('timestamp', '?')}) ---]")
+    print(f"{'Scenario':<16} {'req/s before':>12} {'req/s after':>12} {'change':>8} "
+          f"{'p99 before':>11} {'p99 after':>10} {'change':>8}")
+    regressions = []
+    for scenario, new in current['results'].items():
+        old = baseline['results'].get(scenario)
+        if old is None:
+            print(f"{scenario:<16} (not in baseline)")
+            continue
+        rps_change = change(old['throughput_rps'], new['throughput_rps'])
+        p99_change = change(old['p99_ms'], new['p99_ms'])
+        regressed = (rps_change < -threshold or p99_change > threshold
+                     or new['error_rate'] > old['error_rate'])
+        if regressed:
+            regressions.append(scenario)
+        print(f"{scenario:<16} {old['throughput_rps']:>12.1f} {new['throughput_rps']:>12.1f} {rps_change:>+7.1f}% "
+              f"{old['p99_ms']:>11.2f} {new['p99_ms']:>10.2f} {p99_change:>+7.1f}%{'  <-- REGRESSION' if regressed else ''}")
+        old_hits, new_hits = old.get('cache_hit_rate') or 0.0, new.get('cache_hit_rate') or 0.0
+        if abs(new_hits - old_hits) > CACHE_HIT_RATE_TOLERANCE:
+            print(f"{'':<16} [!] cache hit rate {old_hits:.1%} -> {new_hits:.1%}: the runs are not comparable")
+    return regressions
+
+
+# --- COLD START MEASUREMENT ---
+# Each measurement runs in a fresh interpreter: import the combined service,
+# serve one surplus + one spoilage prediction, then report time and peak RSS.
+COLD_START_SNIPPET = """
+import json, resource, sys, time
+start = time.perf_counter()
+import prediction_service as service
+imported = time.perf_counter()
+service.surplus.predict_surplus_records([(SURPLUS_RECORD, None)])
+service.spoilage.predict_spoilage_records([(SPOILAGE_RECORD, None)])
+ready = time.perf_counter()
+print(json.dumps({
+    'import_s': round(imported - start, 3),
+    'first_prediction_s': round(ready - imported, 3),
+    'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1),
+    'sklearn_imported': 'sklearn' in sys.modules,
+    'pandas_imported': 'pandas' in sys.modules,
+}))
+"""
+COLD_START_MODES = {
+    'artifact (.npz + JSON)': {},
+    'joblib pickle': {'SURPLUS_ENGINE': 'sklearn', 'SPOILAGE_ENGINE': 'sklearn'},
+}
+SPOILAGE_SAMPLE = {'Time_Since_Prep_Hours': 1.0, 'Storage_Info': 'Room Temp', 'Food_Type': 'Milk', 'Meal_Time': 'Lunch'}
+
+
+def measure_cold_start(repeats=3):
+    """Returns the median cold-start numbers for each model loading mode."""
+    surplus_record = load_surplus_records(limit=1)[0]
+    code = f'SURPLUS_RECORD = {surplus_record!r}\nSPOILAGE_RECORD = {SPOILAGE_SAMPLE!r}\n' + COLD_START_SNIPPET
+    results = {}
+    for mode, env_overrides in COLD_START_MODES.items():
+        runs = []
+        for _ in range(repeats):
+            output = subprocess.run(
+                [sys.executable, '-W', 'ignore', '-c', code], capture_output=True, text=True, check=True,
+                env=dict(os.environ, PREDICTION_CACHE_SIZE='0', **env_overrides))
+            runs.append(json.loads(output.stdout.strip().splitlines()[-1]))
+        results[mode] = {key: sorted(run[key] for run in runs)[len(runs) // 2] for key in runs[0]}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local latency / throughput benchmark for the prediction APIs.')
+    parser.add_argument('--url', help='Benchmark a running server over loopback HTTP (default: in-process).')
+    parser.add_argument('--scenarios', nargs='+', choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0, help='Measured seconds per scenario.')
+    parser.add_argument('--warmup', type=float, default=1.0, help='Unmeasured seconds before each scenario.')
+    parser.add_argument('--cache', action='store_true',
+                        help='In-process only: keep the prediction cache on (off by default; for servers, '
+                             'start them with PREDICTION_CACHE_SIZE=0 to turn it off).')
+    parser.add_argument('--output', help='Save the results as JSON.')
+    parser.add_argument('--compare', help='Baseline JSON from an earlier run; exits 1 on a regression.')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD_PCT,
+                        help='Regression threshold in percent for --compare.')
+    parser.add_argument('--cold-start', action='store_true', help='Measure import time and RSS instead of load.')
+    args = parser.parse_args()
+
+    if args.cold_start:
+        print(json.dumps(measure_cold_start(), indent=2))
+        return
+
+    if args.url:
+        mode, make_client = 'http', http_client_factory(args.url)
+        read_cache_stats = http_cache_stats_reader(args.url)
+    else:
+        if not args.cache:
+            os.environ['PREDICTION_CACHE_SIZE'] = '0' # Read when the API modules are imported
+        import prediction_service
+        mode, make_client = 'inprocess', inprocess_client_factory(prediction_service.app)
+        read_cache_stats = inprocess_cache_stats_reader(prediction_service)
+
+    print(f"[*] Benchmarking {args.url or 'prediction_service (in-process)'}: {args.concurrency} clients, "
+          f"{args.duration:g} s per scenario")
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'mode': mode,
+            'url': args.url,
+            'concurrency': args.concurrency,
+            'duration_s': args.duration,
+            'batch_size': BATCH_SIZE,
+            'prediction_cache': None if args.url else os.environ.get('PREDICTION_CACHE_SIZE', 'default'),
+            'python': platform.python_version(),
+            'cpu_count': os.cpu_count(),
+        },
+        'results': run_suite(args.scenarios, make_client, args.concurrency, args.duration, args.warmup,
+                             read_cache_stats),
+    }
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"[SUCCESS] Results saved to '{args.output}'.")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_results(baseline, report, args.threshold)
+        if regressions:
+            print(f"\n[!] Regression beyond {args.threshold:g}% in: {', '.join(regressions)}")
+            sys.exit(1)
+        print("\n[OK] No regressions.")
+
+
+if __name__ == '__main__':
+    main()
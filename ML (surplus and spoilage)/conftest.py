@@ -0,0 +1,12 @@
+import os
+import sys
+
+# The ML scripts open their model files and CSVs by relative path and import
+# each other as top-level modules, so the tests run from this folder.
+ML_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ML_DIR)
+os.chdir(ML_DIR)
+
+# Importing an API loads its models; keep the tests from starting file
+# watchers. The version archive is off until a server entry point enables it.
+os.environ.setdefault('ML_RELOAD_POLL_SECONDS', '0')
@@ -0,0 +1,168 @@
+import json
+import os
+import shutil
+import sys
+import time
+import numpy as np
+import pandas as pd
+from fast_inference import file_sha256
+
+# --- TYPED, COLUMNAR CACHE OF THE TRAINING CSVs ---
+# Parsing the CSVs loads every string column (day_of_wk, food_id, dish_name,
+# Storage_Info, ...) as Python objects. The first load_dataset() call converts
+# a CSV into one .npy file per column with pinned dtypes:
+#   - strings  -> category (int8/int16 codes + the category list in the manifest)
+#   - True/False columns -> bool
+#   - integers -> smallest signed int type that holds them
+#   - floats   -> float32 where it round-trips to 1e-6 relative error;
+#                 training targets (FLOAT64_COLUMNS) stay float64
+# Later calls memory-map only the requested columns (FEATURE_COLUMNS + target).
+# The cache lives in .dataset_cache/<csv name>/ next to the CSV. It is rebuilt
+# when the CSV's size + mtime change and its SHA-256 no longer matches.
+# Same idea as the .npz + JSON model artifacts in fast_inference.py: plain
+# NumPy files, no pickle and no extra dependency (pyarrow is not required).
+
+CACHE_FORMAT_VERSION = 1
+DATASET_CACHE_DIR = '.dataset_cache'
+FLOAT32_MAX_RELATIVE_ERROR = 1e-6
+FLOAT64_COLUMNS = {'kg_surplus', 'Predicted_Remaining_Safe_Time_Hours'} # Training targets keep full precision
+DATASET_CACHE_ENABLED = os.environ.get('DATASET_CACHE', '1') != '0' # DATASET_CACHE=0 always parses the CSV
+
+
+def _pin_column(name, values):
+    """Converts one parsed CSV column to its cached dtype. Returns (array, manifest entry)."""
+    if values.dtype == bool:
+        return values.to_numpy(), {'dtype': 'bool'}
+    if pd.api.types.is_integer_dtype(values.dtype):
+        array = pd.to_numeric(values, downcast='integer').to_numpy()
+        return array, {'dtype': str(array.dtype)}
+    if pd.api.types.is_float_dtype(values.dtype):
+        array = values.to_numpy(dtype=np.float64)
+        if name not in FLOAT64_COLUMNS:
+            narrowed = array.astype(np.float32)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                error = np.abs(narrowed.astype(np.float64) - array) / np.maximum(np.abs(array), 1.0)
+            if np.nanmax(error, initial=0.0) <= FLOAT32_MAX_RELATIVE_ERROR:
+                array = narrowed
+        return array, {'dtype': str(array.dtype)}
+    categorical = values.astype('category')
+    return (np.asarray(categorical.cat.codes),
+            {'dtype': 'category', 'categories': [str(c) for c in categorical.cat.categories]})
+
+
+def _cache_path(csv_file, cache_dir):
+    folder = os.path.join(os.path.dirname(os.path.abspath(csv_file)), cache_dir)
+    return os.path.join(folder, os.path.splitext(os.path.basename(csv_file))[0])
+
+
+def _read_manifest(cache_path):
+    try:
+        with open(os.path.join(cache_path, 'manifest.json'), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get('format_version') == CACHE_FORMAT_VERSION else None
+
+
+def _source_stat(csv_file):
+    stat = os.stat(csv_file)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def build_cache(csv_file, cache_path):
+    """Parses the CSV once and writes the typed column files + manifest. Returns the manifest."""
+    df = pd.read_csv(csv_file)
+    manifest = dict(_source_stat(csv_file), format_version=CACHE_FORMAT_VERSION,
+                    source=os.path.basename(csv_file), sha256=file_sha256(csv_file),
+                    rows=len(df), columns={})
+    # Built in a temporary folder and renamed into place, so readers never see half a cache
+    temp_path = f'{cache_path}.tmp{os.getpid()}'
+    shutil.rmtree(temp_path, ignore_errors=True)
+    os.makedirs(temp_path)
+    for index, name in enumerate(df.columns):
+        array, entry = _pin_column(name, df[name])
+        entry['file'] = f'c{index:03d}.npy'
+        np.save(os.path.join(temp_path, entry['file']), array, allow_pickle=False)
+        manifest['columns'][name] = entry
+    with open(os.path.join(temp_path, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    shutil.rmtree(cache_path, ignore_errors=True)
+    os.replace(temp_path, cache_path)
+    return manifest
+
+
+def cache_is_current(manifest, csv_file, cache_path):
+    """
+    Size + mtime match: current. Otherwise compare the SHA-256 (e.g. the CSV was
+    only touched or copied) and record the new mtime so the next check is cheap.
+    """
+    if manifest is None:
+        return False
+    stat = _source_stat(csv_file)
+    if stat['size'] == manifest['size'] and stat['mtime_ns'] == manifest['mtime_ns']:
+        return True
+    if stat['size'] != manifest['size'] or file_sha256(csv_file) != manifest['sha256']:
+        return False
+    manifest['mtime_ns'] = stat['mtime_ns']
+    with open(os.path.join(cache_path, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return True
+
+
+def load_dataset(csv_file, columns=None, cache_dir=DATASET_CACHE_DIR, mmap=True):
+    """
+    Returns the CSV as a DataFrame with pinned dtypes, restricted to `columns`
+    (all columns when None). Builds or refreshes the cache when needed; only
+    the requested column files are read (memory-mapped unless mmap=False).
+    """
+    if not DATASET_CACHE_ENABLED:
+        return pd.read_csv(csv_file, usecols=columns)[columns] if columns else pd.read_csv(csv_file)
+
+    cache_path = _cache_path(csv_file, cache_dir)
+    manifest = _read_manifest(cache_path)
+    if not cache_is_current(manifest, csv_file, cache_path):
+        print(f"[*] Building typed dataset cache for '{csv_file}' in '{cache_path}'...")
+        manifest = build_cache(csv_file, cache_path)
+
+    columns = list(manifest['columns']) if columns is None else list(columns)
+    missing = [c for c in columns if c not in manifest['columns']]
+    if missing:
+        raise KeyError(f"Columns not in '{csv_file}': {missing}")
+
+    data = {}
+    for name in columns:
+        entry = manifest['columns'][name]
+        array = np.load(os.path.join(cache_path, entry['file']), mmap_mode='r' if mmap else None, allow_pickle=False)
+        if entry['dtype'] == 'category':
+            data[name] = pd.Categorical.from_codes(array, categories=entry['categories'])
+        else:
+            data[name] = array
+    return pd.DataFrame(data, columns=columns)
+
+
+# --- CACHE BUILD + COMPARISON (python dataset_cache.py [csv ...]) ---
+if __name__ == "__main__":
+    from SurplusML import DATA_FILE as SURPLUS_DATA_FILE, FEATURE_COLUMNS as SURPLUS_FEATURES, TARGET_COLUMN as SURPLUS_TARGET
+    from SpoliageML import DATA_FILE as SPOILAGE_DATA_FILE, FEATURE_COLUMNS as SPOILAGE_FEATURES, TARGET_COLUMN as SPOILAGE_TARGET
+
+    datasets = {SURPLUS_DATA_FILE: SURPLUS_FEATURES + [SURPLUS_TARGET],
+                SPOILAGE_DATA_FILE: SPOILAGE_FEATURES + [SPOILAGE_TARGET]}
+    for csv_file in sys.argv[1:] or datasets:
+        projection = datasets.get(csv_file)
+        load_dataset(csv_file) # Build (or validate) the cache first
+
+        start = time.perf_counter()
+        parsed = pd.read_csv(csv_file)[projection] if projection else pd.read_csv(csv_file)
+        csv_time = time.perf_counter() - start
+        start = time.perf_counter()
+        cached = load_dataset(csv_file, projection, mmap=False)
+        cache_time = time.perf_counter() - start
+
+        print(f"\n[--- {csv_file}: {len(cached)} rows, {len(cached.columns)} columns ---]")
+        print(pd.DataFrame([
+            {'Source': 'pd.read_csv', 'Load Time (ms)': round(csv_time * 1e3, 1),
+             'Memory (MB)': round(parsed.memory_usage(deep=True).sum() / 1e6, 2)},
+            {'Source': 'dataset cache', 'Load Time (ms)': round(cache_time * 1e3, 1),
+             'Memory (MB)': round(cached.memory_usage(deep=True).sum() / 1e6, 2)},
+        ]).to_markdown(index=False, numalign="left", stralign="left"))
+        print(cached.dtypes.to_string())
@@ -0,0 +1,448 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import numpy as np
+
+# --- COMPILED (PANDAS-FREE, SKLEARN-FREE) INFERENCE FOR BOTH PIPELINES ---
+# A fitted pipeline is exported into flat NumPy arrays:
+#   - StandardScaler means and scales for the numerical features
+#   - category -> output column maps for the OneHotEncoder
+#   - surplus GBR: per-tree feature / threshold / child / value arrays
+#   - spoilage SVR: support vectors, dual coefficients, intercept and gamma
+# Requests are then scored without building a DataFrame, running the
+# ColumnTransformer or sklearn's input validation.
+#
+# save()/load() store the same arrays as a compact, non-pickle artifact
+# (<name>.npz + <name>.json manifest). Loading it needs only NumPy, so the
+# APIs can start without importing sklearn or pandas at all. The manifest
+# records the SHA-256 of the .npz (checked on every load) and of the .joblib
+# it was exported from (checked by load_if_current).
+
+ARTIFACT_FORMAT_VERSION = 2 # 2: manifest carries arrays_sha256
+PARITY_TOLERANCE = 1e-9 # Max allowed |compiled - Pipeline.predict| in the parity check
+# Nystroem models: folding normalization_ (norm ~1e6 when landmarks repeat)
+# into the coefficients reorders large, cancelling sums. Measured <= 1e-7 h
+# for 25-400 landmarks, far below the 0.01 h the API rounds to.
+APPROX_PARITY_TOLERANCE = 1e-6
+ROW_CHUNK_SIZE = 4096 # Rows scored at once (bounds the rows x trees / rows x SVs buffers)
+
+SURPLUS_MODEL_FILENAME = 'surplus_gbr_pipeline.joblib'
+SURPLUS_ARTIFACT = 'surplus_gbr_model' # -> surplus_gbr_model.npz + surplus_gbr_model.json
+SPOILAGE_MODEL_FILENAME = 'spoilage_svr_pipeline.joblib'
+SPOILAGE_ARTIFACT = 'spoilage_svr_model' # -> spoilage_svr_model.npz + spoilage_svr_model.json
+
+
+def _transformer_columns(columns, feature_names_in):
+    """ColumnTransformer may store column selections as names or positions."""
+    return [feature_names_in[c] if isinstance(c, (int, np.integer)) else c for c in columns]
+
+
+def file_sha256(path):
+    """Hashes a model file so an artifact can prove which .joblib it was exported from."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class CompiledPipeline:
+    """
+    Shared part of the compiled models: the exported ColumnTransformer
+    (StandardScaler + OneHotEncoder + passthrough) and artifact persistence.
+    Subclasses implement the regressor in _predict_encoded().
+    """
+    model_type = None
+    encode_dtype = np.float64
+
+    def __init__(self, manifest, arrays):
+        self.manifest = manifest
+        self.arrays = arrays
+        self.feature_columns = manifest['feature_columns']
+        self.n_features = manifest['n_features']
+        self.numeric_features = manifest['numeric_features']
+        self.passthrough_features = manifest['passthrough_features']
+        self.passthrough_offset = manifest['passthrough_offset']
+        self.category_maps = [
+            (cat['name'], {value: cat['offset'] + j for j, value in enumerate(cat['categories'])})
+            for cat in manifest['categorical_features']
+        ]
+        self._buffers = threading.local() # One reusable encoding buffer per worker thread
+
+    # --- EXPORT ---
+
+    @staticmethod
+    def _export_preprocessor(preprocessor):
+        """Reads each transformer's output slice in order; raises ValueError for unsupported steps."""
+        feature_names_in = list(preprocessor.feature_names_in_)
+        manifest = {
+            'feature_columns': feature_names_in,
+            'numeric_features': [],
+            'categorical_features': [],
+            'passthrough_features': [],
+            'passthrough_offset': 0,
+            'n_features': int(max(s.stop for s in preprocessor.output_indices_.values())),
+        }
+        arrays = {'scaler_mean': np.zeros(0), 'scaler_scale': np.ones(0)}
+
+        for name, transformer, columns in preprocessor.transformers_:
+            columns = _transformer_columns(columns, feature_names_in)
+            out_slice = preprocessor.output_indices_[name]
+            kind = type(transformer).__name__
+            if transformer == 'drop' or out_slice.start == out_slice.stop:
+                continue
+            if kind == 'StandardScaler':
+                if out_slice.start != 0:
+                    raise ValueError('Scaled numerical features must come first.')
+                n = len(columns)
+                arrays['scaler_mean'] = np.zeros(n) if transformer.mean_ is None else np.asarray(transformer.mean_, dtype=np.float64)
+                arrays['scaler_scale'] = np.ones(n) if transformer.scale_ is None else np.asarray(transformer.scale_, dtype=np.float64)
+                manifest['numeric_features'] = columns
+            elif kind == 'OneHotEncoder':
+                if transformer.drop_idx_ is not None or getattr(transformer, '_infrequent_enabled', False):
+                    raise ValueError('OneHotEncoder drop/infrequent categories are not supported.')
+                offset = out_slice.start
+                for col, categories in zip(columns, transformer.categories_):
+                    manifest['categorical_features'].append({
+                        'name': col, 'offset': offset, 'categories': [c.item() if hasattr(c, 'item') else c for c in categories],
+                    })
+                    offset += len(categories)
+            elif transformer == 'passthrough' or (kind == 'FunctionTransformer' and transformer.func is None):
+                manifest['passthrough_features'] = columns
+                manifest['passthrough_offset'] = out_slice.start
+            else:
+                raise ValueError(f'Unsupported transformer: {name} ({kind})')
+        return manifest, arrays
+
+    # --- INFERENCE ---
+
+    def _as_columns(self, data):
+        """Accepts one record (dict of scalars), a list of records, or a dict of columns."""
+        if isinstance(data, dict):
+            first = data[self.feature_columns[0]]
+            if isinstance(first, (list, tuple, np.ndarray)):
+                return data, len(first)
+            data = [data]
+        return {col: [row[col] for row in data] for col in self.feature_columns}, len(data)
+
+    def _encode_buffer(self, n_rows):
+        """Returns a zeroed (n_rows, n_features) view of this thread's reusable buffer."""
+        buffer = getattr(self._buffers, 'X', None)
+        if buffer is None or buffer.shape[0] < n_rows:
+            buffer = np.empty((max(n_rows, 64), self.n_features), dtype=self.encode_dtype)
+            self._buffers.X = buffer
+        X = buffer[:n_rows]
+        X.fill(0.0)
+        return X
+
+    def encode(self, columns, n_rows):
+        """Applies the exported ColumnTransformer. Values are computed in float64, like sklearn."""
+        X = self._encode_buffer(n_rows)
+        if self.numeric_features:
+            numeric = np.column_stack([np.asarray(columns[c], dtype=np.float64) for c in self.numeric_features])
+            X[:, :len(self.numeric_features)] = (numeric - self.arrays['scaler_mean']) / self.arrays['scaler_scale']
+
+        rows = np.arange(n_rows)
+        for name, index_map in self.category_maps:
+            idx = np.fromiter((index_map.get(v, -1) for v in columns[name]), dtype=np.int64, count=n_rows)
+            known = idx >= 0 # handle_unknown='ignore': unseen categories encode as all zeros
+            X[rows[known], idx[known]] = 1.0
+
+        for j, name in enumerate(self.passthrough_features):
+            X[:, self.passthrough_offset + j] = np.asarray(columns[name], dtype=np.float64)
+        return X
+
+    def _predict_encoded(self, X, out):
+        raise NotImplementedError
+
+    def predict(self, data, out=None, stage_times=None):
+        """
+        Scores records straight from Python/NumPy data. `data` may be a single
+        record dict, a list of record dicts, or a dict of equal-length columns.
+        Results are written into `out` when a preallocated array is supplied.
+        When a `stage_times` dict is given, the seconds spent encoding
+        ('transform') and scoring ('predict') are added to it.
+        """
+        columns, n_rows = self._as_columns(data)
+        if out is None:
+            out = np.empty(n_rows, dtype=np.float64)
+        for start in range(0, n_rows, ROW_CHUNK_SIZE):
+            stop = min(start + ROW_CHUNK_SIZE, n_rows)
+            chunk = {c: columns[c][start:stop] for c in self.feature_columns}
+            if stage_times is None:
+                self._predict_encoded(self.encode(chunk, stop - start), out[start:stop])
+                continue
+            t0 = time.perf_counter()
+            X = self.encode(chunk, stop - start)
+            t1 = time.perf_counter()
+            self._predict_encoded(X, out[start:stop])
+            stage_times['transform'] = stage_times.get('transform', 0.0) + (t1 - t0)
+            stage_times['predict'] = stage_times.get('predict', 0.0) + (time.perf_counter() - t1)
+        return out
+
+    # --- ARTIFACT PERSISTENCE ---
+
+    def save(self, artifact, source_model_file=None):
+        """Writes <artifact>.npz (arrays) and <artifact>.json (manifest). No pickle involved."""
+        manifest = dict(self.manifest, model_type=self.model_type, format_version=ARTIFACT_FORMAT_VERSION)
+        if source_model_file is not None:
+            manifest['source_model_file'] = os.path.basename(source_model_file)
+            manifest['source_sha256'] = file_sha256(source_model_file)
+        np.savez(f'{artifact}.npz', **self.arrays)
+        manifest['arrays_sha256'] = file_sha256(f'{artifact}.npz')
+        with open(f'{artifact}.json', 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+
+    @classmethod
+    def load(cls, artifact):
+        with open(f'{artifact}.json', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('model_type') != cls.model_type:
+            raise ValueError(f"Artifact '{artifact}' holds a {manifest.get('model_type')} model, expected {cls.model_type}.")
+        if manifest.get('format_version') != ARTIFACT_FORMAT_VERSION:
+            raise ValueError(f"Unsupported artifact format version {manifest.get('format_version')}.")
+        if file_sha256(f'{artifact}.npz') != manifest.get('arrays_sha256'):
+            raise ValueError(f"Artifact '{artifact}.npz' is corrupted (SHA-256 does not match its manifest).")
+        with np.load(f'{artifact}.npz', allow_pickle=False) as data:
+            arrays = {name: data[name] for name in data.files}
+        return cls(manifest, arrays)
+
+    @classmethod
+    def load_if_current(cls, artifact, source_model_file):
+        """
+        Loads the artifact only if it was exported from the current model file
+        (checked by SHA-256). Returns None when it is missing or stale.
+        """
+        if not os.path.exists(f'{artifact}.json') or not os.path.exists(f'{artifact}.npz'):
+            return None
+        compiled = cls.load(artifact)
+        if os.path.exists(source_model_file) and compiled.manifest.get('source_sha256') != file_sha256(source_model_file):
+            print(f"[!] Artifact '{artifact}' is stale (exported from a different '{source_model_file}').")
+            return None
+        return compiled
+
+
+class CompiledSurplusModel(CompiledPipeline):
+    """
+    Flat-array copy of the fitted surplus Pipeline(ColumnTransformer, GradientBoostingRegressor).
+    Build it with CompiledSurplusModel.from_pipeline(full_pipeline) and call predict().
+    """
+    model_type = 'surplus_gbr'
+    encode_dtype = np.float32 # sklearn trees compare float32 inputs against float64 thresholds
+
+    def __init__(self, manifest, arrays):
+        super().__init__(manifest, arrays)
+        self.max_depth = manifest['max_depth']
+        self.init_value = manifest['init_value']
+        # Traversal layout: children[2 * node + go_right] and intp feature ids,
+        # so each level is two flat gathers instead of 2-D fancy indexing
+        self._children = np.stack([arrays['tree_left'], arrays['tree_right']], axis=1).ravel().astype(np.intp)
+        self._feature = arrays['tree_feature'].astype(np.intp)
+        self._roots = arrays['tree_roots'].astype(np.intp)
+
+    @classmethod
+    def from_pipeline(cls, pipeline):
+        """
+        Exports a fitted surplus pipeline. Raises ValueError if the pipeline uses
+        a step this engine does not implement (the caller should then keep using
+        the sklearn pipeline).
+        """
+        regressor = pipeline['regressor']
+        if type(regressor).__name__ != 'GradientBoostingRegressor':
+            raise ValueError(f'Unsupported regressor: {type(regressor).__name__}')
+        if regressor.estimators_.shape[1] != 1:
+            raise ValueError('Only single-output regression is supported.')
+        manifest, arrays = cls._export_preprocessor(pipeline['preprocessor'])
+
+        # Concatenate every tree into one set of node arrays. Leaves point to
+        # themselves, so traversal is a fixed number of steps (max_depth) with
+        # no per-row branching.
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        node_offset = 0
+        max_depth = 0
+        for estimator in regressor.estimators_[:, 0]:
+            tree = estimator.tree_
+            node_ids = np.arange(tree.node_count, dtype=np.int32)
+            is_leaf = tree.children_left == -1
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+            thresholds.append(np.where(is_leaf, 0.0, tree.threshold))
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left).astype(np.int32) + node_offset)
+            rights.append(np.where(is_leaf, node_ids, tree.children_right).astype(np.int32) + node_offset)
+            values.append(tree.value[:, 0, 0] * regressor.learning_rate)
+            roots.append(node_offset)
+            node_offset += tree.node_count
+            max_depth = max(max_depth, tree.max_depth)
+
+        init = regressor.init_
+        if isinstance(init, str):
+            init_value = 0.0
+        elif hasattr(init, 'constant_'):
+            init_value = float(np.ravel(init.constant_)[0])
+        else:
+            raise ValueError(f'Unsupported init estimator: {type(init).__name__}')
+
+        manifest.update({
+            'n_trees': len(roots),
+            'max_depth': int(max_depth),
+            'learning_rate': float(regressor.learning_rate),
+            'init_value': init_value,
+        })
+        arrays.update({
+            'tree_feature': np.concatenate(features),
+            'tree_threshold': np.concatenate(thresholds).astype(np.float64),
+            'tree_left': np.concatenate(lefts),
+            'tree_right': np.concatenate(rights),
+            'tree_value': np.concatenate(values).astype(np.float64),
+            'tree_roots': np.asarray(roots, dtype=np.int32),
+        })
+        return cls(manifest, arrays)
+
+    def _predict_encoded(self, X, out):
+        a = self.arrays
+        flat_X = X.ravel()
+        row_offsets = (np.arange(X.shape[0], dtype=np.intp) * X.shape[1])[:, None]
+        node = np.broadcast_to(self._roots, (X.shape[0], self._roots.shape[0]))
+        for _ in range(self.max_depth):
+            go_right = flat_X[row_offsets + self._feature[node]] > a['tree_threshold'][node]
+            node = self._children[2 * node + go_right]
+        out[:] = a['tree_value'][node].sum(axis=1)
+        out += self.init_value
+        return out
+
+
+class CompiledSpoilageModel(CompiledPipeline):
+    """
+    Flat-array copy of the fitted spoilage Pipeline(ColumnTransformer, SVR(kernel='rbf')):
+    prediction = sum_i dual_coef_i * exp(-gamma * ||x - sv_i||^2) + intercept.
+    The Nystroem(kernel='rbf') + linear model written by SpoliageML.py --approx
+    has the same form: the landmarks are the support vectors and
+    dual_coef = normalization_.T @ coef_.
+    """
+    model_type = 'spoilage_svr'
+
+    def __init__(self, manifest, arrays):
+        super().__init__(manifest, arrays)
+        self.gamma = manifest['gamma']
+        self.intercept = manifest['intercept']
+        self._sv_sq_norms = np.einsum('ij,ij->i', arrays['support_vectors'], arrays['support_vectors'])
+
+    @staticmethod
+    def _kernel_expansion(regressor):
+        """Returns (gamma, intercept, centers, coefficients, approximation) of an exact or Nystroem RBF model."""
+        if type(regressor).__name__ == 'SVR' and regressor.kernel == 'rbf':
+            return (float(regressor._gamma), float(np.ravel(regressor.intercept_)[0]),
+                    regressor.support_vectors_, regressor.dual_coef_, None)
+        if type(regressor).__name__ == 'Pipeline' and len(regressor.steps) == 2:
+            kernel_map, linear = regressor[0], regressor[-1]
+            if (type(kernel_map).__name__ == 'Nystroem' and kernel_map.kernel == 'rbf'
+                    and kernel_map.gamma is not None and np.ndim(getattr(linear, 'coef_', None)) == 1):
+                coefficients = kernel_map.normalization_.T @ linear.coef_
+                return (float(kernel_map.gamma), float(linear.intercept_),
+                        kernel_map.components_, coefficients, 'nystroem')
+        raise ValueError(f'Unsupported regressor: {type(regressor).__name__}')
+
+    @classmethod
+    def from_pipeline(cls, pipeline):
+        gamma, intercept, support_vectors, dual_coef, approximation = cls._kernel_expansion(pipeline['regressor'])
+        manifest, arrays = cls._export_preprocessor(pipeline['preprocessor'])
+        manifest.update({
+            'gamma': gamma,
+            'intercept': intercept,
+            'n_support_vectors': int(support_vectors.shape[0]),
+        })
+        if approximation:
+            manifest['approximation'] = approximation
+        # A sparse ColumnTransformer output leaves sparse support vectors behind
+        arrays.update({
+            'support_vectors': np.asarray(support_vectors.toarray() if hasattr(support_vectors, 'toarray') else support_vectors, dtype=np.float64),
+            'dual_coef': np.asarray(dual_coef.toarray() if hasattr(dual_coef, 'toarray') else dual_coef, dtype=np.float64).ravel(),
+        })
+        return cls(manifest, arrays)
+
+    def _predict_encoded(self, X, out):
+        # ||x - sv||^2 = ||x||^2 + ||sv||^2 - 2 x.sv, clipped at 0 against rounding
+        sq_dist = np.einsum('ij,ij->i', X, X)[:, None] + self._sv_sq_norms[None, :] - 2.0 * (X @ self.arrays['support_vectors'].T)
+        np.maximum(sq_dist, 0.0, out=sq_dist)
+        out[:] = np.exp(-self.gamma * sq_dist) @ self.arrays['dual_coef']
+        out += self.intercept
+        return out
+
+
+def export_artifact(pipeline, compiled_cls, artifact, source_model_file):
+    """
+    Exports a fitted pipeline to the sklearn-free artifact format. Called at the
+    end of SurplusML.py / SpoliageML.py training. Returns the compiled model,
+    or None when the pipeline cannot be compiled.
+    """
+    try:
+        compiled = compiled_cls.from_pipeline(pipeline)
+    except ValueError as e:
+        print(f"[!] Skipping sklearn-free artifact export: {e}")
+        return None
+    compiled.save(artifact, source_model_file)
+    print(f"[SUCCESS] sklearn-free artifact saved to '{artifact}.npz' + '{artifact}.json'.")
+    return compiled
+
+
+def verify_parity(pipeline, compiled, input_df, tolerance=None):
+    """
+    Compares the compiled engine with Pipeline.predict on the same rows.
+    Returns the maximum absolute difference; raises AssertionError above tolerance
+    (default: PARITY_TOLERANCE, or APPROX_PARITY_TOLERANCE for Nystroem models).
+    """
+    if tolerance is None:
+        tolerance = APPROX_PARITY_TOLERANCE if compiled.manifest.get('approximation') else PARITY_TOLERANCE
+    feature_columns = compiled.feature_columns
+    expected = pipeline.predict(input_df[feature_columns])
+    columns = {col: input_df[col].to_numpy() for col in feature_columns}
+    actual = compiled.predict(columns)
+    max_diff = float(np.max(np.abs(expected - actual))) if len(expected) else 0.0
+    assert max_diff <= tolerance, f'Compiled engine differs from Pipeline.predict by {max_diff:.3e}'
+    return max_diff
+
+
+if __name__ == '__main__':
+    # Parity check (and artifact export): python fast_inference.py [--export]
+    import sys
+    import joblib
+    import pandas as pd
+
+    print("=====================================================================")
+    print("            COMPILED INFERENCE ENGINES - PARITY CHECK                ")
+    print("=====================================================================")
+    checks = [
+        (CompiledSurplusModel, SURPLUS_MODEL_FILENAME, SURPLUS_ARTIFACT, 'canteen_daily_log.csv', ['food_id', 'cuisine']),
+        (CompiledSpoilageModel, SPOILAGE_MODEL_FILENAME, SPOILAGE_ARTIFACT, 'food_spoilage_data.csv', ['Food_Type']),
+    ]
+    for compiled_cls, model_file, artifact, data_file, unseen_columns in checks:
+        pipeline = joblib.load(model_file)
+        compiled = compiled_cls.from_pipeline(pipeline)
+        df = pd.read_csv(data_file)
+        print(f"\n[*] {compiled_cls.__name__}: {compiled.n_features} encoded features.")
+
+        max_diff = verify_parity(pipeline, compiled, df)
+        print(f"[OK] {len(df)} rows match Pipeline.predict (max |diff| = {max_diff:.3e}).")
+
+        # Unseen categories must behave like OneHotEncoder(handle_unknown='ignore')
+        unseen = df.head(50).copy()
+        for col in unseen_columns:
+            unseen[col] = 'Unknown Value'
+        max_diff = verify_parity(pipeline, compiled, unseen)
+        print(f"[OK] Unseen categories match (max |diff| = {max_diff:.3e}).")
+
+        record = df[compiled.feature_columns].iloc[0].to_dict()
+        single_df = pd.DataFrame([record], columns=compiled.feature_columns)
+        for label, fn in [('Pipeline.predict', lambda: pipeline.predict(single_df)),
+                          ('Compiled engine ', lambda: compiled.predict(record))]:
+            start = time.perf_counter()
+            for _ in range(200):
+                fn()
+            print(f"  > {label} single-row latency: {(time.perf_counter() - start) / 200 * 1e3:.3f} ms")
+
+        if '--export' in sys.argv:
+            export_artifact(pipeline, compiled_cls, artifact, model_file)
+            reloaded = compiled_cls.load(artifact)
+            print(f"[OK] Reloaded artifact matches (max |diff| = {verify_parity(pipeline, reloaded, df):.3e}).")
+    print("=====================================================================")
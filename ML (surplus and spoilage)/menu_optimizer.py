@@ -0,0 +1,235 @@
+import csv
+import threading
+from collections import defaultdict
+import numpy as np
+from batch_utils import coerce_bool, coerce_number, coerce_string
+
+# --- WEEKLY MENU QUANTITY OPTIMIZER (backs POST /optimize_menu) ---
+# Input is a week of slots (day, meal type, weather, staff, ...) and the
+# candidate dishes. For every slot x dish the planner needs to cover the
+# historical demand, i.e. actual_kg_planned >= demand_kg, where
+#   demand_kg = DEMAND_QUANTILE of meal_qty_ordered / median portions per kg
+# and both are taken from canteen_daily_log.csv for that (food_id, meal_type).
+# If the pair has no history, the food_id history is used, then the whole log.
+# The kg values from demand_kg up to demand_kg * (1 + KG_GRID_HEADROOM) are
+# split into KG_GRID_STEPS points. Every slot x dish x grid point goes into ONE
+# surplus prediction call; a 14-slot week with 40 dishes and 25 points is about
+# 14k rows. For each slot x dish the grid point with the lowest predicted
+# kg_surplus is kept. The dishes_per_slot dishes with the lowest surplus make
+# up that slot's menu.
+# Pandas-free: the history is read with the csv module, once, on first use.
+
+HISTORY_FILE = 'canteen_daily_log.csv'
+DEMAND_QUANTILE = 0.8 # Share of past services whose orders the plan must cover
+KG_GRID_STEPS = 25
+KG_GRID_HEADROOM = 0.5 # Grid spans demand_kg .. demand_kg * 1.5
+MAX_OPTIMIZE_ROWS = 100_000 # slots x dishes x grid points accepted per request
+
+SLOT_NUMERIC_FEATURES = ['month', 'staff_on_duty']
+SLOT_CATEGORICAL_FEATURES = ['day_of_wk', 'meal_type', 'price_type_special_weather']
+DISH_ATTRIBUTES = ['veg_nonveg', 'cuisine', 'estimated_prep_time_hours', 'is_seasonal_dish']
+DISH_CATEGORICAL_ATTRIBUTES = ['veg_nonveg', 'cuisine']
+
+
+class DemandHistory:
+    """Per-dish demand and attributes aggregated from the canteen log."""
+
+    def __init__(self, history_file=HISTORY_FILE, quantile=DEMAND_QUANTILE):
+        orders = defaultdict(list) # (food_id, meal_type) -> meal_qty_ordered
+        portions_per_kg = defaultdict(list) # food_id -> meal_qty_ordered / actual_kg_planned
+        dish_rows = defaultdict(list)
+        peak_ratios = defaultdict(list) # meal_type -> peak_hour_demand_ratio
+
+        with open(history_file, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                food_id, meal_type = row['food_id'], row['meal_type']
+                qty, kg = float(row['meal_qty_ordered']), float(row['actual_kg_planned'])
+                orders[(food_id, meal_type)].append(qty)
+                if kg > 0:
+                    portions_per_kg[food_id].append(qty / kg)
+                dish_rows[food_id].append(row)
+                peak_ratios[meal_type].append(float(row['peak_hour_demand_ratio']))
+
+        by_food = defaultdict(list)
+        for (food_id, _), values in orders.items():
+            by_food[food_id].extend(values)
+        all_orders = [q for values in orders.values() for q in values]
+        all_ratios = [r for values in portions_per_kg.values() for r in values]
+
+        self.quantile = quantile
+        self.demand_portions = {key: float(np.quantile(v, quantile)) for key, v in orders.items()}
+        self.food_demand_portions = {food_id: float(np.quantile(v, quantile)) for food_id, v in by_food.items()}
+        self.default_demand_portions = float(np.quantile(all_orders, quantile))
+        self.portions_per_kg = {food_id: float(np.median(v)) for food_id, v in portions_per_kg.items()}
+        self.default_portions_per_kg = float(np.median(all_ratios))
+        self.peak_ratio = {meal: float(np.median(v)) for meal, v in peak_ratios.items()}
+        self.default_peak_ratio = float(np.median([r for v in peak_ratios.values() for r in v]))
+
+        # Catalogue: dish_name/veg_nonveg/cuisine never change per food_id;
+        # prep time is the median and seasonality the most common value.
+        self.dishes = {}
+        for food_id, rows in dish_rows.items():
+            seasonal = [coerce_bool(r['is_seasonal_dish']) for r in rows]
+            self.dishes[food_id] = {
+                'dish_name': rows[0]['dish_name'],
+                'veg_nonveg': rows[0]['veg_nonveg'],
+                'cuisine': rows[0]['cuisine'],
+                'estimated_prep_time_hours': float(np.median([float(r['estimated_prep_time_hours']) for r in rows])),
+                'is_seasonal_dish': sum(seasonal) * 2 > len(seasonal),
+            }
+
+    def demand(self, food_id, meal_type):
+        """Returns (portions to cover, portions per kg) for one dish in one meal."""
+        portions = self.demand_portions.get((food_id, meal_type),
+                                            self.food_demand_portions.get(food_id, self.default_demand_portions))
+        return portions, self.portions_per_kg.get(food_id, self.default_portions_per_kg)
+
+
+_history = None
+_history_lock = threading.Lock()
+
+
+def get_demand_history():
+    """Loads the demand history once per process (thread-safe)."""
+    global _history
+    if _history is None:
+        with _history_lock:
+            if _history is None:
+                _history = DemandHistory()
+    return _history
+
+
+# --- REQUEST VALIDATION ---
+
+def _coerce(convert, value, label):
+    try:
+        return convert(value)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid value for {label}: {e}")
+
+
+def validate_slot(slot, history):
+    """Returns a clean slot dict; raises ValueError naming the bad field."""
+    if not isinstance(slot, dict):
+        raise ValueError('Slot must be a JSON object.')
+    clean = {}
+    for col in SLOT_CATEGORICAL_FEATURES:
+        if col not in slot:
+            raise ValueError(f"Slot field '{col}' is required.")
+        clean[col] = _coerce(coerce_string, slot[col], f"slot field '{col}'")
+    for col in SLOT_NUMERIC_FEATURES:
+        if col not in slot:
+            raise ValueError(f"Slot field '{col}' is required.")
+        clean[col] = _coerce(coerce_number, slot[col], f"slot field '{col}'")
+    clean['is_holiday'] = _coerce(coerce_bool, slot.get('is_holiday', False), "slot field 'is_holiday'")
+    default_peak = history.peak_ratio.get(clean['meal_type'], history.default_peak_ratio)
+    clean['peak_hour_demand_ratio'] = _coerce(coerce_number, slot.get('peak_hour_demand_ratio', default_peak),
+                                              "slot field 'peak_hour_demand_ratio'")
+    return clean
+
+
+def validate_dish(dish, history):
+    """
+    A dish is a food_id string or an object with food_id; attributes that are
+    not given are taken from the history catalogue. 'min_portions' (>= 0)
+    overrides the historical demand for that dish. Raises ValueError naming
+    the bad field.
+    """
+    if isinstance(dish, str):
+        dish = {'food_id': dish}
+    if not isinstance(dish, dict) or not isinstance(dish.get('food_id'), str):
+        raise ValueError("Dish must be a food_id string or an object with a 'food_id'.")
+    known = history.dishes.get(dish['food_id'], {})
+    clean = {'food_id': dish['food_id'], 'dish_name': dish.get('dish_name', known.get('dish_name'))}
+    for col in DISH_ATTRIBUTES:
+        if col not in dish and col not in known:
+            raise ValueError(f"Dish '{dish['food_id']}' is not in the history; '{col}' is required.")
+        clean[col] = dish.get(col, known.get(col))
+    label = f"dish '{dish['food_id']}'"
+    if clean['dish_name'] is not None:
+        clean['dish_name'] = _coerce(coerce_string, clean['dish_name'], f"'dish_name' of {label}")
+    for col in DISH_CATEGORICAL_ATTRIBUTES:
+        clean[col] = _coerce(coerce_string, clean[col], f"'{col}' of {label}")
+    clean['estimated_prep_time_hours'] = _coerce(coerce_number, clean['estimated_prep_time_hours'],
+                                                 f"'estimated_prep_time_hours' of {label}")
+    clean['is_seasonal_dish'] = _coerce(coerce_bool, clean['is_seasonal_dish'], f"'is_seasonal_dish' of {label}")
+    clean['min_portions'] = (_coerce(coerce_number, dish['min_portions'], f"'min_portions' of {label}")
+                             if 'min_portions' in dish else None)
+    if clean['min_portions'] is not None and clean['min_portions'] < 0:
+        raise ValueError(f"Invalid value for 'min_portions' of {label}: must be >= 0, got {dish['min_portions']!r}")
+    return clean
+
+
+# --- OPTIMIZATION ---
+
+def optimize_week(slots, dishes, predict_columns, dishes_per_slot=None,
+                  grid_steps=KG_GRID_STEPS, headroom=KG_GRID_HEADROOM, history=None):
+    """
+    Scores every slot x dish x kg grid point with ONE predict_columns(columns)
+    call and returns the plan. predict_columns maps a dict of equal-length
+    SurplusInput feature columns to an array of predicted kg_surplus.
+    """
+    history = history or get_demand_history()
+    slots = [validate_slot(slot, history) for slot in slots]
+    dishes = [validate_dish(dish, history) for dish in dishes]
+    n_slots, n_dishes = len(slots), len(dishes)
+    if not n_slots or not n_dishes:
+        raise ValueError("Both 'slots' and 'dishes' must be non-empty lists.")
+    n_rows = n_slots * n_dishes * grid_steps
+    if n_rows > MAX_OPTIMIZE_ROWS:
+        raise ValueError(f'Too many combinations ({n_rows} rows). Maximum is {MAX_OPTIMIZE_ROWS}.')
+
+    # 1. Demand floor per slot x dish, shape (n_slots, n_dishes)
+    demand_portions = np.empty((n_slots, n_dishes))
+    portions_per_kg = np.empty((n_slots, n_dishes))
+    for s, slot in enumerate(slots):
+        for d, dish in enumerate(dishes):
+            portions, ratio = history.demand(dish['food_id'], slot['meal_type'])
+            demand_portions[s, d] = dish['min_portions'] if dish['min_portions'] is not None else portions
+            portions_per_kg[s, d] = ratio
+    demand_kg = np.round(demand_portions / portions_per_kg, 3)
+
+    # 2. kg grid, shape (n_slots, n_dishes, grid_steps); the first point is the demand floor
+    grid = np.round(demand_kg[..., None] * np.linspace(1.0, 1.0 + headroom, grid_steps), 3)
+
+    # 3. Feature columns in slot-major, dish, grid order
+    per_slot = n_dishes * grid_steps
+    columns = {'actual_kg_planned': grid.ravel()}
+    for col in SLOT_CATEGORICAL_FEATURES + SLOT_NUMERIC_FEATURES + ['is_holiday', 'peak_hour_demand_ratio']:
+        columns[col] = np.repeat(np.array([slot[col] for slot in slots], dtype=object), per_slot)
+    for col in ['food_id'] + DISH_ATTRIBUTES:
+        columns[col] = np.tile(np.repeat(np.array([dish[col] for dish in dishes], dtype=object), grid_steps), n_slots)
+
+    # 4. One batched prediction, then the best grid point per slot x dish
+    surplus = np.asarray(predict_columns(columns), dtype=np.float64).reshape(n_slots, n_dishes, grid_steps)
+    best = surplus.argmin(axis=2)
+    best_surplus = np.take_along_axis(surplus, best[..., None], axis=2)[..., 0]
+    best_kg = np.take_along_axis(grid, best[..., None], axis=2)[..., 0]
+
+    # 5. Per slot, keep the dishes with the lowest predicted surplus
+    keep = n_dishes if not dishes_per_slot else min(int(dishes_per_slot), n_dishes)
+    plan = []
+    for s, slot in enumerate(slots):
+        order = np.argsort(best_surplus[s], kind='stable')[:keep]
+        items = [{
+            'food_id': dishes[d]['food_id'],
+            'dish_name': dishes[d]['dish_name'],
+            'actual_kg_planned': float(best_kg[s, d]),
+            'predicted_kg_surplus': round(float(best_surplus[s, d]), 3),
+            'demand_portions': round(float(demand_portions[s, d]), 1),
+            'min_kg_for_demand': float(demand_kg[s, d]),
+        } for d in order]
+        plan.append({
+            'day_of_wk': slot['day_of_wk'],
+            'meal_type': slot['meal_type'],
+            'dishes': items,
+            'total_kg_planned': round(sum(item['actual_kg_planned'] for item in items), 3),
+            'total_predicted_kg_surplus': round(sum(item['predicted_kg_surplus'] for item in items), 3),
+        })
+
+    return {
+        'plan': plan,
+        'total_predicted_kg_surplus': round(sum(slot['total_predicted_kg_surplus'] for slot in plan), 3),
+        'rows_scored': n_rows,
+        'demand_quantile': history.quantile,
+    }
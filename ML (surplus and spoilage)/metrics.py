@@ -0,0 +1,329 @@
+import functools
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from flask import Blueprint, Response, g, request
+
+# --- HOT-PATH INSTRUMENTATION + PROMETHEUS /metrics (shared by both APIs) ---
+# Exposes these metrics:
+#   - ml_stage_seconds{api, stage}: histogram per prediction stage
+#     (parse, validate + cache lookup, frame, transform, predict, surface,
+#     safety_lock, postprocess)
+#   - ml_request_seconds{endpoint} and ml_requests_total{endpoint, status}
+#   - ml_predictions_total{api, status}: per-row outcome, so batch rows count too
+#   - ml_fallbacks_total{api, reason}: rows served from the historical fallback index
+#   - ml_model_load_seconds / ml_model_loads_total, process_resident_memory_bytes,
+#     and the prediction cache counters
+#   - ml_model_reloads_total{model, outcome} and ml_model_info{model, version}
+#     (hot reload, see model_reload.py)
+# Recording a stage costs one perf_counter() call, a bisect and an uncontended
+# lock, so it stays on in production. Each gunicorn worker reports its own numbers.
+#
+# Opt-in sampling profiler: with ML_PROFILE_SLOW_MS=<ms>, a background thread
+# samples the stacks of in-flight requests every ML_PROFILE_INTERVAL_MS. A
+# request slower than the threshold writes its samples as folded stacks
+# ("frame;frame;frame count") to ML_PROFILE_DIR. flamegraph.pl and speedscope
+# read this format. Work a request hands to a thread pool (the surplus model
+# runs in one, see surplus_prediction_api.py) is sampled too when submitted
+# through metrics.profiled(fn); those stacks start with '[<thread name>]'.
+
+# Seconds; spans 50 us (cache hit) to 2.5 s (large batch on the sklearn path)
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+PROFILE_SLOW_MS = float(os.environ.get('ML_PROFILE_SLOW_MS', 0)) # 0 = profiler off
+PROFILE_INTERVAL_MS = float(os.environ.get('ML_PROFILE_INTERVAL_MS', 2))
+PROFILE_DIR = os.environ.get('ML_PROFILE_DIR', 'profiles')
+
+
+def _format_labels(names, values, extra=''):
+    pairs = [f'{n}="{str(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _HistogramChild:
+    __slots__ = ('buckets', 'counts', 'sum', 'lock')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # Last slot is +Inf
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Histogram:
+    """Labelled histogram with fixed buckets (Prometheus semantics: le = upper bound, inclusive)."""
+
+    def __init__(self, name, help_text, label_names, buckets=DEFAULT_BUCKETS):
+        self.name, self.help_text, self.label_names, self.buckets = name, help_text, tuple(label_names), buckets
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, _HistogramChild(self.buckets))
+        return child
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for values, child in sorted(self._children.items()):
+            with child.lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound!r}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.label_names, values, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.label_names, values)} {total}')
+            lines.append(f'{self.name}_count{_format_labels(self.label_names, values)} {cumulative}')
+        return lines
+
+
+class CounterFamily:
+    """Labelled monotonically increasing counter."""
+
+    def __init__(self, name, help_text, label_names):
+        self.name, self.help_text, self.label_names = name, help_text, tuple(label_names)
+        self._values = Counter()
+        self._lock = threading.Lock()
+
+    def inc(self, *values, amount=1):
+        with self._lock:
+            self._values[values] += amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        lines.extend(f'{self.name}{_format_labels(self.label_names, values)} {count}' for values, count in items)
+        return lines
+
+
+class GaugeFamily:
+    """Labelled gauge; either set() directly or computed at scrape time by `callback`."""
+
+    def __init__(self, name, help_text, label_names=(), callback=None, kind='gauge'):
+        self.name, self.help_text, self.label_names = name, help_text, tuple(label_names)
+        self.callback, self.kind = callback, kind
+        self._values = {}
+
+    def set(self, *values, value):
+        self._values[values] = value
+
+    def render(self):
+        items = self.callback() if self.callback else sorted(self._values.items())
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(f'{self.name}{_format_labels(self.label_names, values)} {value}'
+                     for values, value in items if value is not None)
+        return lines
+
+
+def _resident_memory_bytes():
+    """Current RSS from /proc (Linux); falls back to the peak RSS from getrusage elsewhere."""
+    try:
+        with open('/proc/self/statm', encoding='ascii') as f:
+            return [((), int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE'))]
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return []
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return [((), peak if sys.platform == 'darwin' else peak * 1024)]
+
+
+STAGE_SECONDS = Histogram('ml_stage_seconds', 'Time spent per prediction stage.', ['api', 'stage'])
+REQUEST_SECONDS = Histogram('ml_request_seconds', 'End-to-end request handling time.', ['endpoint'])
+REQUESTS_TOTAL = CounterFamily('ml_requests_total', 'HTTP requests by endpoint and status code.', ['endpoint', 'status'])
+PREDICTIONS_TOTAL = CounterFamily('ml_predictions_total', 'Predicted rows by outcome.', ['api', 'status'])
+FALLBACKS_TOTAL = CounterFamily('ml_fallbacks_total', 'Rows answered from the historical fallback index.', ['api', 'reason'])
+MODEL_LOAD_SECONDS = GaugeFamily('ml_model_load_seconds', 'Duration of the last model (re)load.', ['model'])
+MODEL_LOADS_TOTAL = CounterFamily('ml_model_loads_total', 'Model (re)loads.', ['model'])
+MODEL_RELOADS_TOTAL = CounterFamily('ml_model_reloads_total', 'Hot reloads and rollbacks by outcome.', ['model', 'outcome'])
+RESIDENT_MEMORY = GaugeFamily('process_resident_memory_bytes', 'Resident memory of this process.',
+                              callback=_resident_memory_bytes)
+REGISTRY = [STAGE_SECONDS, REQUEST_SECONDS, REQUESTS_TOTAL, PREDICTIONS_TOTAL, FALLBACKS_TOTAL,
+            MODEL_LOAD_SECONDS, MODEL_LOADS_TOTAL, MODEL_RELOADS_TOTAL, RESIDENT_MEMORY]
+
+
+_prediction_caches = []
+for _counter in ('hits', 'misses', 'evictions', 'expirations', 'invalidations'):
+    REGISTRY.append(GaugeFamily(
+        f'ml_prediction_cache_{_counter}_total', f'Prediction cache {_counter}.', ['cache'], kind='counter',
+        callback=lambda counter=_counter: [((cache.name,), getattr(cache, counter)) for cache in _prediction_caches]))
+
+
+def register_prediction_cache(cache):
+    """Exports a PredictionCache's counters as ml_prediction_cache_<counter>_total{cache=...}."""
+    _prediction_caches.append(cache)
+
+
+def observe_stage(api, stage, start):
+    """Records the time since `start` (a perf_counter value) for one stage; returns now for chaining."""
+    now = time.perf_counter()
+    STAGE_SECONDS.labels(api, stage).observe(now - start)
+    return now
+
+
+def record_stage_times(api, stage_times):
+    """Records a {stage: seconds} dict filled in by the compiled engine."""
+    for stage, seconds in stage_times.items():
+        STAGE_SECONDS.labels(api, stage).observe(seconds)
+
+
+def count_predictions(api, results):
+    """Counts per-row outcomes (success / error / safety_override) of a predict_*_records call."""
+    for status, count in Counter(r['status'] for r in results).items():
+        PREDICTIONS_TOTAL.inc(api, status, amount=count)
+
+
+def timed_model_load(model):
+    """Decorator for load_*_model(): records how long every (re)load took."""
+    def decorator(load):
+        @functools.wraps(load)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return load(*args, **kwargs)
+            finally:
+                MODEL_LOAD_SECONDS.set(model, value=round(time.perf_counter() - start, 6))
+                MODEL_LOADS_TOTAL.inc(model)
+        return wrapper
+    return decorator
+
+
+def render_prometheus():
+    lines = []
+    for family in REGISTRY:
+        lines.extend(family.render())
+    return '\n'.join(lines) + '\n'
+
+
+# --- SAMPLING PROFILER (opt-in, ML_PROFILE_SLOW_MS) ---
+
+class SlowRequestProfiler:
+    """Samples the stacks of in-flight requests (and their helper threads); dumps folded stacks for slow requests."""
+
+    def __init__(self, slow_ms, interval_ms, output_dir):
+        self.slow_seconds = slow_ms / 1000.0
+        self.interval = interval_ms / 1000.0
+        self.output_dir = output_dir
+        self._active = {} # thread id -> (Counter of folded stacks, stack prefix)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _sample_forever(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, (stacks, prefix) in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is None:
+                        continue
+                    names = []
+                    while frame is not None:
+                        code = frame.f_code
+                        names.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                        frame = frame.f_back
+                    if prefix:
+                        names.append(prefix)
+                    stacks[';'.join(reversed(names))] += 1
+
+    def start_request(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._sample_forever, name='ml-profiler', daemon=True)
+                    self._thread.start()
+        with self._lock:
+            self._active[threading.get_ident()] = (Counter(), None)
+
+    def follow(self, fn):
+        """
+        Wraps fn so that, wherever it runs, its stacks are sampled into the
+        calling request's profile. Returns fn unchanged outside a request.
+        """
+        with self._lock:
+            entry = self._active.get(threading.get_ident())
+        if entry is None:
+            return fn
+        stacks = entry[0]
+
+        @functools.wraps(fn)
+        def run(*args, **kwargs):
+            ident = threading.get_ident()
+            with self._lock:
+                self._active[ident] = (stacks, f'[{threading.current_thread().name}]')
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._active.pop(ident, None)
+        return run
+
+    def finish_request(self, endpoint, seconds):
+        with self._lock:
+            stacks, _ = self._active.pop(threading.get_ident(), (None, None))
+        if not stacks or seconds < self.slow_seconds:
+            return
+        os.makedirs(self.output_dir, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{endpoint.strip('/').replace('/', '_') or 'root'}-{seconds * 1e3:.0f}ms.folded"
+        with open(os.path.join(self.output_dir, name), 'w', encoding='utf-8') as f:
+            f.writelines(f'{stack} {count}\n' for stack, count in stacks.most_common())
+        print(f"[!] Slow request {endpoint} took {seconds * 1e3:.1f} ms; stacks written to {self.output_dir}/{name}")
+
+
+profiler = SlowRequestProfiler(PROFILE_SLOW_MS, PROFILE_INTERVAL_MS, PROFILE_DIR) if PROFILE_SLOW_MS > 0 else None
+
+
+def profiled(fn):
+    """fn, sampled into the current request's profile when it runs on another thread (no-op with the profiler off)."""
+    return fn if profiler is None else profiler.follow(fn)
+
+
+# --- FLASK WIRING ---
+metrics_api = Blueprint('metrics_api', __name__)
+
+
+@metrics_api.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus text exposition of the metrics above."""
+    return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+
+def instrument_app(app):
+    """Times every request of `app`, counts status codes and registers GET /metrics."""
+    @app.before_request
+    def _start_timer():
+        g.ml_request_start = time.perf_counter()
+        if profiler is not None:
+            profiler.start_request()
+
+    @app.after_request
+    def _record_request(response):
+        start = g.pop('ml_request_start', None)
+        if start is not None:
+            seconds = time.perf_counter() - start
+            endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            REQUEST_SECONDS.labels(endpoint).observe(seconds)
+            REQUESTS_TOTAL.inc(endpoint, response.status_code)
+            if profiler is not None:
+                profiler.finish_request(endpoint, seconds)
+        return response
+
+    app.register_blueprint(metrics_api)
+    return app
@@ -0,0 +1,476 @@
+import csv
+import hmac
+import itertools
+import json
+import os
+import shutil
+import threading
+import time
+import numpy as np
+from flask import Blueprint, jsonify, request
+from fast_inference import file_sha256
+import metrics
+
+# --- ZERO-DOWNTIME MODEL HOT RELOAD (shared by both APIs) ---
+# Each API keeps its loaded model in a HotSwapModel instead of module globals:
+#   - `current` is an immutable ModelBundle (pipeline, compiled engine, ...).
+#     Request handlers read it ONCE and use that bundle for the whole request,
+#     so a swap never mixes two models inside one request and never blocks one.
+#   - reload() loads the new files into a NEW bundle and warms it up with a few
+#     representative predictions while requests keep using the old bundle.
+#     Only then is `current` replaced (one attribute assignment, atomic under
+#     the GIL). A failed load or warm-up keeps the old bundle.
+#   - The file watcher polls size + mtime of the model files every
+#     ML_RELOAD_POLL_SECONDS and reloads once they have not changed for one
+#     more poll, because training writes several files one after the other.
+#   - Version archive (server entry points only, see enable_archive()): every
+#     version that goes live is copied to ML_MODEL_ARCHIVE_DIR/<name>/<version>/
+#     and pushed onto <name>/history.json, oldest first. Importing an API
+#     module (benchmarks, scripts, tests) writes nothing.
+# The files on disk are the single source of truth, so every process (each
+# gunicorn worker) converges on the same version:
+#   - admin reload bumps ML_MODEL_ARCHIVE_DIR/<name>/reload.request, a watched file
+#   - rollback pops the live version off the history and copies the one below
+#     it back over the model files, so repeated rollbacks step back v3 -> v2 -> v1
+#   - a freshly forked worker reloads first if the files changed since the preload
+# Admin endpoints (install_reload(app, models)), all 403 unless ML_ADMIN_TOKEN
+# is set and sent as the X-Admin-Token header:
+#   GET /admin/models, POST /admin/reload[/<name>], POST /admin/rollback/<name>
+
+RELOAD_POLL_SECONDS = float(os.environ.get('ML_RELOAD_POLL_SECONDS', 5)) # 0 = no file watcher (and no admin reloads)
+ADMIN_TOKEN = os.environ.get('ML_ADMIN_TOKEN', '')
+ARCHIVE_DIR = os.environ.get('ML_MODEL_ARCHIVE_DIR', 'model_versions')
+ARCHIVE_KEEP = int(os.environ.get('ML_MODEL_ARCHIVE_KEEP', 3)) # archived versions kept per model, besides the live one
+WARMUP_ROWS = 32 # Representative rows predicted before a new model goes live
+WARMUP_SCAN_ROWS = 2000 # ...picked evenly from the first rows of the training CSV
+
+
+class ModelBundle:
+    """One loaded model version. `version` is the SHA-256 prefix of the model file it came from."""
+
+    def __init__(self, version, **models):
+        self.version = version
+        self.info = {}
+        for name, value in models.items():
+            setattr(self, name, value)
+
+
+def model_version(path):
+    try:
+        return file_sha256(path)[:12]
+    except OSError:
+        return None
+
+
+def file_signature(paths):
+    """(size, mtime_ns) of every watched file; None for a missing file."""
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_size, stat.st_mtime_ns))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+def read_sample_records(csv_file, n_rows=WARMUP_ROWS):
+    """Evenly spaced rows of a training CSV as dicts of strings (for warm-up); [] if the file is missing."""
+    try:
+        with open(csv_file, newline='', encoding='utf-8') as f:
+            rows = list(itertools.islice(csv.DictReader(f), WARMUP_SCAN_ROWS))
+    except OSError:
+        return []
+    if len(rows) <= n_rows:
+        return rows
+    return [rows[int(i)] for i in np.linspace(0, len(rows) - 1, n_rows)]
+
+
+def check_finite(predictions, n_expected):
+    predictions = np.asarray(predictions, dtype=np.float64)
+    if predictions.shape != (n_expected,) or not np.isfinite(predictions).all():
+        raise ValueError(f'warm-up returned {predictions.shape[0] if predictions.ndim else 0} values, '
+                         f'expected {n_expected} finite predictions')
+
+
+class HotSwapModel:
+    """Holds the live ModelBundle of one API and swaps in new versions without blocking requests."""
+
+    def __init__(self, name, build, warm_up, model_files, is_ready=lambda bundle: True, on_swap=None):
+        """
+        build() -> ModelBundle loads the model files; warm_up(bundle) runs
+        representative predictions and raises on failure. model_files[0] is the
+        file whose SHA-256 prefix is the version. A bundle for which is_ready()
+        is False (no model file could be loaded) is only accepted when no ready
+        bundle is live. on_swap(bundle) runs after every swap.
+        """
+        self.name = name
+        self._build, self._warm_up, self._is_ready, self._on_swap = build, warm_up, is_ready, on_swap
+        self.model_files = list(model_files)
+        self.archive_dir = os.path.join(ARCHIVE_DIR, name)
+        self.trigger_file = os.path.join(self.archive_dir, 'reload.request')
+        self.history_file = os.path.join(self.archive_dir, 'history.json')
+        self.watched_files = self.model_files + [self.trigger_file]
+        self.current = None
+        self.previous = None
+        self.last_error = None
+        self.reloads = 0
+        self._reload_lock = threading.Lock() # one reload at a time; requests never take it
+        self._seen_signature = None
+        self._watcher_pid = None
+        self._watcher_lock = threading.Lock()
+        _models.append(self)
+
+    @property
+    def reloading(self):
+        return self._reload_lock.locked()
+
+    def reload(self, reason='manual'):
+        """Loads, warms up and swaps in a new version (blocking). Returns (ok, message)."""
+        if not self._reload_lock.acquire(blocking=False):
+            return False, 'A reload is already running.'
+        try:
+            return self._reload_locked(reason)
+        finally:
+            self._reload_lock.release()
+
+    def _reload_locked(self, reason):
+        signature = file_signature(self.watched_files)
+        start = time.perf_counter()
+        try:
+            bundle = self._build()
+            load_seconds = time.perf_counter() - start
+            ready = self._is_ready(bundle)
+            if not ready and self._is_ready_bundle(self.current):
+                raise ValueError('no model file could be loaded')
+            if ready:
+                self._warm_up(bundle)
+        except Exception as e:
+            self.last_error = f'{type(e).__name__}: {e}'
+            metrics.MODEL_RELOADS_TOTAL.inc(self.name, 'failed')
+            print(f"[!!! ERROR !!!] {self.name} model {reason} reload failed, keeping "
+                  f"{self._version_label(self.current)}: {self.last_error}")
+            return False, self.last_error
+        finally:
+            # A broken file is not retried on every poll, only after it changes again
+            self._seen_signature = signature
+
+        bundle.info.update({
+            'version': bundle.version,
+            'loaded_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'load_seconds': round(load_seconds, 4),
+            'warmup_seconds': round(time.perf_counter() - start - load_seconds, 4),
+            'reason': reason,
+        })
+        # Readers see either the old or the new bundle, never a mix
+        self.current, self.previous = bundle, self.current
+        if self._on_swap is not None:
+            self._on_swap(bundle)
+        self.last_error = None
+        self.reloads += 1
+        metrics.MODEL_RELOADS_TOTAL.inc(self.name, 'success')
+        message = (f"{self.name} model {self._version_label(bundle)} live "
+                   f"(load {bundle.info['load_seconds']:.3f}s, warm-up {bundle.info['warmup_seconds']:.3f}s)")
+        print(f"[SUCCESS] {message}")
+        if ready and _archive_enabled:
+            self._record_live(bundle, reason)
+        return True, message
+
+    def reload_async(self, reason='manual'):
+        """Starts reload() on a background thread; requests keep using the current version meanwhile."""
+        threading.Thread(target=self.reload, args=(reason,), name=f'{self.name}-reload', daemon=True).start()
+
+    def request_reload(self):
+        """Bumps the trigger file, so the file watcher of every process reloads this model."""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        temp_file = f'{self.trigger_file}.{os.getpid()}.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            f.write(f'{time.time()} pid={os.getpid()}\n')
+        os.replace(temp_file, self.trigger_file)
+
+    def rollback(self):
+        """
+        Restores the version that went live before the one on disk: pops the
+        on-disk version off the history, copies the archived files of the new
+        top back over the model files and reloads them. Other processes follow
+        through their file watchers. Never waits for a running reload.
+        Returns (status, message) with status 'ok', 'busy', 'missing' or 'failed'.
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            return 'busy', f'A {self.name} reload is running; retry when it has finished.'
+        try:
+            if not _archive_enabled:
+                return 'missing', 'The version archive is off (enabled by the server entry points, ML_MODEL_ARCHIVE_KEEP > 0).'
+            on_disk = model_version(self.model_files[0])
+            history = self.version_history()
+            while history and history[-1]['version'] == on_disk:
+                history.pop()
+            if not history:
+                return 'missing', f'No earlier {self.name} model version in {self.history_file}.'
+            target = history[-1]['version']
+            source = os.path.join(self.archive_dir, target)
+            if not os.path.isdir(source):
+                return 'missing', f'Archived {self.name} version {target} is gone from {self.archive_dir}.'
+            # Written first: the reload below (and every other worker's) finds the target on top
+            self._write_history(history)
+            # The version file goes last, so a watcher never sees it next to stale artifacts for long
+            for path in self.model_files[1:] + self.model_files[:1]:
+                archived = os.path.join(source, os.path.basename(path))
+                if os.path.exists(archived):
+                    shutil.copyfile(archived, f'{path}.tmp')
+                    os.replace(f'{path}.tmp', path)
+            ok, message = self._reload_locked('rollback')
+        except OSError as e:
+            return 'failed', f'Could not restore {self.name} version: {e}'
+        finally:
+            self._reload_lock.release()
+        if not ok:
+            return 'failed', message
+        metrics.MODEL_RELOADS_TOTAL.inc(self.name, 'rollback')
+        print(f"[!] {self.name} model rolled back to version {target}")
+        return 'ok', message
+
+    # --- VERSION HISTORY + ARCHIVE ---
+
+    def version_history(self):
+        """Versions that went live, oldest first: [{'version', 'live_at', 'reason'}]."""
+        try:
+            with open(self.history_file, encoding='utf-8') as f:
+                history = json.load(f)
+        except (OSError, ValueError):
+            return []
+        return history if isinstance(history, list) else []
+
+    def _write_history(self, history):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        temp_file = f'{self.history_file}.{os.getpid()}.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(history, f, indent=2)
+        os.replace(temp_file, self.history_file)
+
+    def _record_live(self, bundle, reason):
+        """
+        Archives a version that went live and pushes it onto the history. Every
+        worker loads the same version, so it is pushed only when it is not on
+        top already (after a rollback the restored version is on top).
+        """
+        if not self._archive(bundle):
+            return
+        history = self.version_history()
+        if history and history[-1]['version'] == bundle.version:
+            return
+        history.append({'version': bundle.version, 'live_at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'reason': reason})
+        history = history[-(ARCHIVE_KEEP + 1):]
+        try:
+            self._write_history(history)
+        except OSError as e:
+            print(f"[!] Could not update the {self.name} version history: {e}")
+            return
+        # Archived versions that fell off the history can no longer be rolled back to
+        kept = {entry['version'] for entry in history}
+        for name in self._archived_names():
+            if name not in kept:
+                shutil.rmtree(os.path.join(self.archive_dir, name), ignore_errors=True)
+
+    def _archived_names(self):
+        try:
+            return [name for name in os.listdir(self.archive_dir)
+                    if not name.endswith('.tmp') and os.path.isdir(os.path.join(self.archive_dir, name))]
+        except OSError:
+            return []
+
+    def _archive(self, bundle):
+        """Copies the files of a live version to <archive_dir>/<version>/ once. Returns True when it is archived."""
+        if not bundle.version:
+            return False
+        target = os.path.join(self.archive_dir, bundle.version)
+        if os.path.isdir(target):
+            return True
+        temp_dir = f'{target}.{os.getpid()}.tmp'
+        try:
+            os.makedirs(temp_dir, exist_ok=True)
+            for path in self.model_files:
+                if os.path.exists(path):
+                    shutil.copyfile(path, os.path.join(temp_dir, os.path.basename(path)))
+            # The files may have been replaced again since they were loaded
+            if model_version(os.path.join(temp_dir, os.path.basename(self.model_files[0]))) != bundle.version:
+                raise ValueError('model file changed while archiving')
+            os.rename(temp_dir, target) # fails if another worker archived it first
+        except (OSError, ValueError) as e:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            if not os.path.isdir(target):
+                print(f"[!] Could not archive {self.name} version {bundle.version}: {e}")
+                return False
+        return True
+
+    def _is_ready_bundle(self, bundle):
+        return bundle is not None and self._is_ready(bundle)
+
+    def _version_label(self, bundle):
+        if not self._is_ready_bundle(bundle):
+            return 'no model'
+        return f"version {bundle.version or 'unknown'}"
+
+    def describe(self):
+        def summary(bundle):
+            return dict(bundle.info, model_loaded=self._is_ready(bundle)) if bundle is not None else None
+        return {
+            'current': summary(self.current),
+            'previous': summary(self.previous),
+            'on_disk_version': model_version(self.model_files[0]),
+            'version_history': [entry['version'] for entry in self.version_history()],
+            'archive_enabled': _archive_enabled,
+            'reloading': self.reloading,
+            'reloads': self.reloads,
+            'last_error': self.last_error,
+            'watched_files': self.watched_files,
+            'poll_seconds': RELOAD_POLL_SECONDS or None,
+        }
+
+    # --- FILE WATCHER ---
+
+    def ensure_watcher(self):
+        """Starts the watcher thread in this process (again after a fork, e.g. in every gunicorn worker)."""
+        if RELOAD_POLL_SECONDS <= 0 or self._watcher_pid == os.getpid():
+            return
+        with self._watcher_lock:
+            if self._watcher_pid == os.getpid():
+                return
+            self._watcher_pid = os.getpid()
+            threading.Thread(target=self._watch_forever, name=f'{self.name}-model-watcher', daemon=True).start()
+
+    def sync_after_fork(self):
+        """In a new worker: reloads before serving if the files changed since the preload, then starts the watcher."""
+        if RELOAD_POLL_SECONDS > 0 and file_signature(self.watched_files) != self._seen_signature:
+            self.reload('worker_start')
+        self.ensure_watcher()
+
+    def _watch_forever(self):
+        pending = None
+        while True:
+            time.sleep(RELOAD_POLL_SECONDS)
+            signature = file_signature(self.watched_files)
+            if signature == self._seen_signature or self.reloading:
+                pending = None
+            elif signature != pending:
+                pending = signature # Still being written; check again on the next poll
+            else:
+                pending = None
+                self.reload('file_change')
+
+
+_models = [] # every HotSwapModel of this process, for the metrics below
+_archive_enabled = False # set by enable_archive() in the server entry points
+
+
+def _model_info():
+    return [((model.name, model.current.version or 'unknown'), 1)
+            for model in _models if model._is_ready_bundle(model.current)]
+
+
+metrics.REGISTRY.append(metrics.GaugeFamily('ml_model_info', 'Live model version (value is always 1).',
+                                            ['model', 'version'], callback=_model_info))
+
+
+def enable_archive():
+    """
+    Turns the version archive on for this process and records the versions
+    that are live now, so the first retrained model can be rolled back. Called
+    by the server entry points (serve.py, `python prediction_service.py`, ...),
+    never at import time. No-op with ML_MODEL_ARCHIVE_KEEP=0.
+    """
+    global _archive_enabled
+    if ARCHIVE_KEEP <= 0:
+        return
+    _archive_enabled = True
+    for model in _models:
+        if model._is_ready_bundle(model.current):
+            model._record_live(model.current, 'startup')
+
+
+def after_fork():
+    """gunicorn post_fork hook (serve.py): brings every model of the new worker up to the files on disk."""
+    for model in _models:
+        model.sync_after_fork()
+
+
+# --- FLASK WIRING ---
+
+def install_reload(app, models):
+    """Registers the admin endpoints for `models` on `app` and starts the file watchers on the first request."""
+    models = {model.name: model for model in models}
+    admin_api = Blueprint('model_admin', __name__)
+
+    @admin_api.before_request
+    def _check_token():
+        # Closed unless a token is configured: the service binds to 0.0.0.0
+        if not ADMIN_TOKEN:
+            return jsonify({'error': 'Admin endpoints are disabled. Set ML_ADMIN_TOKEN to enable them.'}), 403
+        if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN):
+            return jsonify({'error': 'Missing or invalid X-Admin-Token.'}), 403
+
+    def _unknown(name):
+        return jsonify({'error': f"Unknown model '{name}'. Known: {', '.join(models)}"}), 404
+
+    def _watcher_off():
+        # Without the watcher other worker processes would never follow
+        return jsonify({'error': 'The file watcher is off (ML_RELOAD_POLL_SECONDS=0); '
+                                 'reloads and rollbacks would reach only this process.'}), 409
+
+    @admin_api.route('/admin/models', methods=['GET'])
+    def admin_models():
+        """Live, previous and on-disk versions and the version history of every model, with load and warm-up times."""
+        return jsonify({'pid': os.getpid(), 'models': {name: model.describe() for name, model in models.items()}})
+
+    @admin_api.route('/admin/reload', methods=['POST'])
+    @admin_api.route('/admin/reload/<name>', methods=['POST'])
+    def admin_reload(name=None):
+        """
+        Reloads one model (or all) from disk in every process: bumps the
+        watched trigger file, then reloads this process at once. Returns 202
+        and loads in the background; with ?wait=1 it blocks and returns the
+        outcome. 409 while a reload of that model is already running.
+        """
+        if name is not None and name not in models:
+            return _unknown(name)
+        if RELOAD_POLL_SECONDS <= 0:
+            return _watcher_off()
+        targets = [models[name]] if name else list(models.values())
+        busy = [model.name for model in targets if model.reloading]
+        if busy:
+            return jsonify({'error': f"A reload is already running: {', '.join(busy)}"}), 409
+        for model in targets:
+            model.request_reload()
+
+        if request.args.get('wait') not in ('1', 'true'):
+            for model in targets:
+                model.reload_async('admin')
+            return jsonify({'status': 'reloading', 'models': [model.name for model in targets]}), 202
+
+        outcomes = {model.name: model.reload('admin') for model in targets}
+        ok = all(success for success, _ in outcomes.values())
+        return jsonify({
+            'status': 'success' if ok else 'error',
+            'models': {name: {'ok': success, 'message': message, 'current': models[name].describe()['current']}
+                       for name, (success, message) in outcomes.items()},
+        }), 200 if ok else 500
+
+    @admin_api.route('/admin/rollback/<name>', methods=['POST'])
+    def admin_rollback(name):
+        """Restores the previous archived version of one model; every process follows through its watcher."""
+        if name not in models:
+            return _unknown(name)
+        if RELOAD_POLL_SECONDS <= 0:
+            return _watcher_off()
+        status, message = models[name].rollback()
+        if status != 'ok':
+            return jsonify({'error': message}), 500 if status == 'failed' else 409
+        return jsonify({'status': 'success', 'message': message, 'current': models[name].describe()['current']})
+
+    @app.before_request
+    def _start_watchers():
+        for model in models.values():
+            model.ensure_watcher()
+
+    app.register_blueprint(admin_api)
+    return app
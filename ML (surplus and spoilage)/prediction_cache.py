@@ -0,0 +1,120 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# --- BOUNDED LRU/TTL PREDICTION CACHE (shared by both APIs) ---
+# The app sends many identical feature vectors (same dish, day, meal and
+# weather), so raw model outputs are cached per canonicalized feature tuple.
+# By default float features are keyed (and predicted) exactly, so responses
+# equal the uncached model output. PREDICTION_CACHE_QUANTIZE=1 rounds them to
+# each API's digits to raise the hit rate; the model then also scores the
+# rounded values, so hits and misses agree, but outputs move by up to the
+# model's change over half a rounding step.
+
+DEFAULT_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', 10000)) # 0 disables caching
+DEFAULT_CACHE_TTL_SECONDS = float(os.environ.get('PREDICTION_CACHE_TTL', 0)) # 0 = entries never expire
+QUANTIZE_FLOATS = os.environ.get('PREDICTION_CACHE_QUANTIZE', '0') == '1' # Opt-in: round float features
+
+
+def quantize(value, digits):
+    """Rounds a float for use in a cache key; -0.0 is normalized to 0.0."""
+    return round(float(value), digits) + 0.0
+
+
+def canonical_key(row, columns, float_digits, bool_columns=()):
+    """
+    Builds a hashable cache key from a validated row.
+      - float columns (listed in float_digits) are rounded to their digits
+      - boolean columns are normalized to True/False
+      - everything else (category strings) is used as-is, because the models
+        treat e.g. 'Lunch' and 'lunch' as different categories
+    """
+    key = []
+    for col in columns:
+        value = row[col]
+        if col in float_digits:
+            value = quantize(value, float_digits[col])
+        elif col in bool_columns:
+            value = bool(value)
+        key.append(value)
+    return tuple(key)
+
+
+class PredictionCache:
+    """Thread-safe LRU cache with an optional time-to-live and hit/miss/eviction counters."""
+
+    def __init__(self, name, maxsize=DEFAULT_CACHE_SIZE, ttl_seconds=DEFAULT_CACHE_TTL_SECONDS):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict() # key -> (value, expires_at, model version)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0
+
+    def get(self, key, version=None):
+        """
+        Returns (True, value) on a hit and (False, None) on a miss or expired
+        entry. An entry stored by another model version is a miss, so a request
+        that started before a hot reload never serves or leaves stale values.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            value, expires_at, entry_version = entry
+            if entry_version != version:
+                del self._entries[key]
+                self.misses += 1
+                return False, None
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def put(self, key, value, version=None):
+        if not self.enabled:
+            return
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds > 0 else None
+        with self._lock:
+            self._entries[key] = (value, expires_at, version)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        """Drops every entry. Called whenever the model behind the cache is (re)loaded."""
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'name': self.name,
+                'enabled': self.enabled,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl_seconds': self.ttl_seconds or None,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
@@ -0,0 +1,112 @@
+##PORT 8082
+import json
+import time
+from flask import Flask, request, jsonify
+import metrics
+from model_reload import enable_archive, install_reload
+# Importing the two API modules loads both models into THIS interpreter, so
+# the models (and sklearn/pandas, if needed at all) are held in memory only once.
+import surplus_prediction_api as surplus
+import spoilage_prediction_api as spoilage
+
+# --- FILE AND MODEL CONFIGURATION ---
+SERVICE_PORT = 8082
+
+# --- FLASK SETUP ---
+app = Flask(__name__)
+metrics.instrument_app(app) # Request timing + GET /metrics for both models
+install_reload(app, [surplus.surplus_model, spoilage.spoilage_model]) # /admin/* + model file watchers
+# Keep every existing route (/predict_surplus, /predict_spoilage and the batch
+# variants) available on this single port for backwards compatibility.
+app.register_blueprint(surplus.surplus_api)
+app.register_blueprint(spoilage.spoilage_api)
+
+
+def _run_section(payload, model_loaded, predict_records, max_batch_size):
+    """
+    Scores one section ('surplus' or 'spoilage') of a combined request.
+    A JSON object is treated as a single record and returns one result;
+    a JSON array is treated as a batch and returns a list of results.
+    """
+    if not model_loaded:
+        return {'status': 'error', 'error': 'Model not loaded.'}
+
+    if isinstance(payload, list):
+        if len(payload) > max_batch_size:
+            return {'status': 'error', 'error': f'Batch too large. Maximum is {max_batch_size} records.'}
+        return predict_records([(record, None) for record in payload])
+
+    result = predict_records([(payload, None)])[0]
+    result.pop('index', None)
+    return result
+
+
+@app.route('/predict', methods=['POST'])
+def predict():
+    """
+    Returns surplus and spoilage predictions in one round trip.
+    Example JSON Input (either key may be omitted, and either value may be a
+    single record or an array of records):
+    {
+        "surplus": { ...SurplusInput... },
+        "spoilage": [ { ...SpoilageInput... }, { ...SpoilageInput... } ]
+    }
+    """
+    try:
+        start = time.perf_counter()
+        data = json.loads(request.get_data(as_text=True))
+        metrics.observe_stage('combined', 'parse', start)
+    except ValueError as e:
+        return jsonify({'error': 'Invalid JSON payload.', 'details': str(e)}), 400
+
+    if not isinstance(data, dict) or not ({'surplus', 'spoilage'} & data.keys()):
+        return jsonify({'error': "Expected an object with 'surplus' and/or 'spoilage' keys."}), 400
+
+    response = {'status': 'success'}
+    try:
+        if 'surplus' in data:
+            response['surplus'] = _run_section(
+                data['surplus'], surplus.service_available(),
+                surplus.predict_surplus_with_budget, surplus.MAX_BATCH_SIZE)
+        if 'spoilage' in data:
+            response['spoilage'] = _run_section(
+                data['spoilage'], spoilage.model_loaded(),
+                spoilage.predict_spoilage_records, spoilage.MAX_BATCH_SIZE)
+    except Exception as e:
+        print(f"Combined Prediction Error: {e}")
+        return jsonify({'error': 'Processing failed.', 'details': str(e)}), 500
+
+    return jsonify(response)
+
+
+@app.route('/health', methods=['GET'])
+def health():
+    """Reports which pipelines (and which versions) are loaded in this process."""
+    surplus_bundle, spoilage_bundle = surplus.surplus_model.current, spoilage.spoilage_model.current
+    return jsonify({
+        'status': 'ok',
+        'surplus_model_loaded': surplus.model_loaded(),
+        'surplus_fallback_loaded': surplus_bundle is not None and surplus_bundle.fallback_index is not None,
+        'spoilage_model_loaded': spoilage.model_loaded(),
+        'surplus_model_version': surplus_bundle.version if surplus.model_loaded() else None,
+        'spoilage_model_version': spoilage_bundle.version if spoilage.model_loaded() else None,
+    })
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    """Reports the counters of both prediction caches."""
+    return jsonify({
+        'surplus': surplus.prediction_cache.stats(),
+        'spoilage': spoilage.prediction_cache.stats(),
+    })
+
+# To run the combined API server (replaces running the two APIs separately)
+if __name__ == '__main__':
+    print("\n==========================================================")
+    print("      FLASK COMBINED PREDICTION SERVICE STARTING")
+    print("==========================================================")
+    print(f"Combined endpoint: http://127.0.0.1:{SERVICE_PORT}/predict")
+    print(f"Legacy endpoints:  /predict_surplus, /predict_spoilage (+ _batch)")
+    print("Press CTRL+C to stop the server.")
+    enable_archive() # Version history for /admin/rollback (not on import)
+    app.run(host='0.0.0.0', port=SERVICE_PORT, debug=False)
@@ -0,0 +1,110 @@
+import argparse
+import gc
+import importlib
+import os
+import sys
+
+# --- PRODUCTION LAUNCHER (pre-fork, multi-process) ---
+# `app.run()` in the API modules starts Flask's single-process development
+# server. This launcher runs the same Flask apps under gunicorn instead:
+#   - the API module (and therefore both joblib pipelines) is imported ONCE in
+#     the parent process (preload_app), then workers are forked from it
+#   - gc.freeze() moves the loaded objects out of the garbage collector's
+#     reach, so workers keep sharing those pages copy-on-write instead of
+#     dirtying them on the first collection
+#   - right after the fork each worker reloads any model whose files changed
+#     since the preload, then starts its file watcher (model_reload.py), so all
+#     workers, including recycled ones, serve the version on disk
+# gunicorn is Linux/macOS only; on Windows keep using `python prediction_service.py`.
+
+APP_MODULES = {
+    'combined': 'prediction_service', # both models + /predict (default)
+    'surplus': 'surplus_prediction_api',
+    'spoilage': 'spoilage_prediction_api',
+}
+DEFAULT_PORTS = {'combined': 8082, 'surplus': 8082, 'spoilage': 8083}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Run the prediction APIs with pre-forked gunicorn workers.')
+    parser.add_argument('--app', choices=sorted(APP_MODULES), default=os.environ.get('ML_APP', 'combined'))
+    parser.add_argument('--host', default=os.environ.get('ML_HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ['ML_PORT']) if 'ML_PORT' in os.environ else None)
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('ML_WORKERS', os.cpu_count() or 1)),
+                        help='Worker processes (default: one per CPU core).')
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('ML_THREADS', 1)),
+                        help='Threads per worker; >1 switches to the gthread worker class.')
+    parser.add_argument('--timeout', type=int, default=int(os.environ.get('ML_TIMEOUT', 30)),
+                        help='Seconds before a silent worker is killed and restarted.')
+    parser.add_argument('--graceful-timeout', type=int, default=int(os.environ.get('ML_GRACEFUL_TIMEOUT', 20)),
+                        help='Seconds workers get to finish in-flight requests on SIGTERM/restart.')
+    parser.add_argument('--max-requests', type=int, default=int(os.environ.get('ML_MAX_REQUESTS', 0)),
+                        help='Recycle a worker after this many requests (0 = never).')
+    return parser.parse_args(argv)
+
+
+def _post_fork(server, worker):
+    import model_reload # imported by the API module in the parent already
+    model_reload.after_fork()
+
+
+def build_options(args):
+    port = args.port or DEFAULT_PORTS[args.app]
+    return {
+        'bind': f'{args.host}:{port}',
+        'workers': args.workers,
+        'threads': args.threads,
+        'worker_class': 'gthread' if args.threads > 1 else 'sync',
+        'timeout': args.timeout,
+        'graceful_timeout': args.graceful_timeout,
+        'max_requests': args.max_requests,
+        'max_requests_jitter': args.max_requests // 10,
+        'preload_app': True,
+        'post_fork': _post_fork,
+        'accesslog': None,
+        'errorlog': '-',
+    }
+
+
+def load_app(app_name):
+    """Imports the API module (loading its models), turns on the version archive and freezes the heap for copy-on-write sharing."""
+    module = importlib.import_module(APP_MODULES[app_name])
+    import model_reload
+    model_reload.enable_archive() # in the parent, once: workers inherit the flag
+    gc.collect()
+    gc.freeze()
+    return module.app
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        print("[!!! ERROR !!!] gunicorn is not installed. Run: pip install gunicorn")
+        sys.exit(1)
+
+    class PredictionServer(BaseApplication):
+        def __init__(self, options):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return load_app(args.app)
+
+    options = build_options(args)
+    print("\n==========================================================")
+    print("      PRODUCTION PREDICTION SERVER STARTING (gunicorn)")
+    print("==========================================================")
+    print(f"App: {args.app} ({APP_MODULES[args.app]}) on http://{options['bind']}")
+    print(f"Workers: {options['workers']} x {options['threads']} thread(s), timeout {options['timeout']}s, "
+          f"graceful shutdown {options['graceful_timeout']}s")
+    PredictionServer(options).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,118 +1,261 @@
 ##PORT 8083
 
-import pandas as pd
-import joblib
+import os
 import json
-from flask import Flask, request, jsonify
-from sklearn.svm import SVR # Required for joblib load
-from sklearn.preprocessing import StandardScaler, OneHotEncoder # Required for joblib load
-from sklearn.compose import ColumnTransformer # Required for joblib load
-from sklearn.pipeline import Pipeline # Required for joblib load
+import time
+from datetime import datetime, timedelta, timezone
+from flask import Blueprint, Flask, request, jsonify
+from batch_utils import coerce_number, parse_batch_body, batch_summary
+from fast_inference import CompiledSpoilageModel, SPOILAGE_ARTIFACT
+from spoilage_surface import load_or_build_surface, DEFAULT_GRID_STEP_HOURS, DEFAULT_TIME_MAX_HOURS
+from prediction_cache import PredictionCache, QUANTIZE_FLOATS, canonical_key
+from model_reload import HotSwapModel, ModelBundle, check_finite, enable_archive, install_reload, model_version, read_sample_records
+import metrics
 import numpy as np # Needed for mathematical operations
+# Note: joblib, pandas and sklearn are imported lazily, only when the
+# sklearn-free artifact (spoilage_svr_model.npz/.json) is missing or stale,
+# or when SPOILAGE_ENGINE=sklearn.
 
 # --- FILE AND MODEL CONFIGURATION ---
 MODEL_FILENAME = 'spoilage_svr_pipeline.joblib' 
 SPOILAGE_FEATURE_COLUMNS = ['Time_Since_Prep_Hours', 'Storage_Info', 'Food_Type', 'Meal_Time']
 ROOM_TEMP_SAFETY_CAP_HOURS = 4.0 # Maximum total safe time (Rule: 4 hours)
 MIN_SAFE_TIME_HOURS = 0.0 # Time to return if spoiled/near expiry
+SPOILAGE_CATEGORICAL_FEATURES = ['Storage_Info', 'Food_Type', 'Meal_Time']
+MAX_BATCH_SIZE = 5000 # Upper bound on records accepted by /predict_spoilage_batch
+# /spoilage_curve: remaining safe time projected over a horizon for each item
+CURVE_HORIZON_HOURS = 24.0
+CURVE_STEP_MINUTES = 15.0
+MAX_CURVE_HORIZON_HOURS = 72.0
+MIN_CURVE_STEP_MINUTES = 1.0
+MAX_CURVE_POINTS = 500_000 # items x time points scored per request
+DATA_FILENAME = 'food_spoilage_data.csv' # Source of the known category values
+# 'compiled' scores requests with the NumPy-only SVR in fast_inference.py;
+# 'sklearn' always goes through pd.DataFrame + Pipeline.predict.
+SPOILAGE_ENGINE = os.environ.get('SPOILAGE_ENGINE', 'compiled')
+# Precomputed prediction surface (see spoilage_surface.py). Off by default:
+# interpolated values differ from the live SVR by at most the reported error.
+USE_PREDICTION_SURFACE = os.environ.get('SPOILAGE_SURFACE', '0') == '1'
+SURFACE_STEP_HOURS = float(os.environ.get('SPOILAGE_SURFACE_STEP_HOURS', DEFAULT_GRID_STEP_HOURS))
+SURFACE_MAX_HOURS = float(os.environ.get('SPOILAGE_SURFACE_MAX_HOURS', DEFAULT_TIME_MAX_HOURS))
+PERSIST_SURFACE = os.environ.get('SPOILAGE_SURFACE_PERSIST', '1') == '1'
+# Cache key rounding (opt-in, PREDICTION_CACHE_QUANTIZE=1): prep time is
+# quantized to 0.01 h before caching and prediction. The safety lock always
+# uses the exact prep time from the request.
+SPOILAGE_CACHE_FLOAT_DIGITS = {'Time_Since_Prep_Hours': 2} if QUANTIZE_FLOATS else {}
 
 # --- FLASK SETUP ---
-app = Flask(__name__)
+# Routes live on a Blueprint so prediction_service.py can host this API and the
+# surplus API in a single process.
+spoilage_api = Blueprint('spoilage_api', __name__)
+
+# Raw SVR outputs keyed on the canonicalized feature tuple
+prediction_cache = PredictionCache('spoilage')
+metrics.register_prediction_cache(prediction_cache)
+
+# --- MODEL LOADING (hot-reloadable, see model_reload.py) ---
+# The live model is spoilage_model.current, a ModelBundle with `pipeline`,
+# `compiled` and `surface`. Handlers read it once per request.
+
+
+def predict_with_model(columns, bundle=None, observe=True):
+    """Runs the live SVR (compiled, or the sklearn pipeline) on a dict of equal-length feature columns."""
+    bundle = bundle or spoilage_model.current
+    if bundle.compiled is not None:
+        stage_times = {}
+        predictions = bundle.compiled.predict(columns, stage_times=stage_times)
+        if observe:
+            metrics.record_stage_times('spoilage', stage_times)
+        return predictions
+    import pandas as pd
+    observe_stage = metrics.observe_stage if observe else lambda api, stage, start: time.perf_counter()
+    stage_start = time.perf_counter()
+    input_df = pd.DataFrame(columns, columns=SPOILAGE_FEATURE_COLUMNS)
+    stage_start = observe_stage('spoilage', 'frame', stage_start)
+    # Same as pipeline.predict, split so both stages are timed
+    X = bundle.pipeline['preprocessor'].transform(input_df)
+    stage_start = observe_stage('spoilage', 'transform', stage_start)
+    predictions = bundle.pipeline['regressor'].predict(X)
+    observe_stage('spoilage', 'predict', stage_start)
+    return predictions
+
+
+@metrics.timed_model_load('spoilage')
+def load_spoilage_model():
+    """
+    Loads the spoilage model files into a new ModelBundle and builds its
+    prediction surface when enabled. The sklearn-free artifact is preferred
+    over unpickling the joblib pipeline. Nothing global is touched:
+    spoilage_model swaps the bundle in after its warm-up.
+    """
+    spoilage_pipeline, compiled_model = None, None
+
+    if SPOILAGE_ENGINE == 'compiled':
+        try:
+            compiled_model = CompiledSpoilageModel.load_if_current(SPOILAGE_ARTIFACT, MODEL_FILENAME)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[!] Could not read artifact '{SPOILAGE_ARTIFACT}': {e}")
+        if compiled_model is not None:
+            print(f"[*] Successfully loaded sklearn-free model artifact: {SPOILAGE_ARTIFACT}.npz")
+
+    if compiled_model is None:
+        try:
+            import joblib
+            spoilage_pipeline = joblib.load(MODEL_FILENAME)
+            print(f"[*] Successfully loaded ML pipeline: {MODEL_FILENAME}")
+        except Exception as e:
+            print(f"[!!! ERROR !!!] Failed to load model: {e}")
+            spoilage_pipeline = None
+
+    if spoilage_pipeline is not None and SPOILAGE_ENGINE == 'compiled':
+        try:
+            compiled_model = CompiledSpoilageModel.from_pipeline(spoilage_pipeline)
+            print(f"[*] Compiled inference engine ready ({compiled_model.manifest['n_support_vectors']} support vectors).")
+        except ValueError as e:
+            print(f"[!] Compiled engine unavailable, using sklearn pipeline: {e}")
+
+    bundle = ModelBundle(model_version(MODEL_FILENAME), pipeline=spoilage_pipeline, compiled=compiled_model, surface=None)
+    bundle.info['engine'] = 'compiled' if compiled_model is not None else 'sklearn' if spoilage_pipeline is not None else None
+    if _has_model(bundle) and USE_PREDICTION_SURFACE:
+        try:
+            # Built from the NEW model, before it goes live
+            bundle.surface = load_or_build_surface(
+                lambda columns: predict_with_model(columns, bundle, observe=False), MODEL_FILENAME, DATA_FILENAME,
+                step=SURFACE_STEP_HOURS, time_max=SURFACE_MAX_HOURS, persist=PERSIST_SURFACE)
+        except (OSError, ValueError) as e:
+            print(f"[!] Prediction surface unavailable, using live SVR: {e}")
+    return bundle
+
 
-# --- MODEL LOADING (Done once at startup) ---
-try:
-    spoilage_pipeline = joblib.load(MODEL_FILENAME)
-    print(f"[*] Successfully loaded ML pipeline: {MODEL_FILENAME}")
-except Exception as e:
-    print(f"[!!! ERROR !!!] Failed to load model: {e}")
-    spoilage_pipeline = None
+def _has_model(bundle):
+    return bundle.compiled is not None or bundle.pipeline is not None
 
-@app.route('/predict_spoilage', methods=['POST'])
+
+def warm_up_spoilage_model(bundle):
+    """Predicts a few rows of the training data with the new bundle (surface and live SVR)."""
+    rows = [row for row, error in map(validate_spoilage_record, read_sample_records(DATA_FILENAME)) if not error]
+    if not rows:
+        print(f"[!] No warm-up rows in '{DATA_FILENAME}'; swapping in without a warm-up.")
+        return
+    columns = {col: [row[col] for row in rows] for col in SPOILAGE_FEATURE_COLUMNS}
+    check_finite(predict_raw_spoilage(columns, bundle, observe=False), len(rows))
+    check_finite(predict_with_model(columns, bundle, observe=False), len(rows))
+    for row in rows[:3]:
+        check_finite(predict_with_model({col: [row[col]] for col in SPOILAGE_FEATURE_COLUMNS}, bundle, observe=False), 1)
+
+
+spoilage_model = HotSwapModel(
+    'spoilage', load_spoilage_model, warm_up_spoilage_model,
+    model_files=[MODEL_FILENAME, f'{SPOILAGE_ARTIFACT}.npz', f'{SPOILAGE_ARTIFACT}.json'],
+    is_ready=_has_model, on_swap=lambda bundle: prediction_cache.invalidate())
+
+
+def model_loaded():
+    bundle = spoilage_model.current
+    return bundle is not None and _has_model(bundle)
+
+
+def predict_raw_spoilage(columns, bundle=None, observe=True):
+    """
+    Returns raw model predictions for a dict of feature columns. Uses the
+    precomputed surface when enabled and falls back to the live SVR for unseen
+    categories or times outside the grid.
+    """
+    bundle = bundle or spoilage_model.current
+    if bundle.surface is None:
+        return predict_with_model(columns, bundle, observe)
+
+    stage_start = time.perf_counter()
+    values, hit = bundle.surface.lookup(
+        columns['Time_Since_Prep_Hours'], columns['Storage_Info'],
+        columns['Food_Type'], columns['Meal_Time'])
+    if observe:
+        metrics.observe_stage('spoilage', 'surface', stage_start)
+    if not hit.all():
+        miss = np.flatnonzero(~hit)
+        values[miss] = predict_with_model({col: [columns[col][i] for i in miss] for col in SPOILAGE_FEATURE_COLUMNS},
+                                          bundle, observe)
+    return values
+
+# --- SAFETY LOCK (vectorized, shared by the single and batch endpoints) ---
+
+def apply_safety_lock(time_since_prep, is_room_temp, predicted_time_raw):
+    """
+    Applies the Room Temp safety rules to arrays of predictions in one pass.
+
+    All inputs are equal-length NumPy arrays. Returns three arrays:
+      - safe_hours: the final remaining safe time for every row
+      - overridden: True where the 4.0h hard lock fired (food is spoiled)
+      - undefined:  True where the percentage scaling divides by zero
+
+    The comparisons are written with np.where in the same orientation as the
+    original Python max()/min() calls, so every row is bit-identical to the
+    scalar logic (including returning +0.0 rather than -0.0).
+    """
+    # --- Check 1: Immediate Spoiled Lock (Prep time >= 4h)
+    overridden = is_room_temp & (time_since_prep >= ROOM_TEMP_SAFETY_CAP_HOURS)
+    scaled_rows = is_room_temp & ~overridden
+
+    # --- Check 2: Apply Varied ML Cap Logic
+    # Total life predicted by the ML model (Prep Time + Raw Remaining Time)
+    total_safe_time_ml = time_since_prep + predicted_time_raw
+    undefined = scaled_rows & (total_safe_time_ml == 0)
+    # The legal max remaining time: 4.0 - time_since_prep (e.g., 4.0 - 1.0 = 3.0)
+    max_legally_safe_remaining = ROOM_TEMP_SAFETY_CAP_HOURS - time_since_prep
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Calculate what % of the total life is left, then apply it to the legal window
+        percentage_remaining = predicted_time_raw / total_safe_time_ml
+    scaled_time = percentage_remaining * max_legally_safe_remaining
+    # Final value must be between 0 and max_remaining: max(0.0, min(max_remaining, t))
+    scaled_time = np.where(scaled_time < max_legally_safe_remaining, scaled_time, max_legally_safe_remaining)
+    scaled_time = np.where(scaled_time > 0.0, scaled_time, 0.0)
+
+    # For Refrigerated/Other Storage the raw ML prediction is kept.
+    safe_hours = np.where(scaled_rows, scaled_time, predicted_time_raw)
+    safe_hours = np.where(overridden, MIN_SAFE_TIME_HOURS, safe_hours)
+
+    # --- Check 3: Enforce the absolute minimum floor (applies to all storage types)
+    safe_hours = np.where(safe_hours > MIN_SAFE_TIME_HOURS, safe_hours, MIN_SAFE_TIME_HOURS)
+    return safe_hours, overridden, undefined
+
+
+def round_raw_predictions(prediction_array):
+    """
+    Rounds raw SVR output to 2 decimals with Python's round(), which is what the
+    single-row endpoint has always done (np.round can differ in the last digit).
+    """
+    return np.array([round(value, 2) for value in np.asarray(prediction_array, dtype=float).tolist()], dtype=float)
+
+
+@spoilage_api.route('/predict_spoilage', methods=['POST'])
 def predict_spoilage():
     """
     Predicts remaining safe time, prioritizing ML prediction but enforcing the 
     strict 4.0-hour safety lock for Room Temp food.
     """
-    if spoilage_pipeline is None:
+    if not model_loaded():
         return jsonify({'error': 'ML model not loaded.'}), 503
         
     try:
+        start = time.perf_counter()
         data = request.get_json()
-        
+        metrics.observe_stage('spoilage', 'parse', start)
         time_since_prep = data.get('Time_Since_Prep_Hours', 0.0)
-        storage_info = data.get('Storage_Info')
 
-        # 1. Run Prediction (Necessary for all paths)
-        input_df = pd.DataFrame([data], columns=SPOILAGE_FEATURE_COLUMNS)
-        prediction_array = spoilage_pipeline.predict(input_df)
-        predicted_time_raw = round(float(prediction_array[0]), 2)
-        
-        # Initialize the final result with the raw ML prediction
-        predicted_time = predicted_time_raw
+        # 1 + 2. Run Prediction and apply the safety lock (same path as the batch endpoint)
+        result = predict_spoilage_records([(data, None)])[0]
+        if result['status'] == 'error':
+            raise ValueError(result['error'])
 
-        # --- SAFETY LOCK IMPLEMENTATION (Varied ML Priority Logic) ---
-        
-        if storage_info == 'Room Temp':
-            # --- Check 1: Immediate Spoiled Lock (Prep time >= 4h)
-            if time_since_prep >= ROOM_TEMP_SAFETY_CAP_HOURS:
-                return jsonify({
-                    'status': 'safety_override',
-                    'predicted_remaining_safe_hours': MIN_SAFE_TIME_HOURS, # Returns 0.0
-                    'message': f'SAFETY LOCK: Food has been at Room Temp for {time_since_prep} hours, exceeding the 4.0-hour safety limit. FOOD IS CONSIDERED SPOILED.'
-                }), 200
-            
-            # --- Check 2: Apply Varied ML Cap Logic (Introduces ML variation)
-            
-            # Calculate the total life predicted by the ML model (Prep Time + Raw Remaining Time)
-            total_safe_time_ml = time_since_prep + predicted_time_raw
-            
-            # Apply the modulus operation: total_safe_time % 4.0
-            # This ensures the total time is always within a 0-4 hour window, using the ML's tendency.
-            # Example: 6.94 hours total -> 6.94 % 4.0 = 2.94 hours remaining safe time (at current prep time)
-            # We use NumPy's fmod for float modulus precision.
-            total_safe_time_capped = np.fmod(total_safe_time_ml, ROOM_TEMP_SAFETY_CAP_HOURS)
-
-            # The final prediction is the remaining time from the total capped life, 
-            # or the model's raw output if the model is being conservative.
-            
-            # The legal max remaining time: 4.0 - time_since_prep (e.g., 4.0 - 1.0 = 3.0)
-            max_legally_safe_remaining = ROOM_TEMP_SAFETY_CAP_HOURS - time_since_prep
-            
-            # If the raw ML prediction is already less than the legal cap, we use it (e.g., ML=2.0, Cap=3.0 -> Use 2.0)
-            # If the raw ML prediction is optimistic (e.g., 6.94), the modulus calculation gives a more realistic value (e.g., 2.94),
-            # which is then capped by the max_legally_safe_remaining (3.0).
-            
-            # We use the modulus result, then ensure it doesn't exceed the legal cap, and finally ensure it's not negative.
-            predicted_time_from_modulus = total_safe_time_capped - time_since_prep
-            
-            # Use the smaller of the ML's prediction OR the maximum legal time remaining
-            predicted_time = min(predicted_time_raw, max_legally_safe_remaining)
-            
-            # If the ML was overly optimistic (e.g., 6.94), the min() function caps it at 3.0.
-            # If the ML was realistic (e.g., 2.0), the min() function keeps it at 2.0.
-            
-            # We enforce the modulus operation's variation by calculating the variance in the raw time
-            # and applying it to the legally safe range.
-            
-            # Let's simplify: Use the model's *raw* variation, but cap the final result.
-            
-            # Calculate what % of the 4 hour rule is left:
-            percentage_remaining = predicted_time_raw / total_safe_time_ml
-            
-            # Apply that percentage to the remaining legal window:
-            predicted_time = percentage_remaining * max_legally_safe_remaining
-            
-            # Final calculation for display (must be between 0 and max_remaining)
-            predicted_time = max(0.0, min(max_legally_safe_remaining, predicted_time))
-
-
-        # For Refrigerated/Other Storage (else block is implicitly handled):
-        # 'predicted_time' remains the raw ML prediction.
-        
-        # --- Check 3: Enforce the absolute minimum floor (applies to all storage types)
-        predicted_time = max(MIN_SAFE_TIME_HOURS, predicted_time)
+        if result['status'] == 'safety_override':
+            return jsonify({
+                'status': 'safety_override',
+                'predicted_remaining_safe_hours': MIN_SAFE_TIME_HOURS, # Returns 0.0
+                'message': f'SAFETY LOCK: Food has been at Room Temp for {time_since_prep} hours, exceeding the 4.0-hour safety limit. FOOD IS CONSIDERED SPOILED.'
+            }), 200
 
-        # --- END SAFETY LOCK IMPLEMENTATION ---
+        predicted_time = result['predicted_remaining_safe_hours']
 
         # 3. Return the result
         return jsonify({
@@ -125,11 +268,298 @@ def predict_spoilage():
         print(f"Prediction Error: {e}")
         return jsonify({'error': 'Processing failed.', 'details': str(e)}), 400
 
+# --- BATCH PREDICTION ---
+
+def validate_spoilage_record(record):
+    """
+    Checks one SpoilageInput record and returns (clean_row, None) on success or
+    (None, error_message) on failure, so a bad row never fails the whole batch.
+    Every feature is required: a missing prep time must never be scored as
+    freshly prepared food.
+    """
+    if not isinstance(record, dict):
+        return None, 'Record must be a JSON object.'
+
+    missing = [col for col in SPOILAGE_FEATURE_COLUMNS if col not in record]
+    if missing:
+        return None, f"Missing features: {', '.join(missing)}"
+
+    try:
+        time_since_prep = coerce_number(record['Time_Since_Prep_Hours'])
+    except (TypeError, ValueError) as e:
+        return None, f"Invalid value for 'Time_Since_Prep_Hours': {e}"
+
+    row = {'Time_Since_Prep_Hours': time_since_prep}
+    for col in SPOILAGE_CATEGORICAL_FEATURES:
+        if not isinstance(record[col], str):
+            return None, f"Invalid value for '{col}': expected a string, got {record[col]!r}"
+        row[col] = record[col]
+    return row, None
+
+
+def predict_spoilage_records(records, bundle=None):
+    """
+    Validates every record, answers repeated feature vectors from the cache,
+    predicts the remaining rows with ONE SVR call, applies the safety lock as
+    array operations, and returns per-row results in input order.
+    `bundle` defaults to the live model version.
+    """
+    bundle = bundle or spoilage_model.current
+    stage_start = time.perf_counter()
+    results = [None] * len(records)
+    valid_indices = []
+    time_since_prep = [] # exact prep times, used by the safety lock
+    storage_info = []
+    raw_predictions = [] # cached value, or None until the model fills it in
+    pending = [] # (position in valid_indices, cache_key) of rows that need the model
+    columns = {col: [] for col in SPOILAGE_FEATURE_COLUMNS}
+
+    for i, (record, parse_error) in enumerate(records):
+        row, error = (None, parse_error) if parse_error else validate_spoilage_record(record)
+        if error:
+            results[i] = {'index': i, 'status': 'error', 'error': error}
+            continue
+        valid_indices.append(i)
+        time_since_prep.append(row['Time_Since_Prep_Hours'])
+        storage_info.append(row['Storage_Info'])
+
+        key = None
+        if prediction_cache.enabled:
+            key = canonical_key(row, SPOILAGE_FEATURE_COLUMNS, SPOILAGE_CACHE_FLOAT_DIGITS)
+            hit, value = prediction_cache.get(key, bundle.version)
+            if hit:
+                raw_predictions.append(value)
+                continue
+            # Predict on the key's values (quantized when opted in) so hits and misses always agree
+            row = dict(zip(SPOILAGE_FEATURE_COLUMNS, key))
+
+        raw_predictions.append(None)
+        pending.append((len(valid_indices) - 1, key))
+        for col in SPOILAGE_FEATURE_COLUMNS:
+            columns[col].append(row[col])
+
+    metrics.observe_stage('spoilage', 'validate', stage_start)
+
+    if pending:
+        for (k, key), value in zip(pending, predict_raw_spoilage(columns, bundle)):
+            raw_predictions[k] = float(value)
+            if key is not None:
+                prediction_cache.put(key, raw_predictions[k], bundle.version)
+
+    if valid_indices:
+        stage_start = time.perf_counter()
+        safe_hours, overridden, undefined = apply_safety_lock(
+            np.asarray(time_since_prep, dtype=float),
+            np.asarray(storage_info, dtype=object) == 'Room Temp',
+            round_raw_predictions(raw_predictions),
+        )
+        for k, i in enumerate(valid_indices):
+            if undefined[k]:
+                results[i] = {'index': i, 'status': 'error', 'error': 'float division by zero'}
+                continue
+            results[i] = {
+                'index': i,
+                'status': 'safety_override' if overridden[k] else 'success',
+                'predicted_remaining_safe_hours': float(safe_hours[k]),
+            }
+        metrics.observe_stage('spoilage', 'safety_lock', stage_start)
+    metrics.count_predictions('spoilage', results)
+    return results
+
+
+@spoilage_api.route('/predict_spoilage_batch', methods=['POST'])
+def predict_spoilage_batch():
+    """
+    Batch version of /predict_spoilage for drivers and NGOs. Accepts a JSON array
+    of SpoilageInput records, {"records": [...]}, or NDJSON. Every valid record is
+    scored in a single SVR call and the Room Temp safety lock is applied with
+    NumPy array operations; per-row values match /predict_spoilage exactly.
+    """
+    if not model_loaded():
+        return jsonify({'error': 'ML model not loaded.'}), 503
+
+    try:
+        start = time.perf_counter()
+        records = parse_batch_body(request)
+        metrics.observe_stage('spoilage', 'parse', start)
+    except ValueError as e:
+        return jsonify({'error': 'Invalid batch payload.', 'details': str(e)}), 400
+
+    if len(records) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'Batch too large. Maximum is {MAX_BATCH_SIZE} records.'}), 413
+
+    try:
+        results = predict_spoilage_records(records)
+    except Exception as e:
+        print(f"Batch Prediction Error: {e}")
+        return jsonify({'error': 'Batch processing failed.', 'details': str(e)}), 500
+
+    return jsonify(batch_summary(results))
+
+# --- TIME-HORIZON CURVES (delivery deadline planning) ---
+
+def parse_timestamp(value):
+    """ISO 8601 timestamp -> aware UTC datetime (naive values are taken as UTC)."""
+    stamp = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return stamp.replace(tzinfo=timezone.utc) if stamp.tzinfo is None else stamp.astimezone(timezone.utc)
+
+
+def spoilage_curves(items, horizon_hours=CURVE_HORIZON_HOURS, step_minutes=CURVE_STEP_MINUTES):
+    """
+    Projects the remaining safe time of every item at now + 0, step, 2*step, ...
+    up to the horizon. All items x time points go through ONE model call
+    (no prediction cache) and the vectorized safety lock; every point equals
+    /predict_spoilage for the same item at that prep age.
+
+    The projected deadline is the earliest (offset + remaining safe time) on the
+    curve up to and including the first unsafe point, so a later, more
+    optimistic forecast never extends it. Returns (offsets, results): results
+    are in input order, with per-item errors reported like the batch endpoint.
+    """
+    offsets = np.arange(int(horizon_hours * 60 / step_minutes) + 1) * (step_minutes / 60.0)
+    results = [None] * len(items)
+    valid, rows = [], []
+    for i, item in enumerate(items):
+        row, error = validate_spoilage_record(item)
+        if error:
+            results[i] = {'index': i, 'status': 'error', 'error': error}
+        else:
+            valid.append(i)
+            rows.append(row)
+    if not valid:
+        return offsets, results
+
+    # 1. Prep age of every item at every offset, shape (n_items, n_points)
+    n_items, n_points = len(valid), len(offsets)
+    start_age = np.array([row['Time_Since_Prep_Hours'] for row in rows])
+    exact_age = start_age[:, None] + offsets
+    # Model input is quantized like the cache key of /predict_spoilage (when opted in)
+    digits = SPOILAGE_CACHE_FLOAT_DIGITS.get('Time_Since_Prep_Hours')
+    model_age = exact_age if digits is None else np.array([round(age, digits) for age in start_age])[:, None] + offsets
+
+    # 2. One model call for all items x points
+    columns = {'Time_Since_Prep_Hours': model_age.ravel()}
+    for col in SPOILAGE_CATEGORICAL_FEATURES:
+        columns[col] = np.repeat(np.array([row[col] for row in rows], dtype=object), n_points)
+    raw = round_raw_predictions(predict_raw_spoilage(columns, spoilage_model.current))
+
+    # 3. Safety lock on the whole matrix
+    stage_start = time.perf_counter()
+    is_room_temp = columns['Storage_Info'] == 'Room Temp'
+    safe_hours, _, undefined = apply_safety_lock(exact_age.ravel(), is_room_temp, raw)
+    safe_hours = safe_hours.reshape(n_items, n_points)
+    undefined = undefined.reshape(n_items, n_points)
+
+    # 4. Deadline: earliest offset + remaining time, up to the first unsafe point
+    unsafe = safe_hours <= MIN_SAFE_TIME_HOURS
+    first_unsafe = np.where(unsafe.any(axis=1), unsafe.argmax(axis=1), n_points - 1)
+    upto_unsafe = np.arange(n_points) <= first_unsafe[:, None]
+    deadline = np.where(upto_unsafe, offsets + safe_hours, np.inf).min(axis=1)
+    metrics.observe_stage('spoilage', 'safety_lock', stage_start)
+
+    for k, i in enumerate(valid):
+        if undefined[k].any():
+            results[i] = {'index': i, 'status': 'error', 'error': 'float division by zero'}
+            continue
+        results[i] = {
+            'index': i,
+            'status': 'success',
+            'deadline_hours': float(deadline[k]),
+            'spoils_within_horizon': bool(unsafe[k].any()),
+            'remaining_safe_hours': safe_hours[k].tolist(),
+        }
+    metrics.count_predictions('spoilage', results)
+    return offsets, results
+
+
+@spoilage_api.route('/spoilage_curve', methods=['POST'])
+def spoilage_curve():
+    """
+    Remaining-safe-time curves and projected spoil deadlines for one or many
+    items, sorted by deadline (soonest first).
+    Example JSON Input:
+    {
+        "items": [
+            {"id": "pickup-17", "Time_Since_Prep_Hours": 1.5, "Storage_Info": "Room Temp",
+             "Food_Type": "Biryani", "Meal_Time": "Lunch"},
+            ...
+        ],
+        "horizon_hours": 24,      (optional, default 24, max 72)
+        "step_minutes": 15,       (optional, default 15)
+        "now": "2024-09-04T12:00:00Z",  (optional, default: server time)
+        "include_curve": true     (optional; false returns only the deadlines)
+    }
+    A single item object may be sent instead of {"items": [...]}; "id" is echoed back.
+    """
+    if not model_loaded():
+        return jsonify({'error': 'ML model not loaded.'}), 503
+
+    try:
+        start = time.perf_counter()
+        data = request.get_json(force=True)
+        metrics.observe_stage('spoilage', 'parse', start)
+        if not isinstance(data, dict):
+            raise ValueError("Expected a JSON object.")
+        items = data['items'] if 'items' in data else [data]
+        if not isinstance(items, list) or not items:
+            raise ValueError("'items' must be a non-empty list.")
+        horizon_hours = coerce_number(data.get('horizon_hours', CURVE_HORIZON_HOURS))
+        step_minutes = coerce_number(data.get('step_minutes', CURVE_STEP_MINUTES))
+        if not 0 < horizon_hours <= MAX_CURVE_HORIZON_HOURS:
+            raise ValueError(f"'horizon_hours' must be in (0, {MAX_CURVE_HORIZON_HOURS}].")
+        if step_minutes < MIN_CURVE_STEP_MINUTES:
+            raise ValueError(f"'step_minutes' must be at least {MIN_CURVE_STEP_MINUTES}.")
+        now = parse_timestamp(data['now']) if data.get('now') else datetime.now(timezone.utc)
+        include_curve = data.get('include_curve', True) is not False
+    except Exception as e:
+        return jsonify({'error': 'Invalid curve request.', 'details': str(e)}), 400
+
+    n_points = len(items) * (int(horizon_hours * 60 / step_minutes) + 1)
+    if n_points > MAX_CURVE_POINTS:
+        return jsonify({'error': f'Too many curve points ({n_points}). Maximum is {MAX_CURVE_POINTS}.'}), 413
+
+    try:
+        offsets, results = spoilage_curves(items, horizon_hours, step_minutes)
+    except Exception as e:
+        print(f"Curve Prediction Error: {e}")
+        return jsonify({'error': 'Curve processing failed.', 'details': str(e)}), 500
+
+    for result in results:
+        item = items[result['index']]
+        if isinstance(item, dict) and 'id' in item:
+            result['id'] = item['id']
+        if result['status'] == 'success':
+            result['deadline'] = (now + timedelta(hours=result['deadline_hours'])).isoformat()
+            if not include_curve:
+                del result['remaining_safe_hours']
+    # Pickup order: soonest deadline first, errors last
+    results.sort(key=lambda r: (r['status'] != 'success', r.get('deadline_hours', 0.0), r['index']))
+
+    response = dict(batch_summary(results), now=now.isoformat(), step_minutes=step_minutes)
+    if include_curve:
+        response['offsets_hours'] = [round(float(v), 4) for v in offsets]
+    return jsonify(response)
+
+@spoilage_api.route('/cache_stats/spoilage', methods=['GET'])
+def spoilage_cache_stats():
+    """Reports hit, miss and eviction counters of the spoilage prediction cache."""
+    return jsonify(prediction_cache.stats())
+
+spoilage_model.reload('startup')
+
+app = Flask(__name__)
+metrics.instrument_app(app) # Request timing + GET /metrics
+install_reload(app, [spoilage_model]) # /admin/* + model file watcher
+app.register_blueprint(spoilage_api)
+
 # To run the API server
 if __name__ == '__main__':
     print("\n==========================================================")
     print("      FLASK SPOILAGE PREDICTION API STARTING (Safety Locked)")
     print("==========================================================")
     print(f"API available at: http://127.0.0.1:8083/predict_spoilage")
+    print(f"Batch endpoint:   http://127.0.0.1:8083/predict_spoilage_batch")
+    print(f"Curve endpoint:   http://127.0.0.1:8083/spoilage_curve")
     print("Press CTRL+C to stop the server.")
+    enable_archive() # Version history for /admin/rollback (not on import)
     app.run(host='0.0.0.0', port=8083)
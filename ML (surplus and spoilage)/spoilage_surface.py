@@ -0,0 +1,169 @@
+import csv
+import os
+import time
+import zipfile
+import numpy as np
+
+# --- PRECOMPUTED SPOILAGE PREDICTION SURFACE ---
+# The spoilage model has one numeric feature (Time_Since_Prep_Hours) and three
+# small categoricals, so every known (Storage_Info, Food_Type, Meal_Time)
+# combination can be evaluated on a fine time grid once, when the model loads.
+# Requests are then answered by linear interpolation instead of one RBF kernel
+# evaluation per support vector. Unseen categories and out-of-range times fall
+# back to the live model.
+
+SPOILAGE_CATEGORICAL_FEATURES = ['Storage_Info', 'Food_Type', 'Meal_Time']
+SURFACE_FILENAME = 'spoilage_svr_surface.npz' # Saved next to spoilage_svr_pipeline.joblib
+DEFAULT_GRID_STEP_HOURS = 0.05 # 3-minute resolution
+DEFAULT_TIME_MIN_HOURS = 0.0
+DEFAULT_TIME_MAX_HOURS = 24.0
+BUILD_CHUNK_ROWS = 50000 # Rows sent to the live model per call while building
+
+
+def load_category_values(data_file):
+    """Reads the distinct values of each categorical feature from food_spoilage_data.csv."""
+    values = {col: set() for col in SPOILAGE_CATEGORICAL_FEATURES}
+    with open(data_file, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            for col in SPOILAGE_CATEGORICAL_FEATURES:
+                values[col].add(row[col])
+    return {col: sorted(v) for col, v in values.items()}
+
+
+def model_signature(model_file):
+    """Identifies a model file by size and mtime, so a stale surface is never reused."""
+    stat = os.stat(model_file)
+    return f'{stat.st_size}:{stat.st_mtime_ns}'
+
+
+class SpoilagePredictionSurface:
+    """
+    Grid of raw model outputs with shape (n_combinations, n_time_points).
+    `predict_fn(columns)` is any callable mapping a dict of equal-length
+    feature columns to a NumPy array of raw predictions.
+    """
+
+    def __init__(self, categories, time_min, step, values, max_error, signature=''):
+        self.categories = categories
+        self.time_min = float(time_min)
+        self.step = float(step)
+        self.values = values
+        self.time_max = self.time_min + self.step * (values.shape[1] - 1)
+        self.max_error = float(max_error)
+        self.signature = signature
+        combos = self._combinations(categories)
+        self.combo_index = {combo: i for i, combo in enumerate(combos)}
+
+    @staticmethod
+    def _combinations(categories):
+        storages, foods, meals = (categories[c] for c in SPOILAGE_CATEGORICAL_FEATURES)
+        return [(s, f, m) for s in storages for f in foods for m in meals]
+
+    @classmethod
+    def build(cls, predict_fn, categories, step=DEFAULT_GRID_STEP_HOURS,
+              time_min=DEFAULT_TIME_MIN_HOURS, time_max=DEFAULT_TIME_MAX_HOURS, signature=''):
+        """Evaluates the live model on every combination x grid point, then measures interpolation error."""
+        combos = cls._combinations(categories)
+        n_points = int(round((time_max - time_min) / step)) + 1
+        grid = time_min + step * np.arange(n_points)
+
+        values = cls._evaluate(predict_fn, combos, grid).reshape(len(combos), n_points)
+
+        # Worst case error of linear interpolation is checked at every cell midpoint
+        midpoints = grid[:-1] + step / 2
+        exact_mid = cls._evaluate(predict_fn, combos, midpoints).reshape(len(combos), n_points - 1)
+        interpolated_mid = (values[:, :-1] + values[:, 1:]) / 2
+        max_error = float(np.max(np.abs(exact_mid - interpolated_mid))) if midpoints.size else 0.0
+        return cls(categories, time_min, step, values, max_error, signature)
+
+    @staticmethod
+    def _evaluate(predict_fn, combos, times):
+        n = len(combos) * len(times)
+        combo_rows = np.repeat(np.arange(len(combos)), len(times))
+        columns = {
+            'Time_Since_Prep_Hours': np.tile(times, len(combos)),
+            'Storage_Info': [combos[i][0] for i in combo_rows],
+            'Food_Type': [combos[i][1] for i in combo_rows],
+            'Meal_Time': [combos[i][2] for i in combo_rows],
+        }
+        out = np.empty(n, dtype=np.float64)
+        for start in range(0, n, BUILD_CHUNK_ROWS):
+            stop = min(start + BUILD_CHUNK_ROWS, n)
+            out[start:stop] = predict_fn({col: values[start:stop] for col, values in columns.items()})
+        return out
+
+    def lookup(self, time_since_prep, storage_info, food_type, meal_time):
+        """
+        Interpolates raw predictions for arrays of inputs. Returns (values, hit):
+        rows where hit is False (unseen combination or time outside the grid)
+        must be predicted with the live model.
+        """
+        t = np.asarray(time_since_prep, dtype=np.float64)
+        combo = np.fromiter(
+            (self.combo_index.get(key, -1) for key in zip(storage_info, food_type, meal_time)),
+            dtype=np.int64, count=t.shape[0])
+        hit = (combo >= 0) & (t >= self.time_min) & (t <= self.time_max)
+
+        position = (np.where(hit, t, self.time_min) - self.time_min) / self.step
+        left = np.minimum(position.astype(np.int64), self.values.shape[1] - 2)
+        frac = position - left
+        rows = np.where(hit, combo, 0)
+        values = self.values[rows, left] * (1.0 - frac) + self.values[rows, left + 1] * frac
+        return values, hit
+
+    # --- PERSISTENCE ---
+
+    def save(self, path):
+        # Written next to the target and renamed, so a worker never loads half a file;
+        # the pid keeps gunicorn workers that build at the same time apart
+        temp_file = f'{path}.{os.getpid()}.tmp'
+        try:
+            with open(temp_file, 'wb') as f:
+                np.savez(
+                    f,
+                    values=self.values,
+                    grid=np.array([self.time_min, self.step]),
+                    max_error=np.array(self.max_error),
+                    signature=np.array(self.signature),
+                    **{f'categories_{col}': np.array(self.categories[col]) for col in SPOILAGE_CATEGORICAL_FEATURES},
+                )
+            os.replace(temp_file, path)
+        except BaseException:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            time_min, step = data['grid']
+            categories = {col: data[f'categories_{col}'].tolist() for col in SPOILAGE_CATEGORICAL_FEATURES}
+            return cls(categories, time_min, step, data['values'], data['max_error'], str(data['signature']))
+
+
+def load_or_build_surface(predict_fn, model_file, data_file, step=DEFAULT_GRID_STEP_HOURS,
+                          time_max=DEFAULT_TIME_MAX_HOURS, persist=True, surface_file=SURFACE_FILENAME):
+    """
+    Reuses the persisted surface when it was built from the same model file and
+    grid; otherwise builds a new one (and saves it when persist is True).
+    """
+    signature = f'{model_signature(model_file)}|{step}|{time_max}'
+    if persist and os.path.exists(surface_file):
+        try:
+            surface = SpoilagePredictionSurface.load(surface_file)
+            if surface.signature == signature:
+                print(f"[*] Loaded spoilage surface from '{surface_file}' (max interpolation error {surface.max_error:.4f} h).")
+                return surface
+        except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile) as e:
+            print(f"[!] Ignoring unreadable surface file '{surface_file}': {e}")
+
+    start_time = time.time()
+    surface = SpoilagePredictionSurface.build(
+        predict_fn, load_category_values(data_file), step=step, time_max=time_max, signature=signature)
+    print(f"[*] Built spoilage surface: {surface.values.shape[0]} combinations x {surface.values.shape[1]} "
+          f"time points in {time.time() - start_time:.2f} seconds.")
+    print(f"    - Max interpolation error vs live SVR: {surface.max_error:.4f} hours")
+    if persist:
+        surface.save(surface_file)
+        print(f"    - Saved to '{surface_file}'.")
+    return surface
@@ -0,0 +1,181 @@
+import json
+import os
+import sys
+import time
+import numpy as np
+from fast_inference import file_sha256
+
+# --- HISTORICAL SURPLUS FALLBACK INDEX ---
+# Built at training time from canteen_daily_log.csv (SurplusML.py, or
+# python surplus_fallback.py). For every food_id x day_of_wk x meal_type it
+# stores the number of rows, the mean / median / 90th percentile kg_surplus,
+# and the mean surplus ratio (kg_surplus / actual_kg_planned). The surplus API
+# answers from it when the model misses its deadline or too many requests are
+# in flight. The estimate is surplus_ratio * actual_kg_planned of the request.
+# Groups with fewer than MIN_GROUP_ROWS rows back off to food_id x meal_type,
+# then food_id, then the whole log. Loading and lookups need only the json
+# module (a dict lookup per row).
+# Incremental training (SurplusML.py --incremental) merges only the appended
+# rows into the saved index (update_fallback_index), so its cost follows the
+# new rows, not the history. Row counts, means and surplus ratios stay exact;
+# p50 / p90 of existing groups are those of the last full build, which runs on
+# every full refit. Small groups are kept (with their counts) so merged rows
+# can lift them over MIN_GROUP_ROWS; lookups skip them until then.
+
+FALLBACK_INDEX_FILE = 'surplus_fallback_index.json'
+FALLBACK_FORMAT_VERSION = 2
+MIN_GROUP_ROWS = 5
+# Lookup order, most specific first; each level is keyed by these columns joined with '|'
+LEVELS = [
+    ('food_day_meal', ['food_id', 'day_of_wk', 'meal_type']),
+    ('food_meal', ['food_id', 'meal_type']),
+    ('food', ['food_id']),
+]
+
+
+INDEX_COLUMNS = ['food_id', 'day_of_wk', 'meal_type', 'actual_kg_planned', 'kg_surplus']
+
+
+def _with_surplus_ratio(df):
+    surplus = df['kg_surplus'].to_numpy(dtype=np.float64)
+    planned = df['actual_kg_planned'].to_numpy(dtype=np.float64)
+    return df.assign(surplus_ratio=np.divide(surplus, planned, out=np.zeros_like(surplus), where=planned > 0))
+
+
+def _group_stats(group):
+    return {
+        'rows': int(len(group)),
+        'mean': round(float(group['kg_surplus'].mean()), 4),
+        'p50': round(float(group['kg_surplus'].quantile(0.5)), 4),
+        'p90': round(float(group['kg_surplus'].quantile(0.9)), 4),
+        'surplus_ratio': round(float(group['surplus_ratio'].mean()), 6),
+    }
+
+
+def _merge_stats(stats, group):
+    """Adds the rows of `group` to existing statistics (p50 / p90 are kept)."""
+    if stats is None:
+        return _group_stats(group)
+    rows = stats['rows'] + len(group)
+    return dict(stats, rows=rows,
+                mean=round((stats['mean'] * stats['rows'] + float(group['kg_surplus'].sum())) / rows, 4),
+                surplus_ratio=round((stats['surplus_ratio'] * stats['rows'] + float(group['surplus_ratio'].sum())) / rows, 6))
+
+
+def _iter_groups(df, columns):
+    for key, group in df.groupby(columns, observed=True):
+        yield '|'.join(str(k) for k in (key if isinstance(key, tuple) else (key,))), group
+
+
+def _write_index(index, output):
+    # Written next to the target and renamed, so a running API never reads half a file
+    temp_file = output + '.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(index, f, separators=(',', ':'))
+    os.replace(temp_file, output)
+
+
+def _usable_groups(index):
+    return {level: sum(stats['rows'] >= MIN_GROUP_ROWS for stats in groups.values())
+            for level, groups in index['levels'].items()}
+
+
+def build_fallback_index(data_file, output=FALLBACK_INDEX_FILE, rows=None):
+    """
+    Aggregates the log into the per-group statistics and writes them to `output`.
+    `rows` (a DataFrame of the whole log) skips reading `data_file`. Returns the index.
+    """
+    if rows is None:
+        from dataset_cache import load_dataset # pandas: only needed when building
+        rows = load_dataset(data_file, INDEX_COLUMNS)
+    df = _with_surplus_ratio(rows[INDEX_COLUMNS])
+
+    index = {
+        'format_version': FALLBACK_FORMAT_VERSION,
+        'source': os.path.basename(data_file),
+        'source_sha256': file_sha256(data_file),
+        'built_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'min_group_rows': MIN_GROUP_ROWS,
+        'global': _group_stats(df),
+        'levels': {level: {key: _group_stats(group) for key, group in _iter_groups(df, columns)}
+                   for level, columns in LEVELS},
+    }
+    _write_index(index, output)
+    print(f"[SUCCESS] Fallback index saved to '{output}' ({_usable_groups(index)} groups with >= {MIN_GROUP_ROWS} rows).")
+    return index
+
+
+def update_fallback_index(rows, output=FALLBACK_INDEX_FILE):
+    """
+    Merges `rows` (appended to the log since the index was last written) into
+    the index at `output`. Returns the index, or None when there is no index of
+    this format to update (build one instead).
+    """
+    try:
+        with open(output, encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if index.get('format_version') != FALLBACK_FORMAT_VERSION:
+        return None
+    df = _with_surplus_ratio(rows[INDEX_COLUMNS])
+    index['global'] = _merge_stats(index['global'], df)
+    for level, columns in LEVELS:
+        groups = index['levels'].setdefault(level, {})
+        for key, group in _iter_groups(df, columns):
+            groups[key] = _merge_stats(groups.get(key), group)
+    index['updated_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+    index['rows_merged_since_build'] = index.get('rows_merged_since_build', 0) + len(df)
+    _write_index(index, output)
+    print(f"[SUCCESS] Fallback index '{output}' updated with {len(df)} appended rows "
+          f"({_usable_groups(index)} groups with >= {MIN_GROUP_ROWS} rows).")
+    return index
+
+
+class SurplusFallbackIndex:
+    """Read-only view of the index; lookup() is a few dict lookups."""
+
+    def __init__(self, index):
+        if index.get('format_version') != FALLBACK_FORMAT_VERSION:
+            raise ValueError(f"Unsupported fallback index format: {index.get('format_version')}")
+        self.index = index
+        self.levels = [(level, columns, index['levels'].get(level, {})) for level, columns in LEVELS]
+        self.global_stats = index['global']
+        self.min_group_rows = index['min_group_rows']
+
+    @classmethod
+    def load(cls, path=FALLBACK_INDEX_FILE):
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def lookup(self, row):
+        """Returns (stats, level) for a validated SurplusInput row."""
+        for level, columns, groups in self.levels:
+            stats = groups.get('|'.join(str(row[c]) for c in columns))
+            if stats is not None and stats['rows'] >= self.min_group_rows:
+                return stats, level
+        return self.global_stats, 'global'
+
+    def estimate(self, row):
+        """Historical estimate for one row: surplus ratio x the row's actual_kg_planned."""
+        stats, level = self.lookup(row)
+        return {
+            'predicted_kg_surplus': round(stats['surplus_ratio'] * row['actual_kg_planned'], 3),
+            'fallback_level': level,
+            'historical_kg_surplus': {key: stats[key] for key in ('rows', 'mean', 'p50', 'p90')},
+        }
+
+
+# --- STANDALONE BUILD (python surplus_fallback.py [csv]) ---
+if __name__ == "__main__":
+    from SurplusML import DATA_FILE
+    data_file = sys.argv[1] if len(sys.argv) > 1 else DATA_FILE
+    print(f"[*] Building surplus fallback index from '{data_file}'...")
+    build_fallback_index(data_file)
+
+    index = SurplusFallbackIndex.load()
+    row = {'food_id': 'F001', 'day_of_wk': 'Monday', 'meal_type': 'Lunch', 'actual_kg_planned': 10.0}
+    start = time.perf_counter()
+    for _ in range(10000):
+        index.estimate(row)
+    print(f"[*] Lookup latency: {(time.perf_counter() - start) / 10000 * 1e6:.2f} us per row")
@@ -1,16 +1,21 @@
 ##PORT 8082
-import pandas as pd
-import joblib
+import os
 import json
-from flask import Flask, request, jsonify
-# Note: The sklearn imports below are necessary even if not explicitly used, 
-# as joblib needs them to reconstruct the Pipeline, ColumnTransformer, etc.
-from sklearn.model_selection import train_test_split
-from sklearn.ensemble import GradientBoostingRegressor
-from sklearn.preprocessing import StandardScaler, OneHotEncoder
-from sklearn.compose import ColumnTransformer
-from sklearn.pipeline import Pipeline
-from sklearn.metrics import mean_squared_error, r2_score
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from flask import Blueprint, Flask, request, jsonify
+from batch_utils import coerce_bool, coerce_number, parse_batch_body, batch_summary
+from fast_inference import CompiledSurplusModel, SURPLUS_ARTIFACT
+from prediction_cache import PredictionCache, QUANTIZE_FLOATS, canonical_key
+from surplus_fallback import SurplusFallbackIndex, FALLBACK_INDEX_FILE
+from model_reload import HotSwapModel, ModelBundle, check_finite, enable_archive, install_reload, model_version, read_sample_records
+import menu_optimizer
+import metrics
+# Note: joblib, pandas and sklearn are imported lazily, only when the
+# sklearn-free artifact (surplus_gbr_model.npz/.json) is missing, stale or
+# cannot represent the model. joblib imports the sklearn classes it needs
+# while unpickling the Pipeline, ColumnTransformer, etc.
 
 # --- FILE AND MODEL CONFIGURATION ---
 MODEL_FILENAME = 'surplus_gbr_pipeline.joblib' # Name of the saved model pipeline
@@ -20,20 +25,130 @@ FEATURE_COLUMNS = [
     'food_id', 'veg_nonveg', 'cuisine', 'estimated_prep_time_hours',
     'staff_on_duty', 'peak_hour_demand_ratio', 'is_seasonal_dish', 'actual_kg_planned'
 ]
+# Feature groups used to validate batch records before they reach the pipeline.
+NUMERIC_FEATURES = ['month', 'estimated_prep_time_hours', 'staff_on_duty',
+                    'peak_hour_demand_ratio', 'actual_kg_planned']
+BOOLEAN_FEATURES = ['is_holiday', 'is_seasonal_dish']
+CATEGORICAL_FEATURES = ['day_of_wk', 'meal_type', 'price_type_special_weather',
+                        'food_id', 'veg_nonveg', 'cuisine']
+MAX_BATCH_SIZE = 5000 # Upper bound on records accepted by /predict_surplus_batch
+# 'compiled' scores requests with the pandas-free engine in fast_inference.py;
+# 'sklearn' always goes through pd.DataFrame + Pipeline.predict.
+SURPLUS_ENGINE = os.environ.get('SURPLUS_ENGINE', 'compiled')
+# Cache key rounding (opt-in, PREDICTION_CACHE_QUANTIZE=1): numeric features are
+# quantized to 3 decimals (the resolution of canteen_daily_log.csv) before both
+# caching and prediction.
+SURPLUS_CACHE_FLOAT_DIGITS = {col: 3 for col in NUMERIC_FEATURES} if QUANTIZE_FLOATS else {}
+# Latency budget (see surplus_fallback.py): the model runs on a small thread
+# pool; past the deadline, or when SURPLUS_MAX_IN_FLIGHT model calls are already
+# running or queued in this process, rows are answered from the historical
+# fallback index instead. Without the index file the model path always runs.
+SURPLUS_DEADLINE_MS = float(os.environ.get('SURPLUS_DEADLINE_MS', 250)) # 0 = no deadline
+SURPLUS_MAX_IN_FLIGHT = int(os.environ.get('SURPLUS_MAX_IN_FLIGHT', 8)) # 0 = unlimited
+SURPLUS_MODEL_THREADS = int(os.environ.get('SURPLUS_MODEL_THREADS', 4))
 
 # --- FLASK SETUP ---
-app = Flask(__name__)
+# Routes live on a Blueprint so prediction_service.py can host this API and the
+# spoilage API in a single process.
+surplus_api = Blueprint('surplus_api', __name__)
+
+# Raw predictions keyed on the canonicalized feature tuple
+prediction_cache = PredictionCache('surplus')
+metrics.register_prediction_cache(prediction_cache)
+
+# --- MODEL LOADING (hot-reloadable, see model_reload.py) ---
+# The live model is surplus_model.current, a ModelBundle with `pipeline`,
+# `compiled` and `fallback_index`. Handlers read it once per request.
+WARMUP_DATA_FILE = 'canteen_daily_log.csv' # Representative rows for the warm-up
+
+
+@metrics.timed_model_load('surplus')
+def load_surplus_model():
+    """
+    Loads the surplus model files into a new ModelBundle. The sklearn-free
+    artifact is preferred; the joblib pipeline is only unpickled when the
+    artifact is missing or stale, or when SURPLUS_ENGINE=sklearn. Nothing
+    global is touched: surplus_model swaps the bundle in after its warm-up.
+    """
+    full_pipeline, compiled_model = None, None
+
+    if SURPLUS_ENGINE == 'compiled':
+        try:
+            compiled_model = CompiledSurplusModel.load_if_current(SURPLUS_ARTIFACT, MODEL_FILENAME)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[!] Could not read artifact '{SURPLUS_ARTIFACT}': {e}")
+        if compiled_model is not None:
+            print(f"[*] Successfully loaded sklearn-free model artifact: {SURPLUS_ARTIFACT}.npz")
+
+    if compiled_model is None:
+        try:
+            import joblib
+            # Load the entire trained pipeline (preprocessor + model)
+            full_pipeline = joblib.load(MODEL_FILENAME)
+            print(f"[*] Successfully loaded ML pipeline: {MODEL_FILENAME}")
+        except FileNotFoundError:
+            print(f"[!!! ERROR !!!] Model file '{MODEL_FILENAME}' not found. Please train the model first.")
+            full_pipeline = None
+
+    # Export the fitted pipeline into flat arrays for the compiled fast path
+    if full_pipeline is not None and SURPLUS_ENGINE == 'compiled':
+        try:
+            compiled_model = CompiledSurplusModel.from_pipeline(full_pipeline)
+            print(f"[*] Compiled inference engine ready ({compiled_model.manifest['n_trees']} trees).")
+        except ValueError as e:
+            print(f"[!] Compiled engine unavailable, using sklearn pipeline: {e}")
+
+    bundle = ModelBundle(model_version(MODEL_FILENAME), pipeline=full_pipeline, compiled=compiled_model,
+                         fallback_index=load_fallback_index())
+    bundle.info['engine'] = 'compiled' if compiled_model is not None else 'sklearn' if full_pipeline is not None else None
+    return bundle
+
+
+def load_fallback_index():
+    """Reads the historical fallback index; the API runs without it if the file is missing."""
+    try:
+        index = SurplusFallbackIndex.load(FALLBACK_INDEX_FILE)
+        print(f"[*] Loaded surplus fallback index: {FALLBACK_INDEX_FILE} (built {index.index['built_at']})")
+        return index
+    except (OSError, ValueError, KeyError) as e:
+        print(f"[!] Fallback index unavailable, requests always wait for the model: {e}")
+        return None
+
+
+def _has_model(bundle):
+    return bundle.compiled is not None or bundle.pipeline is not None
+
+
+def warm_up_surplus_model(bundle):
+    """Predicts a few rows of the training log with the new bundle (one batch, then single rows)."""
+    rows = [row for row, error in map(validate_surplus_record, read_sample_records(WARMUP_DATA_FILE)) if not error]
+    if not rows:
+        print(f"[!] No warm-up rows in '{WARMUP_DATA_FILE}'; swapping in without a warm-up.")
+        return
+    columns = {col: [row[col] for row in rows] for col in FEATURE_COLUMNS}
+    check_finite(predict_surplus_columns(columns, bundle, observe=False), len(rows))
+    for row in rows[:3]:
+        check_finite(predict_surplus_columns({col: [row[col]] for col in FEATURE_COLUMNS}, bundle, observe=False), 1)
+
+
+surplus_model = HotSwapModel(
+    'surplus', load_surplus_model, warm_up_surplus_model,
+    model_files=[MODEL_FILENAME, f'{SURPLUS_ARTIFACT}.npz', f'{SURPLUS_ARTIFACT}.json', FALLBACK_INDEX_FILE],
+    is_ready=_has_model, on_swap=lambda bundle: prediction_cache.invalidate())
+
+
+def model_loaded():
+    bundle = surplus_model.current
+    return bundle is not None and _has_model(bundle)
+
+
+def service_available():
+    """True when requests can be answered, by the model or by the fallback index."""
+    bundle = surplus_model.current
+    return bundle is not None and (_has_model(bundle) or bundle.fallback_index is not None)
 
-# --- MODEL LOADING (Done once at startup) ---
-try:
-    # Load the entire trained pipeline (preprocessor + model)
-    full_pipeline = joblib.load(MODEL_FILENAME)
-    print(f"[*] Successfully loaded ML pipeline: {MODEL_FILENAME}")
-except FileNotFoundError:
-    print(f"[!!! ERROR !!!] Model file '{MODEL_FILENAME}' not found. Please train the model first.")
-    full_pipeline = None
 
-@app.route('/predict_surplus', methods=['POST'])
+@surplus_api.route('/predict_surplus', methods=['POST'])
 def predict_surplus():
     """
     Receives input features from the React Native app via JSON and returns the predicted surplus.
@@ -54,40 +169,331 @@ def predict_surplus():
         "actual_kg_planned": 10.5
     }
     """
-    if full_pipeline is None:
+    if not service_available():
         return jsonify({'error': 'Model not loaded.'}), 500
 
     try:
         # Get data posted as JSON from the mobile app
+        start = time.perf_counter()
         data = request.get_json(force=True)
-        
-        # 1. Convert the dictionary input into a Pandas DataFrame
-        # This is CRITICAL because the pipeline expects a DataFrame structure 
-        # (even for a single row) with features in the correct order.
-        input_df = pd.DataFrame([data], columns=FEATURE_COLUMNS)
-
-        # 2. Make Prediction
-        prediction_array = full_pipeline.predict(input_df)
-        predicted_surplus = round(float(prediction_array[0]), 3)
-
-        # 3. Return the result
-        return jsonify({
-            'status': 'success',
-            'predicted_kg_surplus': predicted_surplus,
-            'message': f'Predicted waste for {data.get("food_id")} is {predicted_surplus} kg.'
-        })
+        metrics.observe_stage('surplus', 'parse', start)
+
+        # 1 + 2. Validate the record and make the prediction (same path as the batch route)
+        result = predict_surplus_with_budget([(data, None)])[0]
+        if result['status'] == 'error':
+            raise ValueError(result['error'])
+        predicted_surplus = result['predicted_kg_surplus']
+
+        # 3. Return the result, flagged with the path that served it
+        response = {key: value for key, value in result.items() if key not in ('index', 'food_id')}
+        response['message'] = f'Predicted waste for {data.get("food_id")} is {predicted_surplus} kg.'
+        return jsonify(response)
 
     except Exception as e:
         # Log the error and return a helpful message
         print(f"Prediction Error: {e}")
         return jsonify({'error': 'Invalid input or processing failed.', 'details': str(e)}), 400
 
+# --- BATCH PREDICTION HELPERS ---
+
+def validate_surplus_record(record):
+    """
+    Checks one SurplusInput record and returns (clean_row, None) on success or
+    (None, error_message) on failure, so a bad row never fails the whole batch.
+    """
+    if not isinstance(record, dict):
+        return None, 'Record must be a JSON object.'
+
+    missing = [col for col in FEATURE_COLUMNS if col not in record]
+    if missing:
+        return None, f"Missing features: {', '.join(missing)}"
+
+    row = {}
+    try:
+        for col in NUMERIC_FEATURES:
+            row[col] = coerce_number(record[col])
+        for col in BOOLEAN_FEATURES:
+            row[col] = coerce_bool(record[col])
+    except (TypeError, ValueError) as e:
+        return None, f"Invalid value for '{col}': {e}"
+
+    for col in CATEGORICAL_FEATURES:
+        if not isinstance(record[col], str):
+            return None, f"Invalid value for '{col}': expected a string, got {record[col]!r}"
+        row[col] = record[col]
+    return row, None
+
+
+def predict_surplus_records(records, bundle=None, count=True):
+    """
+    Validates every record, answers repeated feature vectors from the cache,
+    runs all remaining rows through the compiled engine (or the sklearn
+    pipeline) in ONE predict call, and returns per-row results in input order.
+    `bundle` defaults to the live model version. count=False leaves
+    ml_predictions_total to the caller, which may discard the results.
+    """
+    bundle = bundle or surplus_model.current
+    stage_start = time.perf_counter()
+    results = [None] * len(records)
+    pending = [] # (index, cache_key) of rows that still need the model
+    columns = {col: [] for col in FEATURE_COLUMNS}
+
+    for i, (record, parse_error) in enumerate(records):
+        row, error = (None, parse_error) if parse_error else validate_surplus_record(record)
+        if error:
+            results[i] = {'index': i, 'status': 'error', 'error': error}
+            continue
+
+        key = None
+        if prediction_cache.enabled:
+            key = canonical_key(row, FEATURE_COLUMNS, SURPLUS_CACHE_FLOAT_DIGITS, BOOLEAN_FEATURES)
+            hit, value = prediction_cache.get(key, bundle.version)
+            if hit:
+                results[i] = _surplus_result(i, row['food_id'], value, 'cache')
+                continue
+            # Predict on the key's values (quantized when opted in) so hits and misses always agree
+            row = dict(zip(FEATURE_COLUMNS, key))
+
+        pending.append((i, key))
+        for col in FEATURE_COLUMNS:
+            columns[col].append(row[col])
+
+    stage_start = metrics.observe_stage('surplus', 'validate', stage_start)
+
+    if pending:
+        predictions = predict_surplus_columns(columns, bundle)
+        stage_start = time.perf_counter()
+        for (i, key), food_id, value in zip(pending, columns['food_id'], predictions):
+            value = float(value)
+            if key is not None:
+                prediction_cache.put(key, value, bundle.version)
+            results[i] = _surplus_result(i, food_id, value)
+        metrics.observe_stage('surplus', 'postprocess', stage_start)
+    if count:
+        metrics.count_predictions('surplus', results)
+    return results
+
+
+def predict_surplus_columns(columns, bundle=None, observe=True):
+    """
+    Scores a dict of equal-length feature columns (lists or NumPy arrays) with
+    the compiled engine, or the sklearn pipeline, in one call. No validation
+    and no cache: callers pass clean values. observe=False keeps warm-up calls
+    out of the stage metrics.
+    """
+    bundle = bundle or surplus_model.current
+    if bundle.compiled is not None:
+        stage_times = {}
+        predictions = bundle.compiled.predict(columns, stage_times=stage_times)
+        if observe:
+            metrics.record_stage_times('surplus', stage_times)
+        return predictions
+
+    import pandas as pd
+    observe_stage = metrics.observe_stage if observe else lambda api, stage, start: time.perf_counter()
+    stage_start = time.perf_counter()
+    # Build the frame column-wise (much cheaper than one dict per row)
+    input_df = pd.DataFrame(columns, columns=FEATURE_COLUMNS)
+    stage_start = observe_stage('surplus', 'frame', stage_start)
+    # Same as pipeline.predict, split so both stages are timed
+    X = bundle.pipeline['preprocessor'].transform(input_df)
+    stage_start = observe_stage('surplus', 'transform', stage_start)
+    predictions = bundle.pipeline['regressor'].predict(X)
+    observe_stage('surplus', 'predict', stage_start)
+    return predictions
+
+
+def _surplus_result(index, food_id, value, served_by='model'):
+    return {
+        'index': index,
+        'status': 'success',
+        'food_id': food_id,
+        'predicted_kg_surplus': round(value, 3),
+        'served_by': served_by,
+    }
+
+
+# --- LATENCY BUDGET + HISTORICAL FALLBACK ---
+_model_executor = None
+_executor_lock = threading.Lock()
+_in_flight = 0 # model calls running or queued in this process (incl. ones past their deadline)
+_in_flight_lock = threading.Lock()
+
+
+def _get_executor():
+    # Created on first use, so gunicorn workers never inherit threads from the pre-fork parent
+    global _model_executor
+    if _model_executor is None:
+        with _executor_lock:
+            if _model_executor is None:
+                _model_executor = ThreadPoolExecutor(max_workers=SURPLUS_MODEL_THREADS, thread_name_prefix='surplus-model')
+    return _model_executor
+
+
+def _run_model(records, bundle):
+    # Not counted here: past the deadline the caller serves the fallback instead
+    global _in_flight
+    try:
+        return predict_surplus_records(records, bundle, count=False)
+    finally:
+        with _in_flight_lock:
+            _in_flight -= 1
+
+
+def predict_surplus_fallback(records, reason, fallback_index):
+    """Answers every valid record from the fallback index (microseconds per row)."""
+    stage_start = time.perf_counter()
+    results = []
+    for i, (record, parse_error) in enumerate(records):
+        row, error = (None, parse_error) if parse_error else validate_surplus_record(record)
+        if error:
+            results.append({'index': i, 'status': 'error', 'error': error})
+            continue
+        result = {'index': i, 'status': 'success', 'food_id': row['food_id']}
+        result.update(fallback_index.estimate(row))
+        result.update(served_by='fallback', fallback_reason=reason)
+        results.append(result)
+    metrics.observe_stage('surplus', 'fallback', stage_start)
+    metrics.FALLBACKS_TOTAL.inc('surplus', reason, amount=sum(r['status'] == 'success' for r in results))
+    metrics.count_predictions('surplus', results)
+    return results
+
+
+def predict_surplus_with_budget(records):
+    """
+    predict_surplus_records() under the latency budget. Falls back to the
+    historical index when the model is not loaded ('model_not_loaded'), when
+    SURPLUS_MAX_IN_FLIGHT calls are already pending ('saturated'), or when the
+    model misses SURPLUS_DEADLINE_MS ('deadline'; its result is discarded).
+    Every successful row carries served_by = 'model', 'cache' or 'fallback'.
+    The whole request uses the model version that was live when it arrived.
+    """
+    global _in_flight
+    bundle = surplus_model.current
+    fallback_index = bundle.fallback_index
+    if fallback_index is None:
+        return predict_surplus_records(records, bundle)
+    if not _has_model(bundle):
+        return predict_surplus_fallback(records, 'model_not_loaded', fallback_index)
+
+    with _in_flight_lock:
+        saturated = 0 < SURPLUS_MAX_IN_FLIGHT <= _in_flight
+        if not saturated:
+            _in_flight += 1
+    if saturated:
+        return predict_surplus_fallback(records, 'saturated', fallback_index)
+    if SURPLUS_DEADLINE_MS <= 0:
+        results = _run_model(records, bundle)
+    else:
+        # metrics.profiled: a slow request's profile includes the model thread, not just future.result()
+        future = _get_executor().submit(metrics.profiled(_run_model), records, bundle)
+        try:
+            results = future.result(timeout=SURPLUS_DEADLINE_MS / 1000.0)
+        except FutureTimeoutError:
+            return predict_surplus_fallback(records, 'deadline', fallback_index)
+    metrics.count_predictions('surplus', results) # Only the results actually served
+    return results
+
+
+@surplus_api.route('/predict_surplus_batch', methods=['POST'])
+def predict_surplus_batch():
+    """
+    Batch version of /predict_surplus for the menu planner. Accepts a JSON array
+    of SurplusInput records, {"records": [...]}, or NDJSON, and scores every valid
+    record with a single vectorized pipeline call. Invalid records are reported
+    per row; results are returned in input order.
+    """
+    if not service_available():
+        return jsonify({'error': 'Model not loaded.'}), 500
+
+    try:
+        start = time.perf_counter()
+        records = parse_batch_body(request)
+        metrics.observe_stage('surplus', 'parse', start)
+    except ValueError as e:
+        return jsonify({'error': 'Invalid batch payload.', 'details': str(e)}), 400
+
+    if len(records) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'Batch too large. Maximum is {MAX_BATCH_SIZE} records.'}), 413
+
+    try:
+        results = predict_surplus_with_budget(records)
+    except Exception as e:
+        print(f"Batch Prediction Error: {e}")
+        return jsonify({'error': 'Batch processing failed.', 'details': str(e)}), 500
+
+    return jsonify(batch_summary(results))
+
+@surplus_api.route('/optimize_menu', methods=['POST'])
+def optimize_menu():
+    """
+    Plans a week of kg quantities (and, with dishes_per_slot, the dishes) that
+    minimize predicted surplus while covering historical demand. See
+    menu_optimizer.py for the method.
+    Example JSON Input:
+    {
+        "slots": [
+            {"day_of_wk": "Monday", "month": 9, "meal_type": "Lunch",
+             "price_type_special_weather": "Weather: Sunny", "staff_on_duty": 12},
+            ...
+        ],
+        "dishes": ["F004", "F013", {"food_id": "F020", "min_portions": 40}],
+        "dishes_per_slot": 7
+    }
+    Optional slot fields: is_holiday (default false) and peak_hour_demand_ratio
+    (default: historical median for the meal type).
+    """
+    if not model_loaded():
+        return jsonify({'error': 'Model not loaded.'}), 500
+
+    try:
+        start = time.perf_counter()
+        data = request.get_json(force=True)
+        metrics.observe_stage('optimize', 'parse', start)
+        if not isinstance(data, dict) or not isinstance(data.get('slots'), list) or not isinstance(data.get('dishes'), list):
+            raise ValueError("Expected an object with 'slots' and 'dishes' lists.")
+        dishes_per_slot = data.get('dishes_per_slot')
+        if dishes_per_slot is not None and (isinstance(dishes_per_slot, bool) or not isinstance(dishes_per_slot, int)
+                                            or dishes_per_slot < 1):
+            raise ValueError("'dishes_per_slot' must be a positive integer.")
+    except Exception as e:
+        return jsonify({'error': 'Invalid optimization request.', 'details': str(e)}), 400
+
+    try:
+        start = time.perf_counter()
+        bundle = surplus_model.current # one model version for the whole week
+        plan = menu_optimizer.optimize_week(data['slots'], data['dishes'],
+                                            lambda columns: predict_surplus_columns(columns, bundle), dishes_per_slot)
+        metrics.observe_stage('optimize', 'optimize', start)
+    except ValueError as e:
+        return jsonify({'error': 'Invalid optimization request.', 'details': str(e)}), 400
+    except Exception as e:
+        print(f"Menu Optimization Error: {e}")
+        return jsonify({'error': 'Optimization failed.', 'details': str(e)}), 500
+
+    return jsonify(dict(plan, status='success'))
+
+@surplus_api.route('/cache_stats/surplus', methods=['GET'])
+def surplus_cache_stats():
+    """Reports hit, miss and eviction counters of the surplus prediction cache."""
+    return jsonify(prediction_cache.stats())
+
+surplus_model.reload('startup')
+
+app = Flask(__name__)
+metrics.instrument_app(app) # Request timing + GET /metrics
+install_reload(app, [surplus_model]) # /admin/* + model file watcher
+app.register_blueprint(surplus_api)
+
 # To run the API server (use '0.0.0.0' for external access, e.g., from your phone)
 if __name__ == '__main__':
     print("\n==========================================================")
     print("      FLASK SURPLUS PREDICTION API STARTING")
     print("==========================================================")
-    print(f"API available at: http://127.0.0.1:5000/predict_surplus")
+    print(f"API available at: http://127.0.0.1:8082/predict_surplus")
+    print(f"Batch endpoint:   http://127.0.0.1:8082/predict_surplus_batch")
+    print(f"Menu optimizer:   http://127.0.0.1:8082/optimize_menu")
     print("Press CTRL+C to stop the server.")
+    enable_archive() # Version history for /admin/rollback (not on import)
     # You might need to change the host/port for production or testing on device
     app.run(host='0.0.0.0', port=8082, debug=False)
@@ -0,0 +1,78 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+
+# --- SYNTHETIC CANTEEN LOG GENERATOR (for out-of-core training tests) ---
+# Writes a log with the same schema as canteen_daily_log.csv, at any size
+# (e.g. 10M rows), without holding it in memory. Each chunk of rows plays one
+# pooled canteen: rows are resampled from the real log (keeping each row's
+# calendar, weather, dish and category combination), then the quantities
+# are perturbed:
+#   - actual_kg_planned  x lognormal noise (sigma KG_NOISE)
+#   - meal_qty_ordered   keeps the row's portions-per-kg ratio
+#   - kg_surplus         keeps the row's surplus share of the planned kg, x lognormal noise
+#   - staff_on_duty / peak_hour_demand_ratio jittered within the real min..max
+# Example: python synthetic_canteen_log.py --rows 10000000 --output synthetic_canteen_log.csv
+
+SOURCE_FILE = 'canteen_daily_log.csv'
+DEFAULT_OUTPUT = 'synthetic_canteen_log.csv'
+CHUNK_ROWS = 500_000 # Rows generated and written at once (one pooled canteen)
+KG_NOISE = 0.15
+SURPLUS_NOISE = 0.10
+PEAK_RATIO_NOISE = 0.02
+RANDOM_SEED = 42
+
+
+def generate_chunk(template, n_rows, rng):
+    """Returns n_rows synthetic rows resampled from `template` (the real log), in date order."""
+    rows = template.iloc[np.sort(rng.integers(0, len(template), n_rows))].reset_index(drop=True)
+
+    planned = rows['actual_kg_planned'].to_numpy()
+    new_planned = np.round(planned * rng.lognormal(0.0, KG_NOISE, n_rows), 3)
+    portions_per_kg = rows['meal_qty_ordered'].to_numpy() / planned
+    surplus_share = rows['kg_surplus'].to_numpy() / planned
+
+    rows['actual_kg_planned'] = new_planned
+    rows['meal_qty_ordered'] = np.maximum(1, np.round(new_planned * portions_per_kg)).astype(np.int64)
+    rows['kg_surplus'] = np.round(new_planned * surplus_share * rng.lognormal(0.0, SURPLUS_NOISE, n_rows), 3)
+
+    staff = template['staff_on_duty']
+    rows['staff_on_duty'] = np.clip(rows['staff_on_duty'].to_numpy() + rng.integers(-1, 2, n_rows),
+                                    staff.min(), staff.max())
+    peak = template['peak_hour_demand_ratio']
+    rows['peak_hour_demand_ratio'] = np.round(np.clip(
+        rows['peak_hour_demand_ratio'].to_numpy() + rng.normal(0.0, PEAK_RATIO_NOISE, n_rows),
+        peak.min(), peak.max()), 2)
+    return rows
+
+
+def generate_log(n_rows, output=DEFAULT_OUTPUT, chunk_rows=CHUNK_ROWS, seed=RANDOM_SEED):
+    """Streams n_rows synthetic rows to `output` in chunks of chunk_rows."""
+    print("=====================================================================")
+    print("            SYNTHETIC CANTEEN LOG GENERATOR                          ")
+    print("=====================================================================")
+    template = pd.read_csv(SOURCE_FILE)
+    rng = np.random.default_rng(seed)
+    print(f"[*] Resampling {len(template)} rows of '{SOURCE_FILE}' into {n_rows:,} rows -> '{output}'")
+
+    start_time = time.time()
+    written = 0
+    while written < n_rows:
+        chunk = generate_chunk(template, min(chunk_rows, n_rows - written), rng)
+        chunk.to_csv(output, mode='w' if written == 0 else 'a', header=written == 0, index=False)
+        written += len(chunk)
+        print(f"  > {written:,} rows written ({time.time() - start_time:.1f} s)")
+
+    print(f"[SUCCESS] {written:,} rows written to '{output}' in {time.time() - start_time:.1f} seconds.")
+    print("=====================================================================")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Generate a large synthetic canteen log with the real schema.')
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--seed', type=int, default=RANDOM_SEED)
+    args = parser.parse_args()
+    generate_log(args.rows, args.output, args.chunk_rows, args.seed)
@@ -0,0 +1,105 @@
+import shutil
+import joblib
+import pandas as pd
+import pytest
+from fast_inference import (CompiledSpoilageModel, CompiledSurplusModel, SPOILAGE_ARTIFACT, SPOILAGE_MODEL_FILENAME,
+                            SURPLUS_ARTIFACT, SURPLUS_MODEL_FILENAME, export_artifact, verify_parity)
+
+# (compiled class, model file, committed artifact, training CSV, categorical columns set to an unseen value)
+ENGINES = {
+    'surplus': (CompiledSurplusModel, SURPLUS_MODEL_FILENAME, SURPLUS_ARTIFACT, 'canteen_daily_log.csv', ['food_id', 'cuisine']),
+    'spoilage': (CompiledSpoilageModel, SPOILAGE_MODEL_FILENAME, SPOILAGE_ARTIFACT, 'food_spoilage_data.csv', ['Food_Type']),
+}
+
+
+def with_unseen_categories(df, columns, n_rows=50):
+    unseen = df.head(n_rows).copy()
+    for col in columns:
+        unseen[col] = 'Unknown Value'
+    return unseen
+
+
+@pytest.fixture(scope='module')
+def spoilage_data():
+    return pd.read_csv(ENGINES['spoilage'][3])
+
+
+@pytest.fixture(scope='module')
+def nystroem_pipeline(spoilage_data):
+    """The SpoliageML.py --approx model, fitted with the gamma of the committed SVR."""
+    from SpoliageML import FEATURE_COLUMNS, TARGET_COLUMN, build_approx_pipeline
+    gamma = float(joblib.load(SPOILAGE_MODEL_FILENAME)['regressor']._gamma)
+    pipeline = build_approx_pipeline(gamma, n_components=50)
+    return pipeline.fit(spoilage_data[FEATURE_COLUMNS], spoilage_data[TARGET_COLUMN])
+
+
+@pytest.mark.parametrize('engine', sorted(ENGINES))
+def test_compiled_pipeline_matches_sklearn(engine):
+    compiled_cls, model_file, _, data_file, unseen_columns = ENGINES[engine]
+    pipeline = joblib.load(model_file)
+    compiled = compiled_cls.from_pipeline(pipeline)
+    df = pd.read_csv(data_file)
+
+    verify_parity(pipeline, compiled, df)
+    # Unseen categories must behave like OneHotEncoder(handle_unknown='ignore')
+    verify_parity(pipeline, compiled, with_unseen_categories(df, unseen_columns))
+
+
+@pytest.mark.parametrize('engine', sorted(ENGINES))
+def test_committed_artifact_is_current(engine):
+    compiled_cls, model_file, artifact, data_file, _ = ENGINES[engine]
+    compiled = compiled_cls.load_if_current(artifact, model_file)
+    assert compiled is not None, f'{artifact} is stale; run python fast_inference.py --export'
+    verify_parity(joblib.load(model_file), compiled, pd.read_csv(data_file))
+
+
+def test_nystroem_spoilage_matches_sklearn(nystroem_pipeline, spoilage_data):
+    compiled = CompiledSpoilageModel.from_pipeline(nystroem_pipeline)
+    assert compiled.manifest['approximation'] == 'nystroem'
+    assert compiled.manifest['n_support_vectors'] == 50
+
+    verify_parity(nystroem_pipeline, compiled, spoilage_data)
+    verify_parity(nystroem_pipeline, compiled, with_unseen_categories(spoilage_data, ['Food_Type']))
+
+
+def test_nystroem_artifact_round_trip(nystroem_pipeline, spoilage_data, tmp_path):
+    model_file = tmp_path / 'spoilage_nystroem.joblib'
+    joblib.dump(nystroem_pipeline, model_file)
+    artifact = str(tmp_path / 'spoilage_nystroem')
+    export_artifact(nystroem_pipeline, CompiledSpoilageModel, artifact, str(model_file))
+
+    reloaded = CompiledSpoilageModel.load_if_current(artifact, str(model_file))
+    assert reloaded.manifest['approximation'] == 'nystroem'
+    verify_parity(nystroem_pipeline, reloaded, spoilage_data)
+
+
+@pytest.mark.parametrize('engine', sorted(ENGINES))
+def test_corrupted_artifact_fails_sha256_check(engine, tmp_path):
+    compiled_cls, model_file, artifact, _, _ = ENGINES[engine]
+    copy = str(tmp_path / artifact)
+    for suffix in ('.npz', '.json'):
+        shutil.copyfile(artifact + suffix, copy + suffix)
+    shutil.copyfile(model_file, tmp_path / model_file)
+    assert compiled_cls.load_if_current(copy, str(tmp_path / model_file)) is not None
+
+    # Flip one byte in the middle of the arrays
+    with open(copy + '.npz', 'r+b') as f:
+        f.seek(len(f.read()) // 2)
+        byte = f.read(1)
+        f.seek(-1, 1)
+        f.write(bytes([byte[0] ^ 0xFF]))
+    with pytest.raises(ValueError, match='corrupted'):
+        compiled_cls.load_if_current(copy, str(tmp_path / model_file))
+
+    # A truncated file (e.g. a crash mid-write) fails the same check
+    with open(copy + '.npz', 'r+b') as f:
+        f.truncate(100)
+    with pytest.raises(ValueError, match='corrupted'):
+        compiled_cls.load(copy)
+
+
+def test_artifact_of_another_model_file_is_stale(tmp_path):
+    shutil.copyfile(SURPLUS_ARTIFACT + '.npz', tmp_path / (SURPLUS_ARTIFACT + '.npz'))
+    shutil.copyfile(SURPLUS_ARTIFACT + '.json', tmp_path / (SURPLUS_ARTIFACT + '.json'))
+    (tmp_path / SURPLUS_MODEL_FILENAME).write_bytes(b'retrained model')
+    assert CompiledSurplusModel.load_if_current(str(tmp_path / SURPLUS_ARTIFACT), str(tmp_path / SURPLUS_MODEL_FILENAME)) is None
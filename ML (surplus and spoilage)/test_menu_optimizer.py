@@ -0,0 +1,41 @@
+import pytest
+
+SLOT = {'day_of_wk': 'Monday', 'month': 9, 'meal_type': 'Lunch',
+        'price_type_special_weather': 'Weather: Sunny', 'staff_on_duty': 12}
+
+
+@pytest.fixture(scope='module')
+def client():
+    from surplus_prediction_api import app
+    return app.test_client()
+
+
+def test_optimize_menu_plans_valid_request(client):
+    response = client.post('/optimize_menu', json={
+        'slots': [SLOT], 'dishes': ['F004', {'food_id': 'F013', 'min_portions': 0, 'cuisine': 'North Indian'}]})
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'success'
+
+
+@pytest.mark.parametrize('dish, field', [
+    ({'food_id': 'F004', 'veg_nonveg': 1}, 'veg_nonveg'),
+    ({'food_id': 'F004', 'cuisine': ['North Indian']}, 'cuisine'),
+    ({'food_id': 'F004', 'cuisine': None}, 'cuisine'),
+    ({'food_id': 'F004', 'dish_name': 42}, 'dish_name'),
+    ({'food_id': 'F004', 'min_portions': -5}, 'min_portions'),
+    ({'food_id': 'F004', 'min_portions': 'many'}, 'min_portions'),
+    ({'food_id': 'F004', 'min_portions': float('nan')}, 'min_portions'),
+    ({'food_id': 'F004', 'estimated_prep_time_hours': {}}, 'estimated_prep_time_hours'),
+    ({'food_id': 'F004', 'is_seasonal_dish': 'sometimes'}, 'is_seasonal_dish'),
+])
+def test_optimize_menu_rejects_bad_dish_with_400(client, dish, field):
+    response = client.post('/optimize_menu', json={'slots': [SLOT], 'dishes': [dish]})
+    assert response.status_code == 400
+    assert field in response.get_json()['details']
+
+
+@pytest.mark.parametrize('field, value', [('day_of_wk', 1), ('month', 'September'), ('is_holiday', 'maybe')])
+def test_optimize_menu_rejects_bad_slot_with_400(client, field, value):
+    response = client.post('/optimize_menu', json={'slots': [dict(SLOT, **{field: value})], 'dishes': ['F004']})
+    assert response.status_code == 400
+    assert field in response.get_json()['details']
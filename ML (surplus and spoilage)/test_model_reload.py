@@ -0,0 +1,188 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+from flask import Flask
+import model_reload
+from model_reload import HotSwapModel, ModelBundle, install_reload, model_version
+
+TOKEN = 'test-token'
+
+
+@pytest.fixture
+def model_file(tmp_path):
+    return tmp_path / 'toy_model.joblib'
+
+
+@pytest.fixture
+def model(tmp_path, model_file, monkeypatch):
+    """A HotSwapModel over a text file holding one number; 'bad' fails the warm-up."""
+    monkeypatch.setattr(model_reload, 'ARCHIVE_DIR', str(tmp_path / 'model_versions'))
+    monkeypatch.setattr(model_reload, 'ARCHIVE_KEEP', 3)
+    monkeypatch.setattr(model_reload, '_archive_enabled', True)
+    monkeypatch.setattr(HotSwapModel, 'ensure_watcher', lambda self: None)
+
+    def build():
+        return ModelBundle(model_version(str(model_file)), value=model_file.read_text())
+
+    def warm_up(bundle):
+        float(bundle.value)
+
+    model_file.write_text('1')
+    models = model_reload._models
+    swap_model = HotSwapModel('toy', build, warm_up, [str(model_file)])
+    assert swap_model.reload('startup')[0]
+    yield swap_model
+    models.remove(swap_model)
+
+
+def train(model, model_file, value):
+    """Writes a new version and reloads it; returns its version."""
+    model_file.write_text(value)
+    ok, message = model.reload('file_change')
+    assert ok, message
+    return model.current.version
+
+
+@pytest.fixture
+def admin_client(model, monkeypatch):
+    monkeypatch.setattr(model_reload, 'ADMIN_TOKEN', TOKEN)
+    monkeypatch.setattr(model_reload, 'RELOAD_POLL_SECONDS', 5.0)
+    return install_reload(Flask(__name__), [model]).test_client()
+
+
+# --- RELOAD ---
+
+def test_reload_swaps_in_the_new_version(model, model_file):
+    first = model.current
+    version = train(model, model_file, '2')
+    assert model.current.value == '2'
+    assert model.previous is first
+    assert version != first.version
+    assert model.describe()['version_history'] == [first.version, version]
+
+
+def test_failed_warm_up_keeps_the_live_version(model, model_file):
+    live = model.current
+    model_file.write_text('bad')
+    ok, message = model.reload('file_change')
+    assert not ok
+    assert model.current is live
+    assert message.startswith('ValueError') and model.last_error == message
+    assert model.describe()['version_history'] == [live.version]
+
+
+# --- ROLLBACK ---
+
+def test_repeated_rollbacks_step_back_through_the_history(model, model_file):
+    v1 = model.current.version
+    v2 = train(model, model_file, '2')
+    v3 = train(model, model_file, '3')
+
+    assert model.rollback()[0] == 'ok'
+    assert (model.current.version, model_file.read_text()) == (v2, '2')
+    assert model.rollback()[0] == 'ok'
+    assert (model.current.version, model_file.read_text()) == (v1, '1')
+    assert model.rollback()[0] == 'missing'
+    assert model.current.version == v1
+
+    # A model trained after the rollbacks goes on top of v1
+    v4 = train(model, model_file, '4')
+    assert model.describe()['version_history'] == [v1, v4]
+    assert v3 not in model.describe()['version_history']
+
+
+def test_history_keeps_the_last_versions(model, model_file):
+    versions = [model.current.version] + [train(model, model_file, str(value)) for value in range(2, 7)]
+    assert model.describe()['version_history'] == versions[-4:]
+    assert sorted(model._archived_names()) == sorted(versions[-4:])
+
+
+def test_rollback_without_an_earlier_version_is_missing(model):
+    status, message = model.rollback()
+    assert status == 'missing'
+    assert 'No earlier' in message
+
+
+def test_rollback_with_the_archive_off_is_missing(model, model_file, monkeypatch):
+    train(model, model_file, '2')
+    monkeypatch.setattr(model_reload, '_archive_enabled', False)
+    status, message = model.rollback()
+    assert status == 'missing'
+    assert 'archive is off' in message
+    assert model_file.read_text() == '2'
+
+
+def test_rollback_and_reload_are_busy_during_a_reload(model, model_file):
+    train(model, model_file, '2')
+    with model._reload_lock:
+        assert model.rollback()[0] == 'busy'
+        assert model.reload('admin') == (False, 'A reload is already running.')
+    assert model_file.read_text() == '2'
+
+
+# --- ARCHIVE ONLY FROM THE SERVER ENTRY POINTS ---
+
+def test_importing_the_apis_writes_no_archive(tmp_path):
+    archive_dir = tmp_path / 'model_versions'
+    env = dict(os.environ, ML_MODEL_ARCHIVE_DIR=str(archive_dir), ML_RELOAD_POLL_SECONDS='0')
+    env.pop('ML_MODEL_ARCHIVE_KEEP', None)
+    code = 'import prediction_service, model_reload; print(model_reload._archive_enabled)'
+    result = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().endswith('False')
+    assert not archive_dir.exists()
+
+
+def test_enable_archive_records_the_live_versions(model, monkeypatch):
+    monkeypatch.setattr(model_reload, '_archive_enabled', False)
+    monkeypatch.setattr(model_reload, '_models', [model]) # keep the real API models out of tmp_path
+    model_reload.enable_archive()
+    assert model_reload._archive_enabled
+    with open(model.history_file, encoding='utf-8') as f:
+        history = json.load(f)
+    assert [(entry['version'], entry['reason']) for entry in history] == [(model.current.version, 'startup')]
+
+
+# --- ADMIN ENDPOINTS ---
+
+@pytest.mark.parametrize('method, path', [
+    ('get', '/admin/models'), ('post', '/admin/reload'), ('post', '/admin/reload/surplus'),
+    ('post', '/admin/rollback/spoilage'),
+])
+def test_admin_endpoints_are_403_by_default(method, path):
+    from prediction_service import app
+    assert model_reload.ADMIN_TOKEN == ''
+    assert getattr(app.test_client(), method)(path).status_code == 403
+
+
+def test_admin_endpoints_reject_a_wrong_token(admin_client):
+    assert admin_client.get('/admin/models').status_code == 403
+    assert admin_client.get('/admin/models', headers={'X-Admin-Token': 'wrong'}).status_code == 403
+    assert admin_client.get('/admin/models', headers={'X-Admin-Token': TOKEN}).status_code == 200
+
+
+def test_admin_reload_and_rollback(admin_client, model, model_file):
+    headers = {'X-Admin-Token': TOKEN}
+    v1 = model.current.version
+    model_file.write_text('2')
+    response = admin_client.post('/admin/reload/toy?wait=1', headers=headers)
+    assert response.status_code == 200
+    assert response.get_json()['models']['toy']['current']['version'] == model_version(str(model_file))
+    assert os.path.exists(model.trigger_file)
+
+    response = admin_client.post('/admin/rollback/toy', headers=headers)
+    assert response.status_code == 200
+    assert response.get_json()['current']['version'] == v1
+    assert admin_client.post('/admin/rollback/toy', headers=headers).status_code == 409
+    assert admin_client.post('/admin/rollback/other', headers=headers).status_code == 404
+
+
+def test_admin_endpoints_are_409_while_busy_or_without_watcher(admin_client, model, monkeypatch):
+    headers = {'X-Admin-Token': TOKEN}
+    with model._reload_lock:
+        assert admin_client.post('/admin/reload/toy', headers=headers).status_code == 409
+        assert admin_client.post('/admin/rollback/toy', headers=headers).status_code == 409
+    monkeypatch.setattr(model_reload, 'RELOAD_POLL_SECONDS', 0)
+    assert admin_client.post('/admin/reload/toy', headers=headers).status_code == 409
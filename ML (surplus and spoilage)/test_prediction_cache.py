@@ -0,0 +1,141 @@
+import json
+import pandas as pd
+import pytest
+import prediction_cache
+from prediction_cache import PredictionCache, canonical_key
+
+SURPLUS_FEATURES = [
+    'day_of_wk', 'month', 'meal_type', 'price_type_special_weather', 'is_holiday',
+    'food_id', 'veg_nonveg', 'cuisine', 'estimated_prep_time_hours',
+    'staff_on_duty', 'peak_hour_demand_ratio', 'is_seasonal_dish', 'actual_kg_planned'
+]
+SPOILAGE_FEATURES = ['Time_Since_Prep_Hours', 'Storage_Info', 'Food_Type', 'Meal_Time']
+
+
+@pytest.fixture(scope='module')
+def surplus():
+    import surplus_prediction_api
+    return surplus_prediction_api
+
+
+@pytest.fixture(scope='module')
+def spoilage():
+    import spoilage_prediction_api
+    return spoilage_prediction_api
+
+
+@pytest.fixture(scope='module')
+def client():
+    from prediction_service import app
+    return app.test_client()
+
+
+@pytest.fixture(scope='module')
+def surplus_records():
+    """A few logged rows, each repeated inside the batch."""
+    rows = pd.read_csv('canteen_daily_log.csv').sample(40, random_state=3)[SURPLUS_FEATURES]
+    return json.loads(rows.to_json(orient='records')) * 2
+
+
+@pytest.fixture(scope='module')
+def spoilage_records():
+    rows = pd.read_csv('food_spoilage_data.csv').sample(40, random_state=3)[SPOILAGE_FEATURES]
+    return rows.to_dict('records') * 2
+
+
+@pytest.fixture
+def no_deadline(surplus, monkeypatch):
+    monkeypatch.setattr(surplus, 'SURPLUS_DEADLINE_MS', 0)
+
+
+def batch(client, endpoint, records, value_key):
+    results = client.post(endpoint, json=records).get_json()['results']
+    return [(result['status'], result[value_key]) for result in results]
+
+
+# --- HITS EQUAL FRESH PREDICTIONS ---
+
+@pytest.mark.parametrize('api_name, endpoint, records_name, value_key', [
+    ('surplus', '/predict_surplus_batch', 'surplus_records', 'predicted_kg_surplus'),
+    ('spoilage', '/predict_spoilage_batch', 'spoilage_records', 'predicted_remaining_safe_hours'),
+])
+def test_cache_hits_equal_fresh_predictions(request, client, no_deadline, monkeypatch,
+                                            api_name, endpoint, records_name, value_key):
+    cache = request.getfixturevalue(api_name).prediction_cache
+    records = request.getfixturevalue(records_name)
+    with monkeypatch.context() as patch:
+        patch.setattr(cache, 'maxsize', 0)
+        fresh = batch(client, endpoint, records, value_key)
+
+    cache.invalidate()
+    hits = cache.hits
+    first = batch(client, endpoint, records, value_key) # all misses: rows are looked up before the model runs
+    second = batch(client, endpoint, records, value_key) # all hits
+    assert cache.hits - hits == len(records)
+    assert first == fresh
+    assert second == fresh
+
+
+# --- INVALIDATION ON A VERSION SWAP ---
+
+def test_reload_invalidates_the_cache(surplus, client, surplus_records, no_deadline):
+    batch(client, '/predict_surplus_batch', surplus_records, 'predicted_kg_surplus')
+    assert len(surplus.prediction_cache._entries) > 0
+    invalidations = surplus.prediction_cache.invalidations
+
+    ok, message = surplus.surplus_model.reload('test')
+    assert ok, message
+    assert surplus.prediction_cache.invalidations == invalidations + 1
+    assert len(surplus.prediction_cache._entries) == 0
+
+
+def test_entry_of_another_version_is_never_served(spoilage, client, spoilage_records):
+    record = spoilage_records[0]
+    row, _ = spoilage.validate_spoilage_record(record)
+    key = canonical_key(row, SPOILAGE_FEATURES, spoilage.SPOILAGE_CACHE_FLOAT_DIGITS)
+    spoilage.prediction_cache.invalidate()
+    fresh = client.post('/predict_spoilage', json=record).get_json()
+
+    # Stored by a request that was still running on the previous model version
+    spoilage.prediction_cache.put(key, 999.0, 'old-version')
+    assert client.post('/predict_spoilage', json=record).get_json() == fresh
+    hit, value = spoilage.prediction_cache.get(key, spoilage.spoilage_model.current.version)
+    assert hit and value != 999.0
+
+
+# --- LRU / TTL ---
+
+def test_least_recently_used_entry_is_evicted():
+    cache = PredictionCache('test', maxsize=2)
+    cache.put('a', 1, 'v1')
+    cache.put('b', 2, 'v1')
+    assert cache.get('a', 'v1') == (True, 1)
+    cache.put('c', 3, 'v1')
+    assert cache.get('b', 'v1') == (False, None)
+    assert cache.get('a', 'v1') == (True, 1)
+    assert cache.stats()['evictions'] == 1
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(prediction_cache.time, 'monotonic', lambda: now[0])
+    cache = PredictionCache('test', maxsize=10, ttl_seconds=5)
+    cache.put('a', 1, 'v1')
+    now[0] += 4.9
+    assert cache.get('a', 'v1') == (True, 1)
+    now[0] += 0.2
+    assert cache.get('a', 'v1') == (False, None)
+    assert cache.stats()['expirations'] == 1
+
+
+def test_disabled_cache_stores_nothing():
+    cache = PredictionCache('test', maxsize=0)
+    cache.put('a', 1, 'v1')
+    assert cache.get('a', 'v1') == (False, None)
+    assert not cache.stats()['enabled']
+
+
+def test_canonical_key_normalizes_floats_and_flags():
+    row = {'t': -0.0004, 'flag': 1, 'name': 'Lunch'}
+    assert canonical_key(row, ['t', 'flag', 'name'], {'t': 3}, ['flag']) == (0.0, True, 'Lunch')
+    assert canonical_key(dict(row, name='lunch'), ['name'], {}) != canonical_key(row, ['name'], {})
@@ -0,0 +1,102 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+
+SPOILAGE_FEATURE_COLUMNS = ['Time_Since_Prep_Hours', 'Storage_Info', 'Food_Type', 'Meal_Time']
+STORAGE_INFO = ['Room Temp', 'Refrigerated', 'Frozen']
+GOOD = {'Time_Since_Prep_Hours': 1.5, 'Storage_Info': 'Room Temp', 'Food_Type': 'Milk', 'Meal_Time': 'Lunch'}
+# (record, expected per-row error); each one is a 400 on /predict_spoilage
+BAD_RECORDS = [
+    ({k: v for k, v in GOOD.items() if k != 'Time_Since_Prep_Hours'}, 'Missing features: Time_Since_Prep_Hours'),
+    ({'Time_Since_Prep_Hours': 2.0, 'Food_Type': 'Milk'}, 'Missing features: Storage_Info, Meal_Time'),
+    (dict(GOOD, Time_Since_Prep_Hours='soon'), "Invalid value for 'Time_Since_Prep_Hours'"),
+    (dict(GOOD, Time_Since_Prep_Hours=True), "Invalid value for 'Time_Since_Prep_Hours'"),
+    (dict(GOOD, Food_Type=7), "Invalid value for 'Food_Type': expected a string"),
+    (dict(GOOD, Storage_Info=None), "Invalid value for 'Storage_Info': expected a string"),
+    (['Room Temp', 1.5], 'Record must be a JSON object.'),
+]
+
+
+@pytest.fixture(scope='module')
+def client():
+    from prediction_service import app
+    return app.test_client()
+
+
+@pytest.fixture(scope='module')
+def records():
+    """Random prep times (0-12 h) over every Storage_Info, Room Temp past 4 h included, bad rows mixed in."""
+    rng = np.random.default_rng(7)
+    rows = pd.read_csv('food_spoilage_data.csv').sample(150, random_state=7)[SPOILAGE_FEATURE_COLUMNS]
+    records = rows.to_dict('records')
+    for i, record in enumerate(records):
+        record['Storage_Info'] = STORAGE_INFO[i % len(STORAGE_INFO)]
+        record['Time_Since_Prep_Hours'] = float(rng.uniform(0.0, 12.0))
+    records[0].update(Storage_Info='Room Temp', Time_Since_Prep_Hours=4.0) # Exactly at the lock
+    records[3].update(Storage_Info='Room Temp', Time_Since_Prep_Hours=3.999)
+    for position, (record, _) in zip(range(5, len(records), 20), BAD_RECORDS):
+        records.insert(position, record)
+    return records
+
+
+def clear_cache():
+    import spoilage_prediction_api
+    spoilage_prediction_api.prediction_cache.invalidate()
+
+
+def post_batch(client, records, body_format):
+    if body_format == 'ndjson':
+        body = '\n'.join(json.dumps(record) for record in records)
+        return client.post('/predict_spoilage_batch', data=body, content_type='application/x-ndjson')
+    payload = records if body_format == 'array' else {'records': records}
+    return client.post('/predict_spoilage_batch', json=payload)
+
+
+@pytest.mark.parametrize('body_format', ['array', 'records', 'ndjson'])
+def test_batch_matches_single_row_endpoint(client, records, body_format):
+    clear_cache()
+    response = post_batch(client, records, body_format)
+    assert response.status_code == 200
+    summary = response.get_json()
+    assert summary['count'] == len(records)
+    assert [r['index'] for r in summary['results']] == list(range(len(records)))
+
+    statuses = set()
+    for record, result in zip(records, summary['results']):
+        single = client.post('/predict_spoilage', json=record)
+        if single.status_code == 400:
+            assert result['status'] == 'error'
+            continue
+        assert single.status_code == 200
+        expected = single.get_json()
+        assert result['status'] == expected['status']
+        assert result['predicted_remaining_safe_hours'] == expected['predicted_remaining_safe_hours']
+        statuses.add(result['status'])
+    assert statuses == {'success', 'safety_override'}
+    assert summary['n_failed'] == len(BAD_RECORDS)
+
+
+def test_batch_reports_each_bad_row(client):
+    records = [GOOD] + [record for record, _ in BAD_RECORDS] + [GOOD]
+    results = post_batch(client, records, 'array').get_json()['results']
+    assert results[0]['status'] == results[-1]['status'] == 'success'
+    for result, (_, error) in zip(results[1:-1], BAD_RECORDS):
+        assert result['status'] == 'error'
+        assert result['error'].startswith(error)
+
+
+def test_invalid_ndjson_line_fails_only_that_row(client):
+    body = '\n'.join([json.dumps(GOOD), '{"Storage_Info": ', json.dumps(GOOD)])
+    response = client.post('/predict_spoilage_batch', data=body, content_type='application/x-ndjson')
+    results = response.get_json()['results']
+    assert [r['status'] for r in results] == ['success', 'error', 'success']
+    assert results[1]['error'].startswith('Invalid JSON line')
+
+
+def test_missing_prep_time_is_rejected_everywhere(client):
+    record, error = BAD_RECORDS[0]
+    assert client.post('/predict_spoilage', json=record).status_code == 400
+    assert client.post('/predict', json={'spoilage': record}).get_json()['spoilage']['error'] == error
+    curve = client.post('/spoilage_curve', json={'items': [record], 'horizon_hours': 1}).get_json()
+    assert curve['results'][0]['error'] == error
@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta
+import pytest
+
+NOW = '2024-09-04T12:00:00+00:00'
+ITEMS = [
+    {'id': 'room-fresh', 'Time_Since_Prep_Hours': 0.5, 'Storage_Info': 'Room Temp', 'Food_Type': 'Biryani', 'Meal_Time': 'Lunch'},
+    {'id': 'room-old', 'Time_Since_Prep_Hours': 3.2, 'Storage_Info': 'Room Temp', 'Food_Type': 'Milk', 'Meal_Time': 'Breakfast'},
+    {'id': 'missing-prep', 'Storage_Info': 'Room Temp', 'Food_Type': 'Milk', 'Meal_Time': 'Lunch'},
+    {'id': 'fridge', 'Time_Since_Prep_Hours': 2.0, 'Storage_Info': 'Refrigerated', 'Food_Type': 'Biryani', 'Meal_Time': 'Dinner'},
+    {'id': 'frozen', 'Time_Since_Prep_Hours': 1.0, 'Storage_Info': 'Frozen', 'Food_Type': 'Milk', 'Meal_Time': 'Lunch'},
+    {'id': 'room-spoiled', 'Time_Since_Prep_Hours': 4.5, 'Storage_Info': 'Room Temp', 'Food_Type': 'Biryani', 'Meal_Time': 'Dinner'},
+]
+HORIZON_HOURS, STEP_MINUTES = 6, 30
+
+
+@pytest.fixture(scope='module')
+def client():
+    from spoilage_prediction_api import app
+    return app.test_client()
+
+
+@pytest.fixture(scope='module')
+def curve(client):
+    response = client.post('/spoilage_curve', json={
+        'items': ITEMS, 'horizon_hours': HORIZON_HOURS, 'step_minutes': STEP_MINUTES, 'now': NOW})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def single_row(client, item, age):
+    record = {k: v for k, v in item.items() if k != 'id'}
+    body = client.post('/predict_spoilage', json=dict(record, Time_Since_Prep_Hours=age)).get_json()
+    return body['predicted_remaining_safe_hours']
+
+
+def expected_deadline(offsets, curve):
+    """Earliest offset + remaining time, up to and including the first unsafe point."""
+    deadline = float('inf')
+    for offset, remaining in zip(offsets, curve):
+        deadline = min(deadline, offset + remaining)
+        if remaining <= 0.0:
+            break
+    return deadline
+
+
+def test_every_point_equals_the_single_row_endpoint(client, curve):
+    offsets = curve['offsets_hours']
+    assert len(offsets) == HORIZON_HOURS * 60 // STEP_MINUTES + 1
+    for result in curve['results']:
+        if result['status'] != 'success':
+            continue
+        item = ITEMS[result['index']]
+        for offset, remaining in zip(offsets, result['remaining_safe_hours']):
+            assert remaining == single_row(client, item, item['Time_Since_Prep_Hours'] + offset)
+
+
+def test_deadline_is_earliest_up_to_the_first_unsafe_point(curve):
+    offsets = curve['offsets_hours']
+    now = datetime.fromisoformat(NOW)
+    for result in curve['results']:
+        if result['status'] != 'success':
+            continue
+        points = result['remaining_safe_hours']
+        assert result['deadline_hours'] == pytest.approx(expected_deadline(offsets, points), abs=1e-9)
+        assert result['spoils_within_horizon'] == any(value <= 0.0 for value in points)
+        assert datetime.fromisoformat(result['deadline']) == now + timedelta(hours=result['deadline_hours'])
+
+    by_id = {result['id']: result for result in curve['results']}
+    assert by_id['room-spoiled']['deadline_hours'] == 0.0
+    assert by_id['room-old']['deadline_hours'] <= 4.0 - 3.2 + 1e-9
+    assert by_id['room-old']['spoils_within_horizon']
+
+
+def test_results_are_sorted_by_deadline_with_errors_last(curve):
+    results = curve['results']
+    assert curve['count'] == len(ITEMS) and curve['n_failed'] == 1
+    assert sorted(result['index'] for result in results) == list(range(len(ITEMS)))
+    assert [result['id'] for result in results] == [ITEMS[result['index']]['id'] for result in results]
+
+    deadlines = [result['deadline_hours'] for result in results if result['status'] == 'success']
+    assert deadlines == sorted(deadlines)
+    assert results[-1]['id'] == 'missing-prep'
+    assert results[-1]['error'] == 'Missing features: Time_Since_Prep_Hours'
+
+
+def test_single_item_without_the_curve(client, curve):
+    body = client.post('/spoilage_curve', json=dict(ITEMS[0], include_curve=False, now=NOW,
+                                                    horizon_hours=HORIZON_HOURS, step_minutes=STEP_MINUTES)).get_json()
+    assert 'offsets_hours' not in body
+    result = body['results'][0]
+    assert 'remaining_safe_hours' not in result
+    assert result['deadline_hours'] == next(r for r in curve['results'] if r['id'] == 'room-fresh')['deadline_hours']
+
+
+@pytest.mark.parametrize('payload, status', [
+    ({'items': []}, 400),
+    ({'items': ITEMS, 'horizon_hours': 100}, 400),
+    ({'items': ITEMS, 'step_minutes': 0.5}, 400),
+    ({'items': ITEMS, 'now': 'noon'}, 400),
+    ({'items': ITEMS * 300, 'horizon_hours': 72, 'step_minutes': 1}, 413),
+])
+def test_curve_request_errors(client, payload, status):
+    assert client.post('/spoilage_curve', json=payload).status_code == status
@@ -0,0 +1,133 @@
+import os
+import numpy as np
+import pytest
+from model_reload import ModelBundle
+from spoilage_surface import SpoilagePredictionSurface, load_category_values, load_or_build_surface
+
+DATA_FILE = 'food_spoilage_data.csv'
+
+
+@pytest.fixture(scope='module')
+def api():
+    import spoilage_prediction_api
+    return spoilage_prediction_api
+
+
+@pytest.fixture(scope='module')
+def live(api):
+    return lambda columns: api.predict_with_model(columns, api.spoilage_model.current, observe=False)
+
+
+@pytest.fixture(scope='module')
+def surface(live):
+    """The default 0.05 h x 24 h surface of the live model."""
+    return SpoilagePredictionSurface.build(live, load_category_values(DATA_FILE))
+
+
+@pytest.fixture(scope='module')
+def surface_bundle(api, surface):
+    current = api.spoilage_model.current
+    return ModelBundle(current.version, pipeline=current.pipeline, compiled=current.compiled, surface=surface)
+
+
+def random_columns(surface, n, time_low, time_high, seed=5):
+    rng = np.random.default_rng(seed)
+    combos = list(surface.combo_index)
+    picks = rng.integers(len(combos), size=n)
+    return {
+        'Time_Since_Prep_Hours': rng.uniform(time_low, time_high, n),
+        'Storage_Info': [combos[i][0] for i in picks],
+        'Food_Type': [combos[i][1] for i in picks],
+        'Meal_Time': [combos[i][2] for i in picks],
+    }
+
+
+def lookup(surface, columns):
+    return surface.lookup(columns['Time_Since_Prep_Hours'], columns['Storage_Info'],
+                          columns['Food_Type'], columns['Meal_Time'])
+
+
+# --- INTERPOLATION ERROR ---
+
+def test_interpolation_error_is_within_the_reported_max_error(surface, live):
+    assert 0.0 < surface.max_error < 0.005 # about 0.0014 h for the committed model
+    columns = random_columns(surface, 20000, surface.time_min, surface.time_max)
+    values, hit = lookup(surface, columns)
+    assert hit.all()
+    assert np.abs(values - live(columns)).max() <= surface.max_error
+
+
+def test_grid_points_are_exact(surface, live):
+    columns = random_columns(surface, 500, 0, 1)
+    grid_points = np.random.default_rng(3).integers(0, surface.values.shape[1], 500)
+    columns['Time_Since_Prep_Hours'] = surface.time_min + grid_points * surface.step
+    values, _ = lookup(surface, columns)
+    np.testing.assert_allclose(values, live(columns), rtol=0, atol=1e-9)
+
+
+# --- FALLBACK TO THE LIVE MODEL ---
+
+def test_unseen_combos_and_out_of_range_times_are_misses(surface):
+    storage, food, meal = next(iter(surface.combo_index))
+    values, hit = surface.lookup(
+        [1.0, 1.0, 1.0, 1.0, -0.5, surface.time_max + 0.01, surface.time_max],
+        [storage, 'Warm Cabinet', storage, storage, storage, storage, storage],
+        [food, food, 'Durian', food, food, food, food],
+        [meal, meal, meal, 'Midnight Snack', meal, meal, meal])
+    assert hit.tolist() == [True, False, False, False, False, False, True]
+
+
+def test_misses_are_predicted_by_the_live_model(api, surface, surface_bundle, live):
+    inside = random_columns(surface, 200, 0, surface.time_max, seed=9)
+    outside = random_columns(surface, 100, surface.time_max + 0.5, 48, seed=10)
+    columns = {col: list(inside[col]) + list(outside[col]) for col in inside}
+    columns['Food_Type'][5] = 'Durian'
+    columns['Time_Since_Prep_Hours'][7] = -1.0
+
+    values = api.predict_raw_spoilage(columns, surface_bundle, observe=False)
+    surface_values, hit = lookup(surface, columns)
+    assert (~hit).sum() == 102
+    np.testing.assert_array_equal(values[hit], surface_values[hit])
+    miss = np.flatnonzero(~hit)
+    exact = live({col: [columns[col][i] for i in miss] for col in columns})
+    np.testing.assert_array_equal(values[miss], exact)
+
+
+# --- PERSISTENCE ---
+
+def toy_predict(columns):
+    return np.sin(np.asarray(columns['Time_Since_Prep_Hours'], dtype=float)) + 3.0
+
+
+@pytest.fixture
+def model_file(tmp_path):
+    path = tmp_path / 'model.joblib'
+    path.write_bytes(b'model')
+    return str(path)
+
+
+def test_saved_surface_is_reused_until_the_model_changes(tmp_path, model_file):
+    surface_file = str(tmp_path / 'surface.npz')
+    built = load_or_build_surface(toy_predict, model_file, DATA_FILE, step=0.1, time_max=2.0, surface_file=surface_file)
+    assert sorted(os.listdir(tmp_path)) == ['model.joblib', 'surface.npz'] # no .tmp left behind
+
+    loaded = load_or_build_surface(None, model_file, DATA_FILE, step=0.1, time_max=2.0, surface_file=surface_file)
+    np.testing.assert_array_equal(loaded.values, built.values)
+    assert loaded.max_error == built.max_error
+
+    with open(model_file, 'ab') as f:
+        f.write(b' retrained')
+    calls = []
+    rebuilt = load_or_build_surface(lambda columns: calls.append(1) or toy_predict(columns) + 1.0, model_file,
+                                    DATA_FILE, step=0.1, time_max=2.0, surface_file=surface_file)
+    assert calls
+    np.testing.assert_allclose(rebuilt.values, built.values + 1.0)
+
+
+def test_unreadable_surface_file_is_rebuilt(tmp_path, model_file):
+    surface_file = tmp_path / 'surface.npz'
+    surface_file.write_bytes(b'PK\x03\x04 truncated')
+    surface = load_or_build_surface(toy_predict, model_file, DATA_FILE, step=0.1, time_max=2.0,
+                                    surface_file=str(surface_file))
+    reloaded = SpoilagePredictionSurface.load(str(surface_file))
+    np.testing.assert_array_equal(reloaded.values, surface.values)
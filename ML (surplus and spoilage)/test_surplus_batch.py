@@ -0,0 +1,108 @@
+import json
+import pandas as pd
+import pytest
+
+FEATURE_COLUMNS = [
+    'day_of_wk', 'month', 'meal_type', 'price_type_special_weather', 'is_holiday',
+    'food_id', 'veg_nonveg', 'cuisine', 'estimated_prep_time_hours',
+    'staff_on_duty', 'peak_hour_demand_ratio', 'is_seasonal_dish', 'actual_kg_planned'
+]
+GOOD = {
+    'day_of_wk': 'Wednesday', 'month': 9, 'meal_type': 'Lunch', 'price_type_special_weather': 'Weather: Sunny',
+    'is_holiday': False, 'food_id': 'F007', 'veg_nonveg': 'Veg', 'cuisine': 'North Indian',
+    'estimated_prep_time_hours': 1.5, 'staff_on_duty': 4, 'peak_hour_demand_ratio': 0.65,
+    'is_seasonal_dish': True, 'actual_kg_planned': 10.5,
+}
+# (record, expected per-row error); each one is a 400 on /predict_surplus
+BAD_RECORDS = [
+    ({k: v for k, v in GOOD.items() if k not in ('month', 'cuisine')}, 'Missing features: month, cuisine'),
+    (dict(GOOD, actual_kg_planned='lots'), "Invalid value for 'actual_kg_planned'"),
+    (dict(GOOD, is_holiday='maybe'), "Invalid value for 'is_holiday'"),
+    (dict(GOOD, food_id=7), "Invalid value for 'food_id': expected a string"),
+    ([GOOD], 'Record must be a JSON object.'),
+]
+
+
+@pytest.fixture(scope='module')
+def api():
+    import surplus_prediction_api
+    return surplus_prediction_api
+
+
+@pytest.fixture(scope='module')
+def client(api):
+    return api.app.test_client()
+
+
+@pytest.fixture
+def model_only(api, monkeypatch):
+    """Every row goes through the model: no cache, no deadline fallback."""
+    monkeypatch.setattr(api.prediction_cache, 'maxsize', 0)
+    monkeypatch.setattr(api, 'SURPLUS_DEADLINE_MS', 0)
+
+
+@pytest.fixture(scope='module')
+def records():
+    """Logged rows in their CSV form (0/1 flags, ints as floats), bad rows and a duplicate mixed in."""
+    rows = pd.read_csv('canteen_daily_log.csv').sample(120, random_state=11)[FEATURE_COLUMNS]
+    records = json.loads(rows.to_json(orient='records'))
+    records[1]['is_holiday'] = bool(records[1]['is_holiday'])
+    records[2]['month'] = str(records[2]['month'])
+    records.append(dict(records[0]))
+    for position, (record, _) in zip(range(5, len(records), 20), BAD_RECORDS):
+        records.insert(position, record)
+    return records
+
+
+def post_batch(client, records, body_format):
+    if body_format == 'ndjson':
+        body = '\n'.join(json.dumps(record) for record in records)
+        return client.post('/predict_surplus_batch', data=body, content_type='application/x-ndjson')
+    payload = records if body_format == 'array' else {'records': records}
+    return client.post('/predict_surplus_batch', json=payload)
+
+
+@pytest.mark.parametrize('body_format', ['array', 'records', 'ndjson'])
+def test_batch_matches_single_row_endpoint(client, records, model_only, body_format):
+    response = post_batch(client, records, body_format)
+    assert response.status_code == 200
+    summary = response.get_json()
+    assert summary['count'] == len(records)
+    assert summary['n_failed'] == len(BAD_RECORDS)
+    assert [r['index'] for r in summary['results']] == list(range(len(records)))
+
+    for record, result in zip(records, summary['results']):
+        single = client.post('/predict_surplus', json=record)
+        if single.status_code == 400:
+            assert result['status'] == 'error'
+            assert single.get_json()['details'] == result['error']
+            continue
+        assert single.status_code == 200
+        expected = single.get_json()
+        assert (result['status'], result['served_by']) == ('success', 'model')
+        assert result['food_id'] == record['food_id']
+        assert result['predicted_kg_surplus'] == expected['predicted_kg_surplus']
+
+
+def test_batch_reports_each_bad_row(client):
+    records = [GOOD] + [record for record, _ in BAD_RECORDS] + [GOOD]
+    results = post_batch(client, records, 'array').get_json()['results']
+    assert results[0]['status'] == results[-1]['status'] == 'success'
+    assert results[0]['predicted_kg_surplus'] == results[-1]['predicted_kg_surplus']
+    for result, (_, error) in zip(results[1:-1], BAD_RECORDS):
+        assert result['status'] == 'error'
+        assert result['error'].startswith(error)
+
+
+def test_invalid_ndjson_line_fails_only_that_row(client):
+    body = '\n'.join([json.dumps(GOOD), '{"food_id": ', json.dumps(GOOD)])
+    response = client.post('/predict_surplus_batch', data=body, content_type='application/x-ndjson')
+    results = response.get_json()['results']
+    assert [r['status'] for r in results] == ['success', 'error', 'success']
+    assert results[1]['error'].startswith('Invalid JSON line')
+
+
+def test_batch_payload_errors(api, client, monkeypatch):
+    assert client.post('/predict_surplus_batch', json={'rows': [GOOD]}).status_code == 400
+    monkeypatch.setattr(api, 'MAX_BATCH_SIZE', 2)
+    assert client.post('/predict_surplus_batch', json=[GOOD] * 3).status_code == 413
@@ -0,0 +1,171 @@
+import json
+import threading
+import time
+import pandas as pd
+import pytest
+from surplus_fallback import MIN_GROUP_ROWS, SurplusFallbackIndex, build_fallback_index, update_fallback_index
+
+DATA_FILE = 'canteen_daily_log.csv'
+FEATURE_COLUMNS = [
+    'day_of_wk', 'month', 'meal_type', 'price_type_special_weather', 'is_holiday',
+    'food_id', 'veg_nonveg', 'cuisine', 'estimated_prep_time_hours',
+    'staff_on_duty', 'peak_hour_demand_ratio', 'is_seasonal_dish', 'actual_kg_planned'
+]
+
+
+@pytest.fixture(scope='module')
+def log():
+    return pd.read_csv(DATA_FILE)
+
+
+@pytest.fixture(scope='module')
+def api():
+    import surplus_prediction_api
+    return surplus_prediction_api
+
+
+@pytest.fixture(scope='module')
+def client(api):
+    return api.app.test_client()
+
+
+@pytest.fixture
+def record(log):
+    return json.loads(log.head(1)[FEATURE_COLUMNS].to_json(orient='records'))[0]
+
+
+def expected_estimate(api, record):
+    stats, level = api.surplus_model.current.fallback_index.lookup(record)
+    return round(stats['surplus_ratio'] * record['actual_kg_planned'], 3), level
+
+
+def wait_for_idle_model(api, timeout=10.0):
+    deadline = time.perf_counter() + timeout
+    while api._in_flight and time.perf_counter() < deadline:
+        time.sleep(0.005)
+    assert api._in_flight == 0
+
+
+def served_predictions(api):
+    import metrics
+    return metrics.PREDICTIONS_TOTAL._values[('surplus', 'success')]
+
+
+@pytest.fixture
+def blocked_model(api, monkeypatch):
+    """Model calls wait for release.set(); the real prediction then runs."""
+    release = threading.Event()
+    predict_columns = api.predict_surplus_columns
+
+    def blocked(columns, bundle=None, observe=True):
+        release.wait(10)
+        return predict_columns(columns, bundle, observe)
+
+    monkeypatch.setattr(api, 'predict_surplus_columns', blocked)
+    api.prediction_cache.invalidate()
+    yield release
+    release.set()
+    wait_for_idle_model(api)
+
+
+# --- INDEX ---
+
+def test_estimate_is_surplus_ratio_times_planned_kg(api, record):
+    index = api.surplus_model.current.fallback_index
+    stats, level = index.lookup(record)
+    assert level == 'food_day_meal'
+    assert stats['rows'] >= MIN_GROUP_ROWS
+    estimate = index.estimate(dict(record, actual_kg_planned=20.0))
+    assert estimate['predicted_kg_surplus'] == round(stats['surplus_ratio'] * 20.0, 3)
+    assert estimate['historical_kg_surplus'] == {key: stats[key] for key in ('rows', 'mean', 'p50', 'p90')}
+
+    unknown = index.estimate(dict(record, food_id='F999', actual_kg_planned=20.0))
+    assert unknown['fallback_level'] == 'global'
+    assert unknown['predicted_kg_surplus'] == round(index.global_stats['surplus_ratio'] * 20.0, 3)
+
+
+def test_small_groups_back_off_to_the_next_level():
+    def stats(rows, ratio):
+        return {'rows': rows, 'mean': 1.0, 'p50': 1.0, 'p90': 2.0, 'surplus_ratio': ratio}
+    index = SurplusFallbackIndex({
+        'format_version': 2, 'min_group_rows': MIN_GROUP_ROWS, 'global': stats(100, 0.3),
+        'levels': {'food_day_meal': {'F001|Monday|Lunch': stats(MIN_GROUP_ROWS - 1, 0.1)},
+                   'food_meal': {'F001|Lunch': stats(MIN_GROUP_ROWS, 0.2)}, 'food': {}},
+    })
+    row = {'food_id': 'F001', 'day_of_wk': 'Monday', 'meal_type': 'Lunch', 'actual_kg_planned': 10.0}
+    assert index.estimate(row)['fallback_level'] == 'food_meal'
+    assert index.estimate(row)['predicted_kg_surplus'] == 2.0
+    assert index.estimate(dict(row, meal_type='Dinner'))['fallback_level'] == 'global'
+
+
+def test_update_with_appended_rows_matches_a_rebuild(log, tmp_path):
+    merged, rebuilt = str(tmp_path / 'merged.json'), str(tmp_path / 'rebuilt.json')
+    build_fallback_index(DATA_FILE, output=merged, rows=log.iloc[:9000])
+    update_fallback_index(log.iloc[9000:9600], output=merged)
+    update_fallback_index(log.iloc[9600:], output=merged)
+    build_fallback_index(DATA_FILE, output=rebuilt, rows=log)
+    with open(merged, encoding='utf-8') as f:
+        merged = json.load(f)
+    with open(rebuilt, encoding='utf-8') as f:
+        rebuilt = json.load(f)
+
+    assert merged['rows_merged_since_build'] == len(log) - 9000
+    for level, groups in rebuilt['levels'].items():
+        assert merged['levels'][level].keys() == groups.keys()
+        for key, stats in groups.items():
+            assert merged['levels'][level][key]['rows'] == stats['rows']
+            assert merged['levels'][level][key]['mean'] == pytest.approx(stats['mean'], abs=2e-4)
+            assert merged['levels'][level][key]['surplus_ratio'] == pytest.approx(stats['surplus_ratio'], abs=2e-6)
+
+
+# --- SERVED_BY / FALLBACK_REASON ---
+
+def test_model_path_is_flagged_and_counted_once(api, client, record):
+    api.prediction_cache.invalidate()
+    before = served_predictions(api)
+    body = client.post('/predict_surplus', json=record).get_json()
+    assert body['served_by'] == 'model'
+    assert 'fallback_reason' not in body
+    assert served_predictions(api) == before + 1
+
+
+def test_model_not_loaded_serves_the_index(api, client, record, monkeypatch):
+    monkeypatch.setattr(api, '_has_model', lambda bundle: False)
+    response = client.post('/predict_surplus', json=record)
+    assert response.status_code == 200
+    body = response.get_json()
+    value, level = expected_estimate(api, record)
+    assert (body['served_by'], body['fallback_reason']) == ('fallback', 'model_not_loaded')
+    assert (body['predicted_kg_surplus'], body['fallback_level']) == (value, level)
+
+
+def test_saturated_serves_the_index(api, client, record, blocked_model, monkeypatch):
+    monkeypatch.setattr(api, 'SURPLUS_MAX_IN_FLIGHT', 1)
+    monkeypatch.setattr(api, 'SURPLUS_DEADLINE_MS', 10_000)
+    first = {}
+    worker = threading.Thread(target=lambda: first.update(result=api.predict_surplus_with_budget([(record, None)])[0]))
+    worker.start()
+    deadline = time.perf_counter() + 10
+    while api._in_flight < 1 and time.perf_counter() < deadline:
+        time.sleep(0.005)
+
+    body = client.post('/predict_surplus', json=dict(record, actual_kg_planned=12.5)).get_json()
+    assert (body['served_by'], body['fallback_reason']) == ('fallback', 'saturated')
+    assert body['predicted_kg_surplus'] == expected_estimate(api, dict(record, actual_kg_planned=12.5))[0]
+
+    blocked_model.set()
+    worker.join(10)
+    assert first['result']['served_by'] == 'model'
+
+
+def test_deadline_serves_the_index_and_counts_once(api, client, record, blocked_model, monkeypatch):
+    monkeypatch.setattr(api, 'SURPLUS_DEADLINE_MS', 20)
+    before = served_predictions(api)
+    body = client.post('/predict_surplus', json=record).get_json()
+    assert (body['served_by'], body['fallback_reason']) == ('fallback', 'deadline')
+    assert body['predicted_kg_surplus'] == expected_estimate(api, record)[0]
+
+    # The late model run finishes, but only the fallback row it was replaced by is counted
+    blocked_model.set()
+    wait_for_idle_model(api)
+    assert served_predictions(api) == before + 1
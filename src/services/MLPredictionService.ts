@@ -4,8 +4,12 @@ import { FoodSurplus } from '../models/FoodSurplus';
 
 // --- CRITICAL: Use the IP Address provided by your terminal output ---
 // NOTE: http://10.121.50.47 is the IP found in your terminal output.
-const SURPLUS_API_BASE_URL = 'http://10.121.50.47:8082/predict_surplus';
-const SPOILAGE_API_BASE_URL = 'http://10.121.50.47:8083/predict_spoilage';
+// Both models are served by prediction_service.py on a single port; /predict
+// returns the surplus and spoilage predictions in one round trip.
+const ML_API_BASE_URL = 'http://10.121.50.47:8082';
+const COMBINED_PREDICT_URL = `${ML_API_BASE_URL}/predict`;
+const OPTIMIZE_MENU_URL = `${ML_API_BASE_URL}/optimize_menu`;
+const SPOILAGE_CURVE_URL = `${ML_API_BASE_URL}/spoilage_curve`;
 
 // -------------------------------------------------------------------------
 // INTERFACES (Must match Python Model Feature Lists EXACTLY)
@@ -48,6 +52,56 @@ export interface SpoilageInput {
 export interface PredictionResult {
     predictedSurplusKg: number;
     predictedSafeHours: number;
+    // 'model', 'cache', or 'fallback' (historical average, served when the model is overloaded)
+    surplusServedBy?: string;
+}
+
+/**
+ * One meal service in the week being planned (/optimize_menu)
+ */
+export interface MenuSlot {
+    day_of_wk: string;
+    month: number;
+    meal_type: string;
+    price_type_special_weather: string;
+    staff_on_duty: number;
+    is_holiday?: boolean; // Defaults to false
+    peak_hour_demand_ratio?: number; // Defaults to the historical median for the meal type
+}
+
+/**
+ * Candidate dish: a food_id, or an object overriding the historical demand
+ */
+export type MenuDish = string | { food_id: string; min_portions?: number };
+
+/**
+ * Optimized plan for one slot
+ */
+export interface OptimizedSlot {
+    day_of_wk: string;
+    meal_type: string;
+    dishes: {
+        food_id: string;
+        dish_name: string;
+        actual_kg_planned: number;
+        predicted_kg_surplus: number;
+        demand_portions: number;
+        min_kg_for_demand: number;
+    }[];
+    total_kg_planned: number;
+    total_predicted_kg_surplus: number;
+}
+
+/**
+ * Remaining-safe-time curve and spoil deadline for one item (/spoilage_curve)
+ */
+export interface SpoilageCurve {
+    index: number;
+    id?: string;
+    deadline_hours: number;
+    deadline: string; // ISO 8601
+    spoils_within_horizon: boolean;
+    remaining_safe_hours?: number[]; // One value per offset in offsets_hours
 }
 
 // -------------------------------------------------------------------------
@@ -55,49 +109,97 @@ export interface PredictionResult {
 // -------------------------------------------------------------------------
 
 /**
- * Fetches both Surplus (Waste) and Spoilage (Safe Time) predictions in parallel.
+ * Fetches both Surplus (Waste) and Spoilage (Safe Time) predictions in one request.
  * @param surplusData - The 13 features for the Surplus Model.
  * @param spoilageData - The 4 features for the Spoilage Model.
  * @returns PredictionResult or null on failure.
  */
 export async function getMLPredictions(surplusData: SurplusInput, spoilageData: SpoilageInput): Promise<PredictionResult | null> {
     try {
-        // 1. Prepare and send the requests concurrently
-        const surplusRequest = fetch(SURPLUS_API_BASE_URL, {
+        // 1. Send one combined request to the prediction service
+        const response = await fetch(COMBINED_PREDICT_URL, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify(surplusData),
+            body: JSON.stringify({ surplus: surplusData, spoilage: spoilageData }),
         });
 
-        const spoilageRequest = fetch(SPOILAGE_API_BASE_URL, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify(spoilageData),
-        });
-
-        const [surplusResponse, spoilageResponse] = await Promise.all([surplusRequest, spoilageRequest]);
-
         // 2. Error Handling
-        if (!surplusResponse.ok) {
-            console.error('Surplus API Error:', surplusResponse.status, await surplusResponse.text());
-            throw new Error(`Failed to get Surplus prediction. Status: ${surplusResponse.status}`);
+        if (!response.ok) {
+            console.error('Prediction API Error:', response.status, await response.text());
+            throw new Error(`Failed to get ML predictions. Status: ${response.status}`);
         }
-        if (!spoilageResponse.ok) {
-            console.error('Spoilage API Error:', spoilageResponse.status, await spoilageResponse.text());
-            throw new Error(`Failed to get Spoilage prediction. Status: ${spoilageResponse.status}`);
+
+        const result = await response.json();
+        if (result.surplus?.status === 'error') {
+            throw new Error(`Failed to get Surplus prediction: ${result.surplus.error}`);
+        }
+        if (result.spoilage?.status === 'error') {
+            throw new Error(`Failed to get Spoilage prediction: ${result.spoilage.error}`);
         }
 
         // 3. Parse and return the combined result
-        const surplusResult = await surplusResponse.json();
-        const spoilageResult = await spoilageResponse.json();
-        
         return {
-            predictedSurplusKg: parseFloat(surplusResult.predicted_kg_surplus),
-            predictedSafeHours: parseFloat(spoilageResult.predicted_remaining_safe_hours),
+            predictedSurplusKg: parseFloat(result.surplus.predicted_kg_surplus),
+            predictedSafeHours: parseFloat(result.spoilage.predicted_remaining_safe_hours),
+            surplusServedBy: result.surplus.served_by,
         };
 
     } catch (error) {
         console.error('ML Prediction Integration Failed:', error);
         return null;
     }
-}
\ No newline at end of file
+}
+
+/**
+ * Plans the kg to cook for every slot x dish (and, with dishesPerSlot, which
+ * dishes to serve) so that predicted surplus is minimal while historical demand is covered.
+ * @returns The per-slot plan, or null on failure.
+ */
+export async function optimizeMenu(slots: MenuSlot[], dishes: MenuDish[], dishesPerSlot?: number): Promise<OptimizedSlot[] | null> {
+    try {
+        const response = await fetch(OPTIMIZE_MENU_URL, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ slots, dishes, dishes_per_slot: dishesPerSlot }),
+        });
+
+        if (!response.ok) {
+            console.error('Menu Optimizer API Error:', response.status, await response.text());
+            throw new Error(`Failed to optimize menu. Status: ${response.status}`);
+        }
+
+        const result = await response.json();
+        return result.plan;
+
+    } catch (error) {
+        console.error('Menu Optimization Failed:', error);
+        return null;
+    }
+}
+
+/**
+ * Fetches spoilage curves and deadlines for many items in one request,
+ * sorted by deadline (soonest pickup first).
+ * @returns The curves (items that failed validation are left out), or null on failure.
+ */
+export async function getSpoilageCurves(items: (SpoilageInput & { id?: string })[], horizonHours = 24, stepMinutes = 15): Promise<SpoilageCurve[] | null> {
+    try {
+        const response = await fetch(SPOILAGE_CURVE_URL, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ items, horizon_hours: horizonHours, step_minutes: stepMinutes }),
+        });
+
+        if (!response.ok) {
+            console.error('Spoilage Curve API Error:', response.status, await response.text());
+            throw new Error(`Failed to get spoilage curves. Status: ${response.status}`);
+        }
+
+        const result = await response.json();
+        return result.results.filter((r: { status: string }) => r.status === 'success');
+
+    } catch (error) {
+        console.error('Spoilage Curve Request Failed:', error);
+        return null;
+    }
+}